@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import async_views
+
+urlpatterns = [
+    path('recipes/', async_views.recipe_list),
+    path('recipes/download_shopping_cart/',
+         async_views.download_shopping_cart),
+    path('recipes/<int:pk>/', async_views.recipe_detail),
+    path('ingredients/', async_views.ingredient_list),
+    path('ingredients/<int:pk>/', async_views.ingredient_detail),
+    path('users/me/', async_views.user_me),
+    path('users/<int:id>/', async_views.user_detail),
+]
@@ -0,0 +1,357 @@
+"""Асинхронные версии самых нагруженных читающих эндпоинтов.
+
+Подключаются только при запуске под ASGI (``foodgram.urls_asgi``) и
+обслуживают GET-запросы через асинхронный ORM. Всё, что здесь не
+поддерживается (запись, курсорная пагинация), передаётся синхронным
+представлениям DRF.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import gettext as _
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import (NotAuthenticated,
+                                       Throttled,
+                                       ValidationError)
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram.statement_timeout import async_statement_timeout
+from recipes.models import Ingredient, Recipe
+from users.models import CustomUser
+from recipes.shopping_list import (create_shopping_list_text,
+                                   get_ingredients_for_list)
+from .conditional import (current_user_validators,
+                          not_modified,
+                          recipe_list_validators,
+                          recipe_validators,
+                          set_validators,
+                          user_validators)
+from .constants import PAGE_SIZE
+from .degradation import (DatabaseUnavailable,
+                          breaker,
+                          read_failed,
+                          should_store,
+                          stale_response,
+                          store_response)
+from .filters import RecipeFilter
+from .renderers import dumps
+from .representations import (RECIPE_FIELDS,
+                              USER_FIELDS,
+                              ingredient_queryset,
+                              ingredient_representation,
+                              recipe_queryset,
+                              recipe_representation,
+                              sparse_fields,
+                              user_queryset,
+                              user_representation)
+from .throttling import (client_idents,
+                         consume,
+                         get_store,
+                         set_rate_limit_headers)
+from .views import IngredientViewSet, RecipeViewSet, UserProfileViewSet
+
+
+class AuthenticationError(Exception):
+    pass
+
+
+async def _authenticate(request):
+    header = request.headers.get('Authorization', '').split()
+    if not header or header[0].lower() != 'token':
+        return AnonymousUser()
+    if len(header) != 2:
+        raise AuthenticationError(_('Invalid token header. '
+                                    'No credentials provided.'))
+    try:
+        token = await Token.objects.select_related('user').aget(
+            key=header[1])
+    except Token.DoesNotExist:
+        raise AuthenticationError(_('Invalid token.'))
+    if not token.user.is_active:
+        raise AuthenticationError(_('User inactive or deleted.'))
+    return token.user
+
+
+def _json(data, status=200):
+    return HttpResponse(dumps(data), status=status,
+                        content_type='application/json')
+
+
+def _not_found(model):
+    # Тот же текст, что у get_object_or_404 в синхронных представлениях.
+    return _error(f'No {model._meta.object_name} matches the given query.',
+                  404)
+
+
+def _error(detail, status):
+    response = _json({'detail': str(detail)}, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+async def _throttle(scope, request):
+    store = get_store()
+    idents = client_idents(request)
+    if store.blocking:
+        return await sync_to_async(consume)(scope, idents)
+    return consume(scope, idents)
+
+
+async def _unavailable(request, stale):
+    response = await sync_to_async(stale_response)(request) if stale else None
+    if response is None:
+        response = _error(DatabaseUnavailable.default_detail, 503)
+        response['Retry-After'] = str(breaker.retry_after())
+    return response
+
+
+async def _guarded(timeout_scope, stale, request, respond):
+    """Как ``StaleFallbackMixin``: ограничение времени запросов, автомат
+    защиты и сохранённые ответы (если ``stale``)."""
+    if not breaker.allow():
+        return await _unavailable(request, stale)
+    try:
+        async with async_statement_timeout(
+                settings.STATEMENT_TIMEOUTS[timeout_scope]):
+            response = await respond()
+    except OperationalError as error:
+        read_failed(request, error)
+        return await _unavailable(request, stale)
+    if response is not None and response.status_code < 500:
+        breaker.success()
+        if stale and should_store(request, response):
+            await sync_to_async(store_response)(request, response)
+    return response
+
+
+def _allowed_methods(fallback):
+    """Заголовок ``Allow``, который отдаёт представление DRF."""
+    methods = {*fallback.actions, 'options'}
+    if 'get' in methods:
+        methods.add('head')
+    return ', '.join(method.upper()
+                     for method in fallback.cls.http_method_names
+                     if method in methods)
+
+
+def async_read_view(fallback, login_required=False):
+    """Обслуживает GET асинхронно, остальные методы - через ``fallback``.
+
+    ``fallback`` - синхронное представление DRF для того же адреса.
+    Если обработчик возвращает ``None``, запрос тоже передаётся ему.
+    Ограничение частоты и деградация чтения берутся из настроек
+    ``fallback``. При ``login_required`` анонимы получают 401 до
+    ограничителя частоты, как при проверке прав в DRF.
+    """
+    sync_fallback = sync_to_async(fallback)
+    allow = _allowed_methods(fallback)
+    action = fallback.actions.get('get')
+    scope = getattr(fallback.cls, 'throttle_scopes', {}).get(action)
+    timeout_scope = getattr(fallback.cls, 'timeout_scopes', {}).get(action)
+    stale = action not in getattr(fallback.cls, 'stale_excluded_actions', ())
+
+    def decorator(handler):
+        async def respond(request, *args, **kwargs):
+            try:
+                request.user = await _authenticate(request)
+            except AuthenticationError as error:
+                return _error(error, 401)
+            if login_required and not request.user.is_authenticated:
+                return _error(NotAuthenticated.default_detail, 401)
+            decision = None
+            if scope is not None:
+                decision = await _throttle(scope, request)
+                request.throttle_decision = decision
+                if not decision.allowed:
+                    return set_rate_limit_headers(
+                        _error(Throttled(decision.retry_after).detail, 429),
+                        decision)
+            response = await handler(request, *args, **kwargs)
+            if response is not None and decision is not None:
+                set_rate_limit_headers(response, decision)
+            return response
+
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await sync_fallback(request, *args, **kwargs)
+            if timeout_scope is None:
+                response = await respond(request, *args, **kwargs)
+            else:
+                response = await _guarded(
+                    timeout_scope, stale, request,
+                    lambda: respond(request, *args, **kwargs))
+            if response is None:
+                return await sync_fallback(request, *args, **kwargs)
+            # Те же заголовки, что добавляет finalize_response в DRF.
+            response['Allow'] = allow
+            patch_vary_headers(response, ('Accept',))
+            return response
+        view.csrf_exempt = True
+        view.metrics_view = fallback
+        return view
+    return decorator
+
+
+async def _conditional(request, validators, respond):
+    """Отдаёт 304, если у клиента актуальная версия, иначе ответ
+    ``respond()`` с заголовками ETag и Last-Modified."""
+    response = not_modified(request, validators)
+    if response is None:
+        response = await respond()
+    return set_validators(response, validators)
+
+
+async def _paginated(request, queryset, build):
+    try:
+        page_size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        page_size = PAGE_SIZE
+    if page_size <= 0:
+        page_size = PAGE_SIZE
+    count = await queryset.acount()
+    last_page = max(1, -(-count // page_size))
+    page_number = request.GET.get('page', 1)
+    if page_number == 'last':
+        page_number = last_page
+    try:
+        page_number = int(page_number)
+    except ValueError:
+        return _error(_('Invalid page.'), 404)
+    if not 1 <= page_number <= last_page:
+        return _error(_('Invalid page.'), 404)
+    offset = (page_number - 1) * page_size
+    results = [build(item) async for item in
+               queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_url = previous_url = None
+    if page_number < last_page:
+        next_url = replace_query_param(url, 'page', page_number + 1)
+    if page_number > 2:
+        previous_url = replace_query_param(url, 'page', page_number - 1)
+    elif page_number == 2:
+        previous_url = remove_query_param(url, 'page')
+    return _json({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': results,
+    })
+
+
+@async_read_view(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def recipe_list(request):
+    if request.GET.get('ordering') == 'trending':
+        return None
+    try:
+        fields = sparse_fields(request.GET, RECIPE_FIELDS)
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+    filterset = RecipeFilter(request.GET,
+                             queryset=recipe_queryset(request.user, fields),
+                             request=request)
+    if not filterset.is_valid():
+        return _json(filterset.errors, status=400)
+    validators = await sync_to_async(recipe_list_validators)(
+        request, filterset.qs)
+    return await _conditional(request, validators, lambda: _paginated(
+        request, filterset.qs,
+        lambda recipe: recipe_representation(request, recipe, fields)))
+
+
+@async_read_view(RecipeViewSet.as_view({'get': 'retrieve',
+                                        'put': 'update',
+                                        'patch': 'partial_update',
+                                        'delete': 'destroy'}))
+async def recipe_detail(request, pk):
+    try:
+        fields = sparse_fields(request.GET, RECIPE_FIELDS)
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+    validators = await sync_to_async(recipe_validators)(request, pk)
+    if validators is None:
+        return _not_found(Recipe)
+
+    async def respond():
+        recipes = [recipe async for recipe in
+                   recipe_queryset(request.user, fields).filter(pk=pk)]
+        if not recipes:
+            return _not_found(Recipe)
+        return _json(recipe_representation(request, recipes[0], fields))
+    return await _conditional(request, validators, respond)
+
+
+@async_read_view(RecipeViewSet.as_view({'get': 'download_shopping_cart'}),
+                 login_required=True)
+async def download_shopping_cart(request):
+    items = [item async for item in
+             get_ingredients_for_list(request.user)]
+    response = HttpResponse(create_shopping_list_text(items),
+                            content_type='text/plain; charset=UTF-8')
+    response['Content-Disposition'] = (
+        'attachment; filename="shopping_list.txt"')
+    return response
+
+
+@async_read_view(IngredientViewSet.as_view({'get': 'list'}))
+async def ingredient_list(request):
+    try:
+        queryset = ingredient_queryset(request.GET)
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+    return _json([ingredient_representation(ingredient)
+                  async for ingredient in queryset])
+
+
+@async_read_view(IngredientViewSet.as_view({'get': 'retrieve'}))
+async def ingredient_detail(request, pk):
+    try:
+        ingredient = await Ingredient.objects.aget(pk=pk)
+    except Ingredient.DoesNotExist:
+        return _not_found(Ingredient)
+    return _json(ingredient_representation(ingredient))
+
+
+@async_read_view(UserProfileViewSet.as_view({'get': 'retrieve',
+                                             'put': 'update',
+                                             'patch': 'partial_update',
+                                             'delete': 'destroy'}))
+async def user_detail(request, id):
+    try:
+        fields = sparse_fields(request.GET, USER_FIELDS)
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+    validators = await sync_to_async(user_validators)(request, id)
+    if validators is None:
+        return _not_found(CustomUser)
+
+    async def respond():
+        try:
+            user = await user_queryset(request.user, fields).aget(pk=id)
+        except CustomUser.DoesNotExist:
+            return _not_found(CustomUser)
+        return _json(user_representation(
+            request, user, getattr(user, 'is_subscribed', None), fields))
+    return await _conditional(request, validators, respond)
+
+
+@async_read_view(UserProfileViewSet.as_view({'get': 'get_user_info'}),
+                 login_required=True)
+async def user_me(request):
+    try:
+        fields = sparse_fields(request.GET, USER_FIELDS)
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+
+    async def respond():
+        return _json(user_representation(request, request.user, False,
+                                         fields))
+    return await _conditional(request, current_user_validators(request),
+                              respond)
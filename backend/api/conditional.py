@@ -0,0 +1,134 @@
+"""Условные GET-запросы (ETag / Last-Modified).
+
+Валидаторы считаются по отметкам времени изменения без сериализации
+ответа. Состояние текущего пользователя (избранное, список покупок,
+подписки) учитывается через ``relations_changed_at``, поэтому одинаковые
+данные для разных пользователей получают разные ETag.
+
+Списки отдают только ETag: наибольшая отметка времени не меняется, когда
+рецепт удалён, выпал из выборки или изменился его рейтинг, поэтому
+Last-Modified для них дал бы 304 на устаревший список.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from recipes.models import Recipe
+from users.models import CustomUser
+
+
+def _validators(request, parts, timestamps):
+    user = request.user
+    if user.is_authenticated:
+        parts += (user.pk, user.relations_changed_at)
+        timestamps += (user.relations_changed_at,)
+    etag = quote_etag(
+        hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+    timestamps = [value for value in timestamps if value is not None]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return etag, last_modified
+
+
+def _list_validators(request, parts):
+    etag, _ = _validators(request, parts, ())
+    return etag, None
+
+
+def _query(request):
+    return tuple(sorted(request.GET.lists()))
+
+
+def recipe_validators(request, pk):
+    try:
+        row = (Recipe.objects
+               .filter(pk=pk)
+               .values_list('updated_at', 'author__updated_at')
+               .first())
+    except (TypeError, ValueError):
+        return None
+    if row is None:
+        return None
+    return _validators(request, ('recipe', str(pk), *row), row)
+
+
+def recipe_list_validators(request, queryset):
+    aggregates = {
+        'count': Count('id'),
+        'updated_at': Max('updated_at'),
+        'authors_updated_at': Max('author__updated_at'),
+    }
+    # Рейтинг меняется без updated_at, а порядок выдачи зависит от
+    # рейтинга каждого рецепта, поэтому учитывается сумма, а не максимум.
+    if request.GET.get('ordering') == 'trending':
+        aggregates['trending'] = Sum('trending_score')
+    state = queryset.order_by().aggregate(**aggregates)
+    return _list_validators(
+        request, ('recipes', _query(request), *state.values()))
+
+
+def user_validators(request, pk):
+    try:
+        updated_at = (CustomUser.objects
+                      .filter(pk=pk)
+                      .values_list('updated_at', flat=True)
+                      .first())
+    except (TypeError, ValueError):
+        return None
+    if updated_at is None:
+        return None
+    return _validators(request, ('user', str(pk), updated_at),
+                       (updated_at,))
+
+
+def user_list_validators(request, queryset):
+    state = queryset.order_by().aggregate(count=Count('id'),
+                                          updated_at=Max('updated_at'))
+    return _list_validators(
+        request, ('users', _query(request), *state.values()))
+
+
+def current_user_validators(request):
+    if not request.user.is_authenticated:
+        return None
+    return _validators(request, ('me', request.user.updated_at),
+                       (request.user.updated_at,))
+
+
+def not_modified(request, validators):
+    """Ответ 304/412, если у клиента актуальная версия, иначе None."""
+    if validators is None or request.method not in ('GET', 'HEAD'):
+        return None
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag,
+                                    last_modified=last_modified)
+
+
+def set_validators(response, validators):
+    if validators is None or response.status_code not in (200, 304):
+        return response
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def conditional_get(get_validators):
+    """Декоратор действия DRF: ``get_validators(view, request, ...)``
+    возвращает результат одной из функций ``*_validators``."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            validators = None
+            if request.method in ('GET', 'HEAD'):
+                validators = get_validators(self, request, *args, **kwargs)
+            response = not_modified(request, validators)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+            return set_validators(response, validators)
+        return wrapper
+    return decorator
@@ -1,4 +1,5 @@
 """Константы проекта"""
+from datetime import datetime, timezone
 
 MIN_COOK_TIME = 1
 MAX_COOK_TIME = 32000
@@ -12,3 +13,77 @@ MAX_EMAIL_LEN = 254
 
 PAGE_SIZE = 6
 MAX_PAGE = 100
+
+SEARCH_CONFIG = 'russian'
+
+FEED_FANOUT_LIMIT = 1000
+# Обратно в запись лент автор возвращается, только потеряв заметную
+# часть подписчиков, чтобы не переключаться туда и обратно на границе.
+FEED_FANOUT_RESUME_LIMIT = 800
+FEED_BACKFILL_LIMIT = 50
+
+SIMILAR_RECIPES_LIMIT = 10
+MINHASH_SIZE = 128
+MINHASH_BANDS = 32
+
+TRENDING_HALF_LIFE_HOURS = 48
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_SHOPPING_CART_WEIGHT = 0.5
+TRENDING_EMPTY_SCORE = -1e6
+
+SHORT_CODE_LENGTH = 6
+SHORT_LINK_LRU_SIZE = 10000
+SHORT_LINK_CACHE_TIMEOUT = 24 * 60 * 60
+SHORT_LINK_MISS_TIMEOUT = 60
+
+# Начиная с этого числа строк (по статистике PostgreSQL) админка не
+# считает записи в таблице точно.
+ADMIN_EXACT_COUNT_LIMIT = 100000
+
+# Сколько клиентов помнит ограничитель частоты в памяти процесса.
+THROTTLE_LOCAL_MAX_KEYS = 100000
+
+# Версия формата готовых карточек рецептов: карточки другой версии
+# пересобираются при чтении.
+RECIPE_DOCUMENT_VERSION = 1
+RECIPE_DOCUMENT_BATCH_SIZE = 500
+
+# Шина инвалидации кэшей: канал LISTEN/NOTIFY, как часто слушатель
+# проверяет соединение, пауза перед переподключением (с) и предел размера
+# уведомления PostgreSQL (байт, с запасом от 8000).
+INVALIDATION_CHANNEL = 'foodgram_invalidation'
+INVALIDATION_POLL_INTERVAL = 5
+INVALIDATION_RECONNECT_DELAY = 1
+INVALIDATION_PAYLOAD_LIMIT = 7900
+INVALIDATION_MAX_ORIGINS = 1000
+
+# Потоковая выгрузка контента (dump_content/restore_content): версия
+# формата, строк на чтение курсором и объектов на одну вставку.
+DUMP_FORMAT_VERSION = 1
+DUMP_CHUNK_SIZE = 2000
+RESTORE_BATCH_SIZE = 1000
+
+# Популярность ингредиентов: вес попадания в список покупок относительно
+# рецепта с ингредиентом, веса событий динамики и размер выдачи
+# статистики по умолчанию.
+INGREDIENT_POPULARITY_CART_WEIGHT = 0.5
+INGREDIENT_TREND_RECIPE_WEIGHT = 1.0
+INGREDIENT_TREND_CART_WEIGHT = 0.5
+INGREDIENT_STATS_LIMIT = 20
+
+# Деградация чтения: сколько хранится последний удачный ответ (с), как часто
+# процесс обновляет его для одного адреса (с), предел размера ответа
+# (байт) и сколько адресов процесс помнит. Сохраняются только адреса без
+# параметров, кроме перечисленных, и первые страницы списков. SQLite
+# проверяет истечение времени запроса раз в столько инструкций.
+STALE_RESPONSE_TIMEOUT = 10 * 60
+STALE_RESPONSE_REFRESH = 10
+STALE_RESPONSE_MAX_SIZE = 1024 * 1024
+STALE_RESPONSE_LRU_SIZE = 10000
+STALE_RESPONSE_PARAMS = frozenset({'page', 'limit'})
+STALE_RESPONSE_MAX_PAGE = 3
+SQLITE_PROGRESS_STEPS = 1000
+
+# Сколько выборочных профилей ждут записи на диск; лишние отбрасываются.
+PROFILE_QUEUE_SIZE = 100
@@ -0,0 +1,256 @@
+"""Чтение из API при перегруженной базе.
+
+Представления перечисляют ограничиваемые действия в
+``timeout_scopes = {действие: область}``; время запросов области берётся
+из ``STATEMENT_TIMEOUTS``. Асинхронные представления (``async_views``)
+берут области у синхронных. Удачные ответы этих действий анонимным
+клиентам сохраняются в общем кэше на ``STALE_RESPONSE_TIMEOUT`` секунд
+отдельно для каждого адреса; поиск, фильтры и дальние страницы не
+сохраняются, чтобы число записей в кэш было ограничено. Ответы с
+авторизацией не сохраняются: при сбое базы токен проверить нельзя, а
+отозванный токен не должен открывать чужие данные. Действия из
+``view.stale_excluded_actions`` не сохраняются вовсе. Если запрос к
+базе не уложился во время или база недоступна, анонимный клиент
+получает последний удачный ответ с заголовками ``Age`` и
+``Warning: 110``, а остальные — 503 с ``Retry-After``.
+
+Автомат защиты (``CircuitBreaker``) считает ошибки базы в процессе:
+после ``DB_BREAKER_FAILURES`` ошибок за ``DB_BREAKER_WINDOW`` секунд
+ограничиваемые действия ``DB_BREAKER_COOLDOWN`` секунд не обращаются к
+базе, затем пропускается один пробный запрос. Запись не ограничивается.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from foodgram.statement_timeout import statement_timeout
+from recipes.short_links import LRUCache
+
+from .constants import (STALE_RESPONSE_LRU_SIZE,
+                        STALE_RESPONSE_MAX_PAGE,
+                        STALE_RESPONSE_MAX_SIZE,
+                        STALE_RESPONSE_PARAMS,
+                        STALE_RESPONSE_REFRESH,
+                        STALE_RESPONSE_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+# Заголовки, которые сохраняются вместе с содержимым ответа.
+STORED_HEADERS = ('Content-Type', 'Content-Disposition')
+
+
+class DatabaseUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'База данных перегружена, повторите запрос позже.'
+    default_code = 'database_unavailable'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+class CircuitBreaker:
+    """Замкнут, пока ошибок за окно меньше порога; разомкнутый
+    пропускает по одному пробному запросу раз в ``DB_BREAKER_COOLDOWN``
+    секунд, и первый удачный запрос замыкает его."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures = deque()
+        self._open_until = None
+
+    @property
+    def is_open(self):
+        return self._open_until is not None
+
+    def allow(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if now < self._open_until:
+                return False
+            self._open_until = now + settings.DB_BREAKER_COOLDOWN
+            return True
+
+    def retry_after(self):
+        if self._open_until is None:
+            return 1
+        return max(1, math.ceil(self._open_until - time.monotonic()))
+
+    def success(self):
+        if self._open_until is None:
+            return
+        with self._lock:
+            if self._open_until is not None:
+                logger.warning('База данных отвечает, чтение возобновлено')
+                self._open_until = None
+                self._failures.clear()
+
+    def failure(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._open_until is not None:
+                self._open_until = now + settings.DB_BREAKER_COOLDOWN
+                return
+            self._failures.append(now)
+            while self._failures[0] < now - settings.DB_BREAKER_WINDOW:
+                self._failures.popleft()
+            if len(self._failures) >= settings.DB_BREAKER_FAILURES:
+                logger.warning('База данных не отвечает, чтение '
+                               'приостановлено на %s с',
+                               settings.DB_BREAKER_COOLDOWN)
+                self._open_until = now + settings.DB_BREAKER_COOLDOWN
+                self._failures.clear()
+
+
+breaker = CircuitBreaker()
+
+
+def read_failed(request, error):
+    """Учитывает ошибку базы при чтении в автомате защиты."""
+    logger.warning('Ошибка базы при чтении %s: %s', request.path, error)
+    breaker.failure()
+
+
+# Когда процесс последний раз сохранял ответ по ключу.
+_stored_at = LRUCache(STALE_RESPONSE_LRU_SIZE)
+
+
+def _anonymous(request):
+    return 'HTTP_AUTHORIZATION' not in request.META
+
+
+def _stale_key(request):
+    digest = hashlib.sha256(request.get_full_path().encode()).hexdigest()
+    return f'stale:{digest}'
+
+
+def _recently_stored(key):
+    stored_at = _stored_at.get(key)
+    return (stored_at is not None
+            and time.monotonic() - stored_at < STALE_RESPONSE_REFRESH)
+
+
+def _first_page(request):
+    page = request.GET.get('page', '1')
+    return page.isdigit() and int(page) <= STALE_RESPONSE_MAX_PAGE
+
+
+def should_store(request, response):
+    """Ответ подходит для сохранения и давно не сохранялся процессом.
+    Не обращается к кэшу, поэтому асинхронные представления вызывают
+    ``store_response`` в потоке только после этой проверки."""
+    return (response.status_code == status.HTTP_200_OK
+            and _anonymous(request)
+            and not response.streaming
+            and STALE_RESPONSE_PARAMS.issuperset(request.GET)
+            and _first_page(request)
+            and not _recently_stored(_stale_key(request)))
+
+
+def store_response(request, response):
+    """Сохраняет удачный ответ; не чаще ``STALE_RESPONSE_REFRESH``."""
+    if not should_store(request, response):
+        return
+    # Заголовок Content-Type ответа DRF появляется при рендеринге.
+    if hasattr(response, 'render'):
+        response.render()
+    if (response['Content-Type'].startswith('text/html')
+            or len(response.content) > STALE_RESPONSE_MAX_SIZE):
+        return
+    key = _stale_key(request)
+    headers = {name: response[name] for name in STORED_HEADERS
+               if name in response}
+    try:
+        cache.set(key, (time.time(), response.content, headers),
+                  STALE_RESPONSE_TIMEOUT)
+    except Exception:
+        logger.warning('Ответ для отдачи при сбое базы не сохранён',
+                       exc_info=True)
+        return
+    _stored_at.set(key, time.monotonic())
+
+
+def stale_response(request):
+    """Последний удачный ответ с пометкой устаревшего или ``None``."""
+    if not _anonymous(request):
+        return None
+    try:
+        stored = cache.get(_stale_key(request))
+    except Exception:
+        logger.warning('Сохранённый ответ недоступен', exc_info=True)
+        return None
+    if stored is None:
+        return None
+    stored_at, content, headers = stored
+    response = HttpResponse(content, headers=headers)
+    response['Age'] = max(0, int(time.time() - stored_at))
+    response['Warning'] = '110 - "Response is Stale"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class StaleFallbackMixin:
+    """Ограничение времени запросов к базе и отдача сохранённых ответов
+    для действий из ``view.timeout_scopes``."""
+
+    timeout_scopes = {}
+    stale_excluded_actions = frozenset()
+    timeout_scope = None
+    served_stale = False
+
+    @property
+    def stores_stale(self):
+        return (self.timeout_scope is not None
+                and self.action not in self.stale_excluded_actions)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            self.timeout_scope = self.timeout_scopes.get(
+                self.action_map.get(request.method.lower()))
+        if self.timeout_scope is None:
+            return super().dispatch(request, *args, **kwargs)
+        with statement_timeout(
+                settings.STATEMENT_TIMEOUTS[self.timeout_scope]):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        # Пока автомат разомкнут, запрос не доходит даже до проверки
+        # токена в базе.
+        if self.timeout_scope is not None and not breaker.allow():
+            raise DatabaseUnavailable(breaker.retry_after())
+        super().initial(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if self.timeout_scope is not None and isinstance(
+                exc, (OperationalError, DatabaseUnavailable)):
+            if isinstance(exc, OperationalError):
+                read_failed(self.request, exc)
+                exc = DatabaseUnavailable(breaker.retry_after())
+            response = (stale_response(self.request)
+                        if self.stores_stale else None)
+            if response is not None:
+                self.served_stale = True
+                return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args,
+                                             **kwargs)
+        if self.timeout_scope is not None and not self.served_stale:
+            if response.status_code < 500:
+                breaker.success()
+            if self.stores_stale:
+                store_response(request, response)
+        return response
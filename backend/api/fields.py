@@ -0,0 +1,15 @@
+from rest_framework import serializers
+
+
+class Base64ImageField(serializers.ImageField):
+    """Изображение в base64 (``drf_extra_fields``).
+
+    Модуль поля вместе с Pillow импортируется при первой загрузке
+    изображения, а не при старте воркера: чтение отдаёт только ссылки.
+    """
+
+    def to_internal_value(self, data):
+        from drf_extra_fields.fields import Base64ImageField
+
+        return Base64ImageField(
+            *self._args, **self._kwargs).to_internal_value(data)
@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 from recipes.models import Recipe
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
@@ -9,9 +10,10 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_by_shopping_cart')
     author = filters.NumberFilter(field_name='author')
+    search = filters.CharFilter(method='filter_by_search')
 
     class Meta:
-        model = Recipe 
+        model = Recipe
         fields = ['author',]
 
     def filter_by_favorite(self, queryset, name, value):
@@ -27,3 +29,7 @@ class RecipeFilter(filters.FilterSet):
         if value and current_user.is_authenticated:
             return queryset.filter(in_shopping_carts__user=current_user)
         return queryset
+
+    def filter_by_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию рецепта."""
+        return search_recipes(queryset, value)
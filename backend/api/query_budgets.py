@@ -0,0 +1,57 @@
+"""Бюджеты SQL-запросов для списковых эндпоинтов и списков админки.
+
+Проверяются тестами ``api.tests.test_query_budgets`` на тестовом наборе
+данных: число запросов не должно превышать бюджет и зависеть от размера
+страницы, а одинаковые по структуре запросы не должны повторяться.
+Метки совпадают с метриками ``foodgram_http_request_*``.
+"""
+from typing import NamedTuple
+
+
+class Budget(NamedTuple):
+    label: str
+    path: str
+    queries: int
+    authenticated: bool = True
+    paginated: bool = True
+    staff: bool = False
+
+
+BUDGETS = (
+    Budget('RecipeViewSet.list', '/api/recipes/', 4),
+    Budget('RecipeViewSet.list', '/api/recipes/', 3, authenticated=False),
+    Budget('RecipeViewSet.list', '/api/recipes/?is_favorited=1', 4),
+    # Токен, валидаторы условного GET с суммой рейтинга и страница.
+    Budget('RecipeViewSet.list', '/api/recipes/?ordering=trending', 3),
+    Budget('RecipeViewSet.list', '/api/recipes/?search={recipe_name}', 4),
+    Budget('RecipeViewSet.list', '/api/recipes/?fields=id,name,image', 4),
+    Budget('RecipeViewSet.feed', '/api/recipes/feed/', 4),
+    Budget('RecipeViewSet.find_by_ingredients',
+           '/api/recipes/by_ingredients/?ingredients={ingredient_ids}', 2),
+    Budget('RecipeViewSet.similar', '/api/recipes/{recipe_id}/similar/', 2,
+           paginated=False),
+    Budget('UserProfileViewSet.list', '/api/users/', 4),
+    Budget('UserProfileViewSet.get_subscribed_authors_list',
+           '/api/users/subscriptions/', 4),
+    Budget('UserProfileViewSet.get_subscribed_authors_list',
+           '/api/users/subscriptions/?recipes_limit=2', 4),
+    Budget('IngredientViewSet.list', '/api/ingredients/', 1,
+           authenticated=False, paginated=False),
+    Budget('IngredientViewSet.list', '/api/ingredients/?name=ингр', 1,
+           authenticated=False, paginated=False),
+    Budget('RecipeAdmin.changelist_view', '/admin/recipes/recipe/', 4,
+           paginated=False, staff=True),
+    Budget('RecipeAdmin.changelist_view',
+           '/admin/recipes/recipe/?q={recipe_name}', 4,
+           paginated=False, staff=True),
+    Budget('FavoriteAdmin.changelist_view', '/admin/recipes/favorites/', 4,
+           paginated=False, staff=True),
+    Budget('ShoppingCartAdmin.changelist_view',
+           '/admin/recipes/shoppingcart/', 4, paginated=False, staff=True),
+    Budget('IngredientAdmin.changelist_view', '/admin/recipes/ingredient/',
+           4, paginated=False, staff=True),
+    Budget('CustomUserAdmin.changelist_view', '/admin/users/customuser/', 4,
+           paginated=False, staff=True),
+    Budget('SubscriptionAdmin.changelist_view', '/admin/users/subscription/',
+           4, paginated=False, staff=True),
+)
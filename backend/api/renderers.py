@@ -0,0 +1,40 @@
+"""JSON-рендерер на orjson.
+
+Вывод совпадает с ``rest_framework.renderers.JSONRenderer`` при
+настройках по умолчанию (компактный JSON в UTF-8): даты и прочие
+нестандартные типы передаются кодировщику DRF.
+"""
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from foodgram.request_timing import timed
+
+OPTIONS = (orjson.OPT_NON_STR_KEYS
+           | orjson.OPT_PASSTHROUGH_DATETIME
+           | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+_encoder = JSONEncoder()
+
+
+@timed('render')
+def dumps(data):
+    content = orjson.dumps(data, default=_encoder.default, option=OPTIONS)
+    # Как и JSONRenderer, экранируем разделители строк U+2028/U+2029.
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = (content.replace(b'\xe2\x80\xa8', b'\\u2028')
+                   .replace(b'\xe2\x80\xa9', b'\\u2029'))
+    return content
+
+
+class ORJSONRenderer(JSONRenderer):
+    """С отступами (браузерный API, ``Accept: ...; indent=4``) работает
+    стандартный рендерер."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return dumps(data)
@@ -0,0 +1,300 @@
+"""Построение ответов API из моделей без сериализаторов DRF.
+
+Функции повторяют формат ``RecipeDetailSerializer``,
+``ShortRecipeSerializer``, ``UserProfileSerializer`` и
+``IngredientSerializer`` и рассчитаны на объекты, для которых связанные
+данные и флаги текущего пользователя уже загружены запросом
+(см. ``recipe_queryset`` и ``user_queryset``). Рецепты, прочитанные
+вместе с готовой карточкой (``recipes.documents``), строятся из неё.
+"""
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q, Value
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from recipes.documents import document_queryset, loaded_document
+from recipes.ingredient_stats import popularity
+from recipes.models import (Favorites,
+                            Ingredient,
+                            IngredientInRecipe,
+                            IngredientStats,
+                            Recipe,
+                            ShoppingCart)
+from recipes.trending import decayed
+from foodgram.request_timing import timed
+from users.models import CustomUser, Subscription
+
+from .constants import INGREDIENT_STATS_LIMIT, MAX_PAGE
+
+RECIPE_FIELDS = ('id', 'name', 'image', 'author', 'text', 'cooking_time',
+                 'ingredients', 'is_favorited', 'is_in_shopping_cart')
+# Поля, ради которых читается карточка рецепта: без неё они требуют
+# соединения с автором или отдельного запроса состава.
+DOCUMENT_FIELDS = frozenset({'author', 'ingredients'})
+
+# Сортировки списка ингредиентов и их статистики; первая - по умолчанию.
+INGREDIENT_ORDERINGS = ('popularity', 'name')
+INGREDIENT_STATS_ORDERINGS = {
+    'popularity': (popularity('').desc(), 'ingredient__name'),
+    'recipes': ('-recipes_count', 'ingredient__name'),
+    'cart': ('-cart_count', 'ingredient__name'),
+    'trend': ('-trend_score', 'ingredient__name'),
+}
+USER_FIELDS = ('username', 'first_name', 'last_name', 'id', 'email',
+               'avatar', 'is_subscribed')
+
+
+def file_url(request, file):
+    """Абсолютная ссылка на файл, как у ``ImageField`` в DRF."""
+    if not file:
+        return None
+    if request is None:
+        return file.url
+    return request.build_absolute_uri(file.url)
+
+
+def sparse_fields(query_params, available):
+    """Поля ответа по параметрам ``fields`` и ``omit`` (через запятую).
+
+    Возвращает кортеж в порядке ``available`` или ``None``, если ответ
+    нужен полностью.
+    """
+    requested = {name
+                 for value in query_params.getlist('fields')
+                 for name in value.split(',') if name}
+    omitted = {name
+               for value in query_params.getlist('omit')
+               for name in value.split(',') if name}
+    if not requested and not omitted:
+        return None
+    unknown = (requested | omitted).difference(available)
+    if unknown:
+        raise ValidationError({
+            'fields': 'Неизвестные поля: {}.'.format(
+                ', '.join(sorted(unknown)))
+        })
+    return tuple(name for name in available
+                 if (not requested or name in requested)
+                 and name not in omitted)
+
+
+def _ordering(query_params, available):
+    ordering = query_params.get('ordering') or next(iter(available))
+    if ordering not in available:
+        raise ValidationError({
+            'ordering': 'Неизвестная сортировка: {}. Доступны: {}.'.format(
+                ordering, ', '.join(available))
+        })
+    return ordering
+
+
+def _limit(query_params, default, maximum):
+    try:
+        limit = int(query_params.get('limit') or default)
+    except ValueError:
+        raise ValidationError({'limit': 'Ожидается целое число.'})
+    return max(1, min(limit, maximum))
+
+
+def ingredient_queryset(query_params):
+    """Ингредиенты по началу названия (``name``): сначала популярные,
+    ``ordering=name`` - по алфавиту."""
+    queryset = Ingredient.objects.all()
+    if name := query_params.get('name'):
+        queryset = queryset.filter(name__istartswith=name)
+    if _ordering(query_params, INGREDIENT_ORDERINGS) == 'name':
+        return queryset.order_by('name')
+    return queryset.order_by(popularity().desc(), 'name')
+
+
+def ingredient_stats_queryset(query_params):
+    """Самые используемые ингредиенты по сводке ``IngredientStats``."""
+    ordering = _ordering(query_params, INGREDIENT_STATS_ORDERINGS)
+    limit = _limit(query_params, INGREDIENT_STATS_LIMIT, MAX_PAGE)
+    return IngredientStats.objects.select_related('ingredient').filter(
+        Q(recipes_count__gt=0) | Q(cart_count__gt=0)
+    ).order_by(*INGREDIENT_STATS_ORDERINGS[ordering])[:limit]
+
+
+def recipe_queryset(user, fields=None, documents=True):
+    """Рецепты со всем необходимым для ``recipe_representation``.
+
+    Автор, описание и состав берутся из готовой карточки рецепта тем же
+    запросом. С ``documents=False`` они читаются из таблиц — так карточка
+    не нужна сразу после записи рецепта. Если в ``fields`` нет автора и
+    состава, карточка не читается: поля берутся из таблиц, описание —
+    только по запросу. Флаги пользователя запрашиваются только для
+    ``fields``.
+    """
+    if fields is None:
+        fields = RECIPE_FIELDS
+    if documents and DOCUMENT_FIELDS.intersection(fields):
+        queryset = document_queryset()
+    else:
+        queryset = Recipe.objects.all()
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('ingredients_in_recipe',
+                         queryset=IngredientInRecipe.objects.select_related(
+                             'ingredient')))
+    flags = {
+        'is_favorited': (
+            'is_favorited',
+            lambda: Favorites.objects.filter(user=user,
+                                             recipe=OuterRef('pk'))),
+        'is_in_shopping_cart': (
+            'is_in_shopping_cart',
+            lambda: ShoppingCart.objects.filter(user=user,
+                                                recipe=OuterRef('pk'))),
+        'author_is_subscribed': (
+            'author',
+            lambda: Subscription.objects.filter(user=user,
+                                                author=OuterRef('author'))),
+    }
+    return queryset.annotate(**{
+        name: (Exists(subquery()) if user.is_authenticated
+               else Value(False))
+        for name, (field, subquery) in flags.items() if field in fields
+    })
+
+
+def annotate_is_subscribed(queryset, user, fields=None):
+    if fields is not None and 'is_subscribed' not in fields:
+        return queryset
+    if not user.is_authenticated:
+        return queryset.annotate(is_subscribed=Value(False))
+    return queryset.annotate(
+        is_subscribed=Exists(Subscription.objects.filter(
+            user=user, author=OuterRef('pk'))))
+
+
+def user_queryset(user, fields=None):
+    """Пользователи с флагом подписки текущего пользователя."""
+    return annotate_is_subscribed(CustomUser.objects.all(), user, fields)
+
+
+def subscribed_authors_queryset(user, recipes_limit=None):
+    """Авторы, на которых подписан пользователь, с числом рецептов и
+    первыми ``recipes_limit`` рецептами в ``prefetched_recipes``."""
+    recipes = Recipe.objects.only('id', 'name', 'image', 'cooking_time',
+                                  'author_id')
+    if recipes_limit is not None:
+        recipes = recipes[:recipes_limit]
+    return CustomUser.objects.filter(authors__user=user).annotate(
+        is_subscribed=Value(True),
+        recipes_count=Count('recipes', distinct=True),
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='prefetched_recipes')
+    ).order_by('id')
+
+
+_USER_GETTERS = {
+    'username': lambda request, user, is_subscribed: user.username,
+    'first_name': lambda request, user, is_subscribed: user.first_name,
+    'last_name': lambda request, user, is_subscribed: user.last_name,
+    'id': lambda request, user, is_subscribed: user.id,
+    'email': lambda request, user, is_subscribed: user.email,
+    'avatar': lambda request, user, is_subscribed: file_url(request,
+                                                            user.avatar),
+    'is_subscribed': lambda request, user, is_subscribed: is_subscribed,
+}
+
+
+@timed('serialize')
+def user_representation(request, user, is_subscribed, fields=None):
+    return {name: _USER_GETTERS[name](request, user, is_subscribed)
+            for name in (USER_FIELDS if fields is None else fields)}
+
+
+@timed('serialize')
+def ingredient_representation(ingredient):
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+    }
+
+
+@timed('serialize')
+def ingredient_stats_representation(stats, now=None):
+    ingredient = stats.ingredient
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+        'recipes_count': stats.recipes_count,
+        'cart_count': stats.cart_count,
+        'trend': round(decayed(stats.trend_score, now or timezone.now()),
+                       6),
+    }
+
+
+@timed('serialize')
+def short_recipe_representation(request, recipe):
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'image': file_url(request, recipe.image),
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+_RECIPE_GETTERS = {
+    'id': lambda request, recipe: recipe.id,
+    'name': lambda request, recipe: recipe.name,
+    'image': lambda request, recipe: file_url(request, recipe.image),
+    'author': lambda request, recipe: user_representation(
+        request, recipe.author, recipe.author_is_subscribed),
+    'text': lambda request, recipe: recipe.text,
+    'cooking_time': lambda request, recipe: recipe.cooking_time,
+    'ingredients': lambda request, recipe: [
+        {
+            'id': item.ingredient.id,
+            'name': item.ingredient.name,
+            'amount': item.amount,
+            'measurement_unit': item.ingredient.measurement_unit,
+        }
+        for item in recipe.ingredients_in_recipe.all()
+    ],
+    'is_favorited': lambda request, recipe: recipe.is_favorited,
+    'is_in_shopping_cart': lambda request, recipe: recipe.is_in_shopping_cart,
+}
+
+
+def _absolute_url(request, url):
+    if url is None or request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+def _document_author(request, recipe, document):
+    author = dict(document['author'],
+                  avatar=_absolute_url(request, document['author']['avatar']),
+                  is_subscribed=recipe.author_is_subscribed)
+    return {name: author[name] for name in USER_FIELDS}
+
+
+_DOCUMENT_GETTERS = {
+    'image': lambda request, recipe, document: _absolute_url(
+        request, document['image']),
+    'author': _document_author,
+    'is_favorited': lambda request, recipe, document: recipe.is_favorited,
+    'is_in_shopping_cart': lambda request, recipe, document: (
+        recipe.is_in_shopping_cart),
+}
+
+
+@timed('serialize')
+def recipe_representation(request, recipe, fields=None):
+    if fields is None:
+        fields = RECIPE_FIELDS
+    document = loaded_document(recipe)
+    if document is None:
+        return {name: _RECIPE_GETTERS[name](request, recipe)
+                for name in fields}
+    return {name: (_DOCUMENT_GETTERS[name](request, recipe, document)
+                   if name in _DOCUMENT_GETTERS else document[name])
+            for name in fields}
@@ -1,13 +1,19 @@
+from django.db import transaction
 from rest_framework import serializers
-from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import UserSerializer
 from rest_framework.exceptions import ValidationError
-from users.models import CustomUser, Subscription
+from users.models import CustomUser
 from recipes.models import (Ingredient,
                             Recipe,
-                            IngredientInRecipe,
-                            Favorites,
-                            ShoppingCart)
+                            IngredientInRecipe)
+from recipes.signals import ingredients_changed
+from .fields import Base64ImageField
+from .representations import (RECIPE_FIELDS,
+                              ingredient_representation,
+                              recipe_queryset,
+                              recipe_representation,
+                              short_recipe_representation,
+                              user_representation)
 from .constants import (MAX_AMOUNT,
                         MIN_AMOUNT,
                         MIN_COOK_TIME,
@@ -27,9 +33,18 @@ class UserProfileSerializer(UserSerializer):
     def get_is_subscribed(self, instance):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return instance.subscribers.filter(user=request.user).exists()
+            return instance.authors.filter(user=request.user).exists()
         return False
 
+    def to_representation(self, instance):
+        fields = self.context.get('fields')
+        is_subscribed = getattr(instance, 'is_subscribed', None)
+        if is_subscribed is None and (fields is None
+                                      or 'is_subscribed' in fields):
+            is_subscribed = self.get_is_subscribed(instance)
+        return user_representation(self.context.get('request'), instance,
+                                   is_subscribed, fields)
+
 
 class AvatarUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для обновления аватара пользователя."""
@@ -41,39 +56,6 @@ class AvatarUpdateSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
-class SubscribeActionSerializer(serializers.Serializer):
-    """Сериализатор работы с подписками."""
-
-    user = serializers.PrimaryKeyRelatedField(
-        queryset=CustomUser.objects.all())
-    author = serializers.PrimaryKeyRelatedField(
-        queryset=CustomUser.objects.all())
-
-    class Meta:
-        model = Subscription
-        fields = ('author',)
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'author'),
-                message='Вы уже подписаны на этого пользователя'
-            )
-        ]
-
-    def validate(self, attrs):
-        if attrs['user'] == attrs['author']:
-            raise serializers.ValidationError(
-                {'author': 'Нельзя подписаться на себя.'}
-            )
-        return attrs
-
-    def create(self, validated_data):
-        user = validated_data['user']
-        author = validated_data['author']
-        Subscription.objects.create(user=user, author=author)
-        return validated_data
-
-
 class AuthorDetailSerializer(UserProfileSerializer):
     """Сериализатор для отображения автора с рецептами."""
 
@@ -88,6 +70,9 @@ class AuthorDetailSerializer(UserProfileSerializer):
 
     def get_recipes(self, author):
         request = self.context.get('request')
+        if hasattr(author, 'prefetched_recipes'):
+            return [short_recipe_representation(request, recipe)
+                    for recipe in author.prefetched_recipes]
         recipes = author.recipes.all()
 
         if limit := request.query_params.get('recipes_limit'):
@@ -104,6 +89,12 @@ class AuthorDetailSerializer(UserProfileSerializer):
             return obj.recipes_count
         return obj.recipes.count()
 
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        representation['recipes'] = self.get_recipes(instance)
+        representation['recipes_count'] = self.get_recipes_count(instance)
+        return representation
+
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого представления рецепта."""
@@ -112,6 +103,10 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
+    def to_representation(self, instance):
+        return short_recipe_representation(self.context.get('request'),
+                                           instance)
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для представления данных ингредиента."""
@@ -120,6 +115,9 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
+    def to_representation(self, instance):
+        return ingredient_representation(instance)
+
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для ингридиентов в рецепте."""
@@ -142,6 +140,20 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'amount', 'measurement_unit')
 
 
+class RecipeIngredientWriteSerializer(serializers.Serializer):
+    """Ингредиент в запросе на запись рецепта.
+
+    Существование ингредиентов проверяет ``RecipeCreateUpdateSerializer``
+    одним запросом на весь список.
+    """
+
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField(
+        min_value=MIN_AMOUNT,
+        max_value=MAX_AMOUNT
+    )
+
+
 class RecipeDetailSerializer(serializers.ModelSerializer):
     """Сериализатор для детального представления рецепта."""
 
@@ -172,6 +184,50 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
     def get_is_in_shopping_cart(self, obj):
         return self._check_relation(obj, 'in_shopping_carts')
 
+    def to_representation(self, instance):
+        """Флаги пользователя берутся из аннотаций ``recipe_queryset``,
+        а без них считаются отдельными запросами."""
+        fields = self.context.get('fields')
+        if fields is not None:
+            fields = tuple(name for name in fields if name in RECIPE_FIELDS)
+        required = RECIPE_FIELDS if fields is None else fields
+        user = self.context['request'].user
+        if ('is_favorited' in required
+                and not hasattr(instance, 'is_favorited')):
+            instance.is_favorited = self.get_is_favorited(instance)
+        if ('is_in_shopping_cart' in required
+                and not hasattr(instance, 'is_in_shopping_cart')):
+            instance.is_in_shopping_cart = self.get_is_in_shopping_cart(
+                instance)
+        if ('author' in required
+                and not hasattr(instance, 'author_is_subscribed')):
+            instance.author_is_subscribed = (
+                user.is_authenticated
+                and instance.author.authors.filter(user=user).exists())
+        return recipe_representation(self.context['request'], instance,
+                                     fields)
+
+
+class RecipeCoverageSerializer(RecipeDetailSerializer):
+    """Сериализатор рецепта в поиске по имеющимся ингредиентам."""
+
+    missing_count = serializers.SerializerMethodField()
+
+    class Meta(RecipeDetailSerializer.Meta):
+        fields = RecipeDetailSerializer.Meta.fields + ('missing_count',)
+        read_only_fields = fields
+
+    def get_missing_count(self, obj):
+        return self.context['missing'][obj.id]
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        fields = self.context.get('fields')
+        if fields is None or 'missing_count' in fields:
+            representation['missing_count'] = self.get_missing_count(
+                instance)
+        return representation
+
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
@@ -181,7 +237,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         min_value=MIN_COOK_TIME,
         max_value=MAX_COOK_TIME
     )
-    ingredients = RecipeIngredientSerializer(many=True)
+    ingredients = RecipeIngredientWriteSerializer(many=True)
 
     class Meta:
         model = Recipe
@@ -199,6 +255,22 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                 {'ingredients': ['Ингредиенты должны быть уникальными']}
             )
 
+    def validate_ingredients(self, ingredients):
+        """Подставляет объекты ингредиентов, загружая их одним запросом."""
+        found = Ingredient.objects.in_bulk(
+            {data['id'] for data in ingredients})
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist']
+        errors = [
+            {} if data['id'] in found
+            else {'id': [message.format(pk_value=data['id'])]}
+            for data in ingredients
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+        return [{'ingredient': found[data['id']], 'amount': data['amount']}
+                for data in ingredients]
+
     def validate(self, data):
         ingredients = self.initial_data.get('ingredients', [])
         self._validate_ingredients(ingredients)
@@ -210,79 +282,68 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
         return data
 
-    def _set_recipe_ingredients(self, recipe, ingredients_data):
-        recipe.ingredients_in_recipe.all().delete()
+    def _set_recipe_ingredients(self, recipe, ingredients_data,
+                                rows=()):
+        """Приводит состав рецепта к ``ingredients_data`` минимальными
+        пакетами вставок, обновлений и удалений; ``rows`` — текущие
+        строки состава."""
+        amounts = {data['ingredient'].id: data['amount']
+                   for data in ingredients_data}
+        previous_ids = {row.ingredient_id for row in rows}
+        existing, stale, changed = {}, [], []
+        for row in rows:
+            if (row.ingredient_id in existing
+                    or row.ingredient_id not in amounts):
+                stale.append(row.id)
+                continue
+            existing[row.ingredient_id] = row
+            if row.amount != amounts[row.ingredient_id]:
+                row.amount = amounts[row.ingredient_id]
+                changed.append(row)
+
+        if stale:
+            IngredientInRecipe.objects.filter(id__in=stale).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
         IngredientInRecipe.objects.bulk_create([
-            IngredientInRecipe(
-                recipe=recipe,
-                ingredient=ingredient_data['ingredient'],
-                amount=ingredient_data['amount']
-            )
-            for ingredient_data in ingredients_data
+            IngredientInRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                               amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
         ])
+        # Получателям сигнала важен только набор ингредиентов, а дату
+        # изменения рецепта обновляет его сохранение.
+        if set(amounts) != previous_ids:
+            ingredients_changed.send(
+                sender=Recipe,
+                recipe_id=recipe.id,
+                ingredient_ids=set(amounts),
+                previous_ids=previous_ids,
+            )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         recipe = super().create(validated_data)
         self._set_recipe_ingredients(recipe, ingredients_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
         instance = super().update(instance, validated_data)
         if ingredients_data is not None:
-            self._set_recipe_ingredients(instance, ingredients_data)
+            rows = list(instance.ingredients_in_recipe.order_by())
+            self._set_recipe_ingredients(instance, ingredients_data, rows)
         return instance
 
     def to_representation(self, instance):
+        # Перечитываем рецепт с составом и флагами пользователя двумя
+        # запросами вместо запроса на каждый ингредиент. Карточка
+        # пересобирается после коммита, поэтому читаем из таблиц.
+        instance = recipe_queryset(self.context['request'].user,
+                                   documents=False).get(pk=instance.pk)
         return RecipeDetailSerializer(
             instance,
             context=self.context
         ).data
-
-
-class UserRecipeActionSerializer(serializers.ModelSerializer):
-    """Базовый сериализатор для действий с рецептами."""
-
-    def validate(self, data):
-        if data['user'] == data['recipe'].author:
-            raise serializers.ValidationError(
-                'Собственный рецепт нельзя обрабатывать'
-            )
-        return data
-
-    def to_representation(self, instance):
-        return ShortRecipeSerializer(
-            instance.recipe,
-            context=self.context
-        ).data
-
-
-class FavoriteSerializer(UserRecipeActionSerializer):
-    """Сериализатор для избранных рецептов."""
-
-    class Meta:
-        model = Favorites
-        fields = ('user', 'recipe')
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=Favorites.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже в избранном'
-            )
-        ]
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка покупок."""
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже в корзине'
-            )
-        ]
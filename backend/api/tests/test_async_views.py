@@ -0,0 +1,119 @@
+"""Асинхронные читающие эндпоинты отвечают так же, как синхронные
+представления DRF: тот же статус, тело и заголовки."""
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, Client, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.throttling import get_store
+from recipes.models import Favorites, Ingredient, ShoppingCart
+from recipes.tests.factories import create_recipe, create_user
+from users.models import Subscription
+
+MISSING = 10 ** 6
+
+
+class AsyncParityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls._seed()
+        cls.token = Token.objects.create(user=cls.viewer)
+
+    @classmethod
+    def _seed(cls):
+        cls.viewer, cls.author = (
+            create_user(name, first_name=name.title(), last_name='Тестов',
+                        avatar=avatar)
+            for name, avatar in (('viewer', ''),
+                                 ('author', 'users/avatar.png')))
+        Subscription.objects.create(user=cls.viewer, author=cls.author)
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in (('сахар', 'г'), ('соль', 'г'),
+                               ('молоко', 'мл')))
+        cls.recipes = [
+            create_recipe(
+                cls.author, f'рецепт {number}',
+                {ingredient: amount for amount, ingredient in enumerate(
+                    cls.ingredients[number:], start=1)},
+                cooking_time=10 + number)
+            for number in range(3)]
+        Favorites.objects.create(user=cls.viewer, recipe=cls.recipes[0])
+        for recipe in cls.recipes[:2]:
+            ShoppingCart.objects.create(user=cls.viewer, recipe=recipe)
+
+    async def _responses(self, path, headers):
+        """Ответы синхронного и асинхронного представлений."""
+        # Оба запроса должны застать одинаковый бюджет ограничителя.
+        get_store().clear()
+        expected = await sync_to_async(Client().get)(path, headers=headers)
+        get_store().clear()
+        with override_settings(ROOT_URLCONF='foodgram.urls_asgi'):
+            response = await AsyncClient().get(path, headers=headers)
+        return expected, response
+
+    async def assertSameResponse(self, path, authenticated=False,
+                                 headers=None):
+        headers = dict(headers or {})
+        if authenticated:
+            headers['Authorization'] = f'Token {self.token.key}'
+        expected, response = await self._responses(path, headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        # Server-Timing содержит длительности, они у запросов разные.
+        self.assertEqual(
+            {name: value for name, value in response.headers.items()
+             if name != 'Server-Timing'},
+            {name: value for name, value in expected.headers.items()
+             if name != 'Server-Timing'})
+        return response
+
+    async def test_recipes(self):
+        recipe = self.recipes[0]
+        for path in ('/api/recipes/', '/api/recipes/?limit=2&page=2',
+                     f'/api/recipes/?author={self.author.id}',
+                     '/api/recipes/?is_favorited=1',
+                     '/api/recipes/?is_in_shopping_cart=1',
+                     f'/api/recipes/{recipe.id}/',
+                     f'/api/recipes/{MISSING}/'):
+            for authenticated in (False, True):
+                with self.subTest(path=path, authenticated=authenticated):
+                    await self.assertSameResponse(path, authenticated)
+
+    async def test_shopping_cart_download(self):
+        path = '/api/recipes/download_shopping_cart/'
+        response = await self.assertSameResponse(path, authenticated=True)
+        self.assertEqual(response.status_code, 200)
+        response = await self.assertSameResponse(path)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_ingredients(self):
+        for path in ('/api/ingredients/', '/api/ingredients/?name=С',
+                     '/api/ingredients/?name=нет такого',
+                     f'/api/ingredients/{self.ingredients[0].id}/',
+                     f'/api/ingredients/{MISSING}/'):
+            with self.subTest(path=path):
+                await self.assertSameResponse(path)
+
+    async def test_users(self):
+        for path in (f'/api/users/{self.author.id}/',
+                     f'/api/users/{self.viewer.id}/',
+                     f'/api/users/{MISSING}/', '/api/users/me/'):
+            for authenticated in (False, True):
+                with self.subTest(path=path, authenticated=authenticated):
+                    await self.assertSameResponse(path, authenticated)
+
+    async def test_not_modified(self):
+        for path in ('/api/recipes/', f'/api/recipes/{self.recipes[0].id}/',
+                     f'/api/users/{self.author.id}/'):
+            with self.subTest(path=path):
+                _, response = await self._responses(path, {})
+                response = await self.assertSameResponse(
+                    path, headers={'If-None-Match': response['ETag']})
+                self.assertEqual(response.status_code, 304)
+
+    async def test_invalid_token(self):
+        response = await self.assertSameResponse(
+            '/api/recipes/', headers={'Authorization': 'Token invalid'})
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,60 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorites
+from recipes.tests.factories import create_recipe, create_user
+
+
+class RecipeListValidatorsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipes = [create_recipe(cls.author, f'рецепт {number}')
+                       for number in range(3)]
+
+    def setUp(self):
+        # Отметка времени отношений читателя меняет ETag сама по себе,
+        # поэтому список смотрит аноним.
+        self.client = APIClient()
+
+    def _etag(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, 304)
+        return response['ETag']
+
+    def test_trending_etag_follows_scores(self):
+        path = '/api/recipes/?ordering=trending'
+        before = self._etag(path)
+        Favorites.objects.create(user=self.reader, recipe=self.recipes[1])
+        self.assertNotEqual(self._etag(path), before)
+
+    def test_default_etag_ignores_scores(self):
+        path = '/api/recipes/'
+        before = self._etag(path)
+        Favorites.objects.create(user=self.reader, recipe=self.recipes[1])
+        self.assertEqual(self._etag(path), before)
+
+    def test_lists_send_only_etag(self):
+        for path in ('/api/recipes/', '/api/users/'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+        response = self.client.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertIn('Last-Modified', response)
+
+    def test_if_modified_since_ignored_for_lists(self):
+        since = 'Wed, 01 Jan 2100 00:00:00 GMT'
+        self.recipes[2].delete()
+        response = self.client.get('/api/recipes/',
+                                   HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        response = self.client.get(f'/api/recipes/{self.recipes[0].id}/',
+                                   HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,217 @@
+import time
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import (AsyncClient, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.degradation import _stored_at, breaker
+from foodgram.statement_timeout import StatementTimeout, statement_timeout
+from recipes.models import Ingredient
+from recipes.tests.factories import create_user, token_client
+
+TIMEOUT = 200
+COOLDOWN = 0.5
+# Запрос, который выполняется заведомо дольше ограничения.
+SLOW_QUERIES = {
+    'postgresql': 'SELECT pg_sleep(5)',
+    'sqlite': ('WITH RECURSIVE numbers(value) AS (SELECT 1 UNION ALL '
+               'SELECT value + 1 FROM numbers WHERE value < 1000000000) '
+               'SELECT count(*) FROM numbers'),
+}
+
+
+class SlowDatabase:
+    """Перед каждым запросом соединения выполняет медленный запрос."""
+
+    def __call__(self, execute, sql, params, many, context):
+        execute(SLOW_QUERIES[connection.vendor], None, False, context)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+
+@asynccontextmanager
+async def slow_database():
+    """``SlowDatabase`` для асинхронных тестов: запросы идут в потоке
+    ``sync_to_async`` со своим соединением."""
+    slow = SlowDatabase()
+    await sync_to_async(slow.__enter__)()
+    try:
+        yield
+    finally:
+        await sync_to_async(slow.__exit__)(None, None, None)
+
+
+def _timed_get(client, path, **kwargs):
+    started = time.monotonic()
+    response = client.get(path, **kwargs)
+    return response, (time.monotonic() - started) * 1000
+
+
+# PostgreSQL прерывает транзакцию вместе с запросом, поэтому проверки
+# идут без обёртывающей тест транзакции.
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.'
+                        'backends.locmem.LocMemCache'}},
+    STATEMENT_TIMEOUTS=dict.fromkeys(('read', 'list', 'shopping_list'),
+                                     TIMEOUT),
+    DB_BREAKER_FAILURES=3, DB_BREAKER_WINDOW=60,
+    DB_BREAKER_COOLDOWN=COOLDOWN)
+class DegradationTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        _stored_at.clear()
+        self.addCleanup(breaker.success)
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.tokens = []
+        for number in range(2):
+            self.tokens.append(Token.objects.create(
+                user=create_user(f'user{number}')))
+
+
+class StatementTimeoutTests(DegradationTestCase):
+
+    def test_slow_query_interrupted(self):
+        started = time.monotonic()
+        with self.assertRaises(StatementTimeout):
+            with statement_timeout(TIMEOUT), SlowDatabase():
+                Ingredient.objects.count()
+        self.assertLess((time.monotonic() - started) * 1000, TIMEOUT * 3)
+        self.assertEqual(Ingredient.objects.count(), 1)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SHOW statement_timeout')
+                self.assertEqual(cursor.fetchone()[0], '0')
+
+
+class FallbackTests(DegradationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.anonymous = APIClient()
+        self.own = token_client(self.tokens[0])
+
+    def test_stale_response_served(self):
+        fresh = self.anonymous.get('/api/ingredients/')
+        with SlowDatabase():
+            response, elapsed = _timed_get(self.anonymous,
+                                           '/api/ingredients/')
+        self.assertLess(elapsed, TIMEOUT * 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, fresh.content)
+        self.assertTrue(response.has_header('Age'))
+        self.assertTrue(response['Warning'].startswith('110'))
+
+    def test_authenticated_responses_not_stored(self):
+        for path in ('/api/users/me/', '/api/ingredients/',
+                     '/api/recipes/download_shopping_cart/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.own.get(path).status_code, 200)
+        self.assertEqual(len(_stored_at._items), 0)
+        with SlowDatabase():
+            response = self.own.get('/api/users/me/')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.has_header('Retry-After'))
+
+    def test_stale_response_not_served_to_token(self):
+        self.anonymous.get('/api/ingredients/')
+        with SlowDatabase():
+            response = self.own.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 503)
+
+    def test_unavailable_without_stored_response(self):
+        with SlowDatabase():
+            response = self.anonymous.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.has_header('Retry-After'))
+
+    def test_search_and_far_pages_not_stored(self):
+        for path in ('/api/ingredients/?name=со', '/api/users/?page=4',
+                     '/api/users/?page=1&limit=2'):
+            with self.subTest(path=path):
+                self.anonymous.get(path)
+        self.assertEqual(len(_stored_at._items), 1)
+
+    def test_breaker(self):
+        self.anonymous.get('/api/ingredients/')
+        with SlowDatabase():
+            for _ in range(3):
+                self.anonymous.get('/api/ingredients/?name=нет')
+        self.assertTrue(breaker.is_open)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.anonymous.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Warning', response)
+        self.assertEqual(queries.captured_queries, [])
+        response = self.anonymous.get('/api/ingredients/?name=нет')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.has_header('Retry-After'))
+        time.sleep(COOLDOWN)
+        response = self.anonymous.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Warning', response)
+        self.assertFalse(breaker.is_open)
+
+
+@override_settings(ROOT_URLCONF='foodgram.urls_asgi')
+class AsyncFallbackTests(DegradationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = AsyncClient()
+        self.auth = {'Authorization': f'Token {self.tokens[0].key}'}
+
+    async def test_stale_response_served(self):
+        fresh = await self.client.get('/api/ingredients/')
+        async with slow_database():
+            response = await self.client.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, fresh.content)
+        self.assertTrue(response['Warning'].startswith('110'))
+
+    async def test_authenticated_responses_not_stored(self):
+        for path in ('/api/users/me/', '/api/ingredients/',
+                     '/api/recipes/download_shopping_cart/'):
+            response = await self.client.get(path, headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(_stored_at._items), 0)
+        await self.client.get('/api/ingredients/')
+        async with slow_database():
+            response = await self.client.get('/api/ingredients/',
+                                             headers=self.auth)
+        self.assertEqual(response.status_code, 503)
+
+    async def test_unavailable_without_stored_response(self):
+        async with slow_database():
+            started = time.monotonic()
+            response = await self.client.get('/api/recipes/')
+        self.assertLess((time.monotonic() - started) * 1000, TIMEOUT * 3)
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.has_header('Retry-After'))
+
+    async def test_search_not_stored(self):
+        await self.client.get('/api/ingredients/?name=со')
+        self.assertEqual(len(_stored_at._items), 0)
+
+    async def test_breaker(self):
+        await self.client.get('/api/ingredients/')
+        async with slow_database():
+            for _ in range(3):
+                await self.client.get('/api/ingredients/?name=нет')
+        self.assertTrue(breaker.is_open)
+        response = await self.client.get('/api/ingredients/')
+        self.assertIn('Warning', response)
+        response = await self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 503)
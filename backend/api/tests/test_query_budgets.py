@@ -0,0 +1,123 @@
+"""Бюджеты SQL-запросов списковых эндпоинтов и списков админки.
+
+Число запросов не должно превышать бюджет из ``api.query_budgets`` и
+зависеть от размера страницы, а одинаковые по структуре запросы не
+должны повторяться (N+1).
+"""
+from django.test import Client, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.query_budgets import BUDGETS
+from foodgram.query_audit import QueryRecorder
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Favorites, ShoppingCart
+from recipes.tests.factories import (create_ingredients, create_recipe,
+                                     create_user, token_client)
+from users.models import CustomUser, Subscription
+
+PAGE_SIZES = (2, 10)
+AUTHORS = 4
+RECIPES = 6
+INGREDIENTS = 12
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.'
+                                       'backends.locmem.LocMemCache'}})
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Документы рецептов и похожие рецепты строятся после фиксации.
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls._seed()
+        cls.token = Token.objects.create(user=cls.viewer)
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com',
+            password='budget-check')
+
+    @classmethod
+    def _seed(cls):
+        ingredients = create_ingredients(INGREDIENTS)
+        cls.viewer = create_user('viewer', first_name='Зритель',
+                                 last_name='Зрителев')
+        created = []
+        for author_number in range(AUTHORS):
+            author = create_user(
+                f'author{author_number}', first_name='Автор',
+                last_name=str(author_number), avatar='users/avatar.png')
+            Subscription.objects.create(user=cls.viewer, author=author)
+            for number in range(RECIPES):
+                recipe = create_recipe(
+                    author, f'рецепт {author_number}-{number}',
+                    {ingredients[(author_number + number + shift)
+                                 % len(ingredients)]: shift + 1
+                     for shift in range(3)})
+                created.append(recipe)
+                if number % 2:
+                    Favorites.objects.create(user=cls.viewer, recipe=recipe)
+                if number % 3 == 0:
+                    ShoppingCart.objects.create(user=cls.viewer,
+                                                recipe=recipe)
+        cls.params = {
+            'recipe_id': created[0].id,
+            'recipe_name': created[0].name.split()[0],
+            'ingredient_ids': ','.join(str(ingredient.id)
+                                       for ingredient in ingredients[:3]),
+        }
+
+    def setUp(self):
+        # Индекс строится при первом поиске, это не должно попасть в замер.
+        ingredient_index.reset()
+        ingredient_index.build()
+        self.authenticated = token_client(self.token)
+        self.anonymous = APIClient()
+        self.staff = Client()
+        self.staff.force_login(self.admin)
+
+    def _client(self, budget):
+        if budget.staff:
+            return self.staff
+        if budget.authenticated:
+            return self.authenticated
+        return self.anonymous
+
+    def _measure(self, client, path):
+        with QueryRecorder() as recorder:
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200,
+                         f'{path}: {response.content!r}')
+        return recorder
+
+    def test_budgets(self):
+        for budget in BUDGETS:
+            path = budget.path.format(**self.params)
+            with self.subTest(budget.label, path=path,
+                              authenticated=budget.authenticated):
+                separator = '&' if '?' in path else '?'
+                paths = ([f'{path}{separator}limit={size}'
+                          for size in PAGE_SIZES]
+                         if budget.paginated else [path])
+                counts = []
+                for page_path in paths:
+                    recorder = self._measure(self._client(budget), page_path)
+                    counts.append(len(recorder))
+                    self.assertLessEqual(
+                        len(recorder), budget.queries,
+                        f'{page_path}: {len(recorder)} запросов при '
+                        f'бюджете {budget.queries}:\n'
+                        + '\n'.join(recorder.queries))
+                    self.assertEqual(
+                        recorder.repeated(), [],
+                        f'{page_path}: повторяющиеся запросы (N+1)')
+                self.assertEqual(
+                    len(set(counts)), 1,
+                    f'{path}: число запросов зависит от размера '
+                    f'страницы: {counts}')
+
+    def test_trending_validators_counted(self):
+        recorder = self._measure(self.authenticated,
+                                 '/api/recipes/?ordering=trending')
+        self.assertTrue(any(
+            'SUM(' in sql.upper() and 'trending_score' in sql
+            for sql in recorder.queries))
@@ -0,0 +1,115 @@
+"""Запись состава рецепта: число SQL-запросов на вставку, обновление и
+удаление строк и отправка ``ingredients_changed`` только при смене
+набора ингредиентов."""
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from api.serializers import RecipeCreateUpdateSerializer
+from recipes.models import IngredientInRecipe
+from recipes.signals import ingredients_changed
+from recipes.tests.factories import (create_ingredients, create_recipe,
+                                     create_user)
+
+INGREDIENTS = 5
+
+
+class RecipeIngredientsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.ingredients = create_ingredients(INGREDIENTS)
+        cls.recipe = create_recipe(cls.author,
+                                   ingredients=cls.ingredients[:3])
+
+    def setUp(self):
+        # Получатели сигнала пишут в свои таблицы, это не входит в замер.
+        patcher = mock.patch.object(ingredients_changed, 'send')
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @property
+    def sent(self):
+        return [(call.kwargs['ingredient_ids'], call.kwargs['previous_ids'])
+                for call in self.send.call_args_list]
+
+    def _ids(self, numbers):
+        return {self.ingredients[number].id for number in numbers}
+
+    def _update(self, amounts, queries):
+        """Приводит состав к ``{номер ингредиента: количество}``."""
+        rows = list(self.recipe.ingredients_in_recipe.order_by())
+        with self.assertNumQueries(queries):
+            RecipeCreateUpdateSerializer()._set_recipe_ingredients(
+                self.recipe, [{'ingredient': self.ingredients[number],
+                               'amount': amount}
+                              for number, amount in amounts.items()],
+                rows)
+        self.assertEqual(dict(IngredientInRecipe.objects.filter(
+            recipe=self.recipe).values_list('ingredient', 'amount')),
+            {self.ingredients[number].id: amount
+             for number, amount in amounts.items()})
+
+    def test_unchanged_set(self):
+        self._update({0: 1, 1: 1, 2: 1}, 0)
+        self.assertEqual(self.sent, [])
+
+    def test_amounts_updated(self):
+        self._update({0: 5, 1: 1, 2: 7}, 1)
+        self.assertEqual(self.sent, [])
+
+    def test_rows_inserted(self):
+        self._update({0: 1, 1: 1, 2: 1, 3: 2, 4: 3}, 1)
+        self.assertEqual(self.sent, [(self._ids(range(5)),
+                                      self._ids(range(3)))])
+
+    def test_rows_deleted(self):
+        self._update({0: 1}, 1)
+        self.assertEqual(self.sent, [(self._ids([0]), self._ids(range(3)))])
+
+    def test_insert_update_delete(self):
+        self._update({0: 2, 3: 1}, 3)
+        self.assertEqual(self.sent, [(self._ids([0, 3]),
+                                      self._ids(range(3)))])
+
+    def test_created_with_one_insert(self):
+        recipe = create_recipe(self.author, 'новый')
+        with self.assertNumQueries(1):
+            RecipeCreateUpdateSerializer()._set_recipe_ingredients(
+                recipe, [{'ingredient': ingredient, 'amount': 1}
+                         for ingredient in self.ingredients])
+        self.assertEqual(recipe.ingredients_in_recipe.count(), INGREDIENTS)
+        self.assertEqual(self.sent, [(self._ids(range(INGREDIENTS)),
+                                      set())])
+
+
+class ValidateIngredientsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = create_ingredients(INGREDIENTS)
+
+    def test_loaded_with_one_query(self):
+        data = [{'id': ingredient.id, 'amount': number + 1}
+                for number, ingredient in enumerate(self.ingredients)]
+        with self.assertNumQueries(1):
+            validated = RecipeCreateUpdateSerializer().validate_ingredients(
+                data)
+        self.assertEqual(validated, [
+            {'ingredient': ingredient, 'amount': number + 1}
+            for number, ingredient in enumerate(self.ingredients)])
+
+    def test_unknown_ids_reported_by_position(self):
+        missing = self.ingredients[-1].id + 1
+        data = [{'id': self.ingredients[0].id, 'amount': 1},
+                {'id': missing, 'amount': 1}]
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError) as raised:
+                RecipeCreateUpdateSerializer().validate_ingredients(data)
+        self.assertEqual(raised.exception.detail[0], {})
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'].format(pk_value=missing)
+        self.assertEqual(raised.exception.detail[1]['id'], [message])
@@ -0,0 +1,50 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes.models import Recipe
+from recipes.tests.factories import create_recipe, create_user
+
+
+class ShortLinkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipe(create_user('author'))
+
+    def _get_link(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f'/api/recipes/{self.recipe.id}/get-link/')
+        self.assertEqual([query['sql'] for query in queries.captured_queries
+                          if not query['sql'].startswith('SELECT')], [])
+        return response
+
+    def test_code_assigned_on_save(self):
+        self.assertTrue(self.recipe.short_code)
+        response = self._get_link()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['short-link'],
+                         'http://testserver' + reverse(
+                             'recipes:recipe_short_link',
+                             args=[self.recipe.short_code]))
+
+    def test_missing_code_not_assigned_on_read(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(short_code=None)
+        self.assertEqual(self._get_link().status_code, 404)
+        self.assertIsNone(
+            Recipe.objects.get(pk=self.recipe.pk).short_code)
+
+        call_command('backfill_short_codes', stdout=StringIO())
+        response = self._get_link()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(Recipe.objects.get(pk=self.recipe.pk).short_code,
+                      response.json()['short-link'])
+
+    def test_missing_recipe(self):
+        response = self.client.get('/api/recipes/1000000/get-link/')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,142 @@
+from unittest import mock, skipUnless
+
+import redis
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import throttling
+from recipes.tests.factories import create_user
+
+PATH = '/api/ingredients/'
+SCOPE = 'ingredient_search'
+# Три запроса в минуту: токен возвращается раз в 20 секунд.
+RATE = '3/min'
+REFILL = 20
+
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(settings.THROTTLE_REDIS_URL,
+                                    socket_connect_timeout=1).ping()
+    except redis.RedisError:
+        return False
+
+
+class ThrottleTestsMixin:
+    """Поведение ограничителя, общее для хранилищ вёдер."""
+
+    store = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = (create_user(name)
+                               for name in ('user', 'other'))
+
+    def setUp(self):
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+                 SCOPE: RATE}
+        overridden = override_settings(
+            THROTTLE_STORE=self.store,
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                            'DEFAULT_THROTTLE_RATES': rates})
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.clear_buckets()
+        self.addCleanup(self.clear_buckets)
+        clock = mock.patch.object(throttling, 'time')
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        self.clock.monotonic.return_value = 1000.0
+        self.clock.time.return_value = 1000.0
+
+    def clear_buckets(self):
+        raise NotImplementedError
+
+    def advance(self, seconds):
+        self.clock.monotonic.return_value += seconds
+        self.clock.time.return_value += seconds
+
+    def get(self, user=None, ip='10.0.0.1'):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(PATH, REMOTE_ADDR=ip)
+
+    def assertBudget(self, response, status_code, remaining):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response['X-RateLimit-Limit'], '3')
+        self.assertEqual(response['X-RateLimit-Remaining'], str(remaining))
+
+    def test_exhausted_budget_rejected(self):
+        for remaining in (2, 1, 0):
+            response = self.get()
+            self.assertBudget(response, 200, remaining)
+            self.assertNotIn('Retry-After', response)
+        response = self.get()
+        self.assertBudget(response, 429, 0)
+        self.assertEqual(response['Retry-After'], str(REFILL))
+
+    def test_budget_refilled_over_time(self):
+        for _ in range(3):
+            self.get()
+        self.advance(REFILL / 2)
+        self.assertEqual(self.get()['Retry-After'], str(REFILL // 2))
+        self.advance(REFILL / 2)
+        self.assertBudget(self.get(), 200, 0)
+        self.assertEqual(self.get().status_code, 429)
+        self.advance(REFILL * 10)
+        self.assertBudget(self.get(), 200, 2)
+
+    def test_user_and_ip_buckets_checked(self):
+        for _ in range(3):
+            self.get(self.user)
+        # Другой пользователь с того же адреса упирается в ведро IP,
+        # тот же пользователь с другого адреса - в своё ведро.
+        self.assertEqual(self.get(self.other).status_code, 429)
+        self.assertEqual(self.get(self.user, '10.0.0.2').status_code, 429)
+        self.assertBudget(self.get(ip='10.0.0.3'), 200, 2)
+
+    def test_rejected_request_spends_nothing(self):
+        for _ in range(3):
+            self.get(self.user)
+        for _ in range(3):
+            self.assertEqual(self.get(self.user, '10.0.0.2').status_code,
+                             429)
+        self.assertBudget(self.get(self.other, '10.0.0.2'), 200, 2)
+
+    def test_only_proxy_address_trusted(self):
+        for number in range(3):
+            response = self.client.get(
+                PATH, REMOTE_ADDR='172.18.0.5',
+                HTTP_X_FORWARDED_FOR=f'192.0.2.{number}, 10.0.0.1')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(ip='10.0.0.1').status_code, 429)
+        response = self.client.get(PATH, REMOTE_ADDR='172.18.0.5',
+                                   HTTP_X_FORWARDED_FOR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+
+class LocalThrottleTests(ThrottleTestsMixin, TestCase):
+
+    store = 'api.throttling.LocalBucketStore'
+
+    def clear_buckets(self):
+        throttling.get_store().clear()
+
+    def test_least_recent_bucket_evicted(self):
+        store = throttling.LocalBucketStore(max_keys=2)
+        for key in ('first', 'second', 'first', 'third'):
+            store.consume([key], 1, 1)
+        self.assertEqual(list(store._buckets), ['first', 'third'])
+
+
+@skipUnless(redis_available(), 'Redis недоступен')
+class RedisThrottleTests(ThrottleTestsMixin, TestCase):
+
+    store = 'api.throttling.RedisBucketStore'
+
+    def clear_buckets(self):
+        client = redis.Redis.from_url(settings.THROTTLE_REDIS_URL)
+        keys = list(client.scan_iter(f'throttle:{SCOPE}:*'))
+        if keys:
+            client.delete(*keys)
@@ -0,0 +1,200 @@
+"""Ограничение частоты дорогих запросов по алгоритму token bucket.
+
+На каждую пару «область + IP» и «область + пользователь» заводится
+ведро на ``N`` токенов, которое пополняется со скоростью ``N`` за период
+ставки из ``DEFAULT_THROTTLE_RATES`` (``'10/min'``). Запрос проходит,
+только если токен есть во всех его вёдрах (у анонимов ведро одно — по
+IP), и забирает по токену из каждого; иначе 429 с ``Retry-After``, а
+вёдра не меняются. Так лимит не обойти ни сменой токена с одного
+адреса, ни сменой адреса с одним токеном. Области задаются
+представлениями: ``throttle_scopes = {действие: область}``.
+
+IP берётся из ``X-Forwarded-For`` с учётом ``NUM_PROXIES``: доверяем
+только адресу, который дописал nginx.
+
+Состояние хранится в памяти процесса (``LocalBucketStore``) или, чтобы
+лимит был общим для всех воркеров, в Redis (``RedisBucketStore``);
+хранилище выбирается настройкой ``THROTTLE_STORE``.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .constants import THROTTLE_LOCAL_MAX_KEYS
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int
+
+
+def parse_rate(rate):
+    """``'10/min'`` -> ёмкость ведра и пополнение в токенах за секунду."""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def _decision(allowed, tokens, capacity, rate):
+    retry_after = 0 if allowed else math.ceil((1 - tokens) / rate)
+    return Decision(allowed, capacity, int(tokens), retry_after)
+
+
+class LocalBucketStore:
+    """Вёдра в памяти процесса; при переполнении вытесняются давно не
+    использованные."""
+
+    blocking = False
+
+    def __init__(self, max_keys=THROTTLE_LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, keys, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key in keys:
+                tokens, updated = self._buckets.pop(key, (capacity, now))
+                levels.append(min(capacity,
+                                  tokens + (now - updated) * rate))
+            allowed = all(tokens >= 1 for tokens in levels)
+            if allowed:
+                levels = [tokens - 1 for tokens in levels]
+            for key, tokens in zip(keys, levels):
+                self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return _decision(allowed, min(levels), capacity, rate)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBucketStore:
+    """Вёдра в Redis, общие для всех воркеров; пополнение, проверка и
+    списание из всех вёдер запроса выполняются атомарно скриптом Lua."""
+
+    blocking = True
+    SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local allowed = 1
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    if tokens < 1 then
+        allowed = 0
+    end
+    levels[i] = tokens
+end
+local lowest = capacity
+for i, key in ipairs(KEYS) do
+    levels[i] = levels[i] - allowed
+    lowest = math.min(lowest, levels[i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i]), 'updated',
+               tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {allowed, tostring(lowest)}
+"""
+
+    def __init__(self, url=None):
+        import redis
+
+        self._client = redis.Redis.from_url(
+            url or settings.THROTTLE_REDIS_URL)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def consume(self, keys, capacity, rate):
+        allowed, tokens = self._script(
+            keys=[f'throttle:{key}' for key in keys],
+            args=[capacity, rate, time.time()])
+        return _decision(bool(allowed), float(tokens), capacity, rate)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    path = settings.THROTTLE_STORE
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = import_string(path)()
+        return _stores[path]
+
+
+def client_idents(request):
+    """IP клиента и, для авторизованных запросов, пользователь."""
+    idents = [f'ip:{BaseThrottle().get_ident(request)}']
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        idents.append(f'user:{user.pk}')
+    return idents
+
+
+def consume(scope, idents):
+    """Списывает по токену из вёдер области ``scope`` для всех ``idents``
+    клиента, если ни одно из них не пусто."""
+    capacity, rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES[scope])
+    return get_store().consume([f'{scope}:{ident}' for ident in idents],
+                               capacity, rate)
+
+
+def set_rate_limit_headers(response, decision):
+    response['X-RateLimit-Limit'] = decision.limit
+    response['X-RateLimit-Remaining'] = decision.remaining
+    if not decision.allowed:
+        response['Retry-After'] = decision.retry_after
+    return response
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Ограничение для действий из ``view.throttle_scopes``; остальные
+    действия не ограничиваются."""
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None))
+        if scope is None:
+            return True
+        # Асинхронные представления уже списали токен, прежде чем
+        # передать запрос синхронному.
+        self.decision = getattr(request, 'throttle_decision', None)
+        if self.decision is None:
+            self.decision = consume(scope, client_idents(request))
+            request.throttle_decision = self.decision
+        return self.decision.allowed
+
+    def wait(self):
+        return self.decision.retry_after
+
+
+class ThrottleHeadersMixin:
+    """Добавляет к ответам ограниченных действий остаток бюджета."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args,
+                                             **kwargs)
+        decision = getattr(request, 'throttle_decision', None)
+        if decision is not None:
+            set_rate_limit_headers(response, decision)
+        return response
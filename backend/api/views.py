@@ -1,29 +1,78 @@
 from rest_framework import status, viewsets
 from djoser.views import UserViewSet
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.decorators import action
+from rest_framework.settings import api_settings
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.http import Http404, HttpResponseNotFound
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.functional import cached_property
 from django_filters.rest_framework import DjangoFilterBackend
 from django.urls import reverse
-from users.models import CustomUser, Subscription
+from users.models import CustomUser
 from recipes.models import Recipe, Ingredient, Favorites, ShoppingCart
 from .serializers import (
     AvatarUpdateSerializer,
-    SubscribeActionSerializer,
     AuthorDetailSerializer,
     RecipeDetailSerializer,
+    RecipeCoverageSerializer,
     RecipeCreateUpdateSerializer,
     IngredientSerializer,
-    FavoriteSerializer,
-    ShoppingCartSerializer,
     ShortRecipeSerializer
 )
 from recipes.shopping_list import deliver_shopping_list
+from recipes.ingredient_index import ingredient_index
+from recipes.feed import get_feed_ids
+from recipes.relations import (add_recipe_relation,
+                               add_subscription,
+                               remove_recipe_relation,
+                               remove_subscription)
+from recipes.short_links import resolve as resolve_short_code
+from .conditional import (conditional_get,
+                          current_user_validators,
+                          recipe_list_validators,
+                          recipe_validators,
+                          user_list_validators,
+                          user_validators)
 from .permissions import IsAuthorOrReadOnly
+from .representations import (RECIPE_FIELDS,
+                              USER_FIELDS,
+                              annotate_is_subscribed,
+                              ingredient_queryset,
+                              ingredient_stats_queryset,
+                              ingredient_stats_representation,
+                              recipe_queryset,
+                              sparse_fields,
+                              subscribed_authors_queryset)
 from .filters import RecipeFilter
-from .constants import MAX_PAGE, PAGE_SIZE
+from .degradation import StaleFallbackMixin
+from .throttling import ThrottleHeadersMixin
+from .constants import (MAX_PAGE,
+                        PAGE_SIZE,
+                        SHORT_LINK_CACHE_TIMEOUT,
+                        SHORT_LINK_MISS_TIMEOUT,
+                        SIMILAR_RECIPES_LIMIT)
+
+
+def _object_id(value):
+    """Идентификатор из URL; нечисловой означает несуществующий объект."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+def _recipes_limit(request):
+    """Параметр ``recipes_limit``; некорректное значение игнорируется."""
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return limit if limit >= 0 else None
 
 
 class UserPagination(PageNumberPagination):
@@ -35,12 +84,20 @@ class UserPagination(PageNumberPagination):
         return ['id']
 
 
-class UserProfileViewSet(UserViewSet):
+class UserProfileViewSet(StaleFallbackMixin, ThrottleHeadersMixin,
+                         UserViewSet):
 
     queryset = CustomUser.objects.all().order_by('id')
     lookup_field = 'id'
     lookup_url_kwarg = 'id'
     pagination_class = UserPagination
+    throttle_scopes = {'update_profile_avatar': 'avatar'}
+    timeout_scopes = {
+        'list': 'list',
+        'retrieve': 'read',
+        'get_user_info': 'read',
+        'get_subscribed_authors_list': 'list',
+    }
 
     def get_permissions(self):
         protected_actions = [
@@ -57,20 +114,49 @@ class UserProfileViewSet(UserViewSet):
             return [AllowAny()]
         return [AllowAny()]
 
+    @cached_property
+    def requested_fields(self):
+        return sparse_fields(self.request.query_params, USER_FIELDS)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return annotate_is_subscribed(queryset, self.request.user,
+                                          self.requested_fields)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve', 'get_user_info'):
+            context['fields'] = self.requested_fields
+        return context
+
     def perform_create(self, serializer):
         serializer.save()
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED)
 
+    @conditional_get(lambda view, request, *args, **kwargs:
+                     user_list_validators(
+                         request,
+                         view.filter_queryset(view.get_queryset())))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(lambda view, request, id=None:
+                     user_validators(request, id))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(methods=['get'],
             detail=False,
             url_path='me',
             url_name='get_user_info',)
+    @conditional_get(lambda view, request: current_user_validators(request))
     def get_user_info(self, request):
         """Отображает личные данные текущего пользователя."""
-        serializer = self.get_serializer(request.user,
-                                         context={'request': request})
+        serializer = self.get_serializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(methods=['put', 'delete'],
@@ -97,8 +183,8 @@ class UserProfileViewSet(UserViewSet):
             url_name='get_subscribed_authors')
     def get_subscribed_authors_list(self, request):
         """Получает список авторов, на которых подписан пользователь."""
-        authors = CustomUser.objects.filter(
-            authors__user=request.user).order_by('id')
+        authors = subscribed_authors_queryset(request.user,
+                                              _recipes_limit(request))
         page = self.paginate_queryset(authors)
         serializer = AuthorDetailSerializer(
             page,
@@ -109,29 +195,30 @@ class UserProfileViewSet(UserViewSet):
 
     def _handle_subscription(self, request, author_id, action):
         """Обрабатывает подписку/отписку."""
-        author = get_object_or_404(CustomUser, pk=author_id)
-
+        author_id = _object_id(author_id)
         if action == 'subscribe':
-            serializer = SubscribeActionSerializer(
-                data={'user': request.user.id, 'author': author.id},
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            if add_subscription(request.user, author_id) is None:
+                author = get_object_or_404(CustomUser, pk=author_id)
+                if author == request.user:
+                    raise ValidationError(
+                        {'author': ['Нельзя подписаться на себя.']})
+                raise ValidationError(
+                    {api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Вы уже подписаны на этого пользователя']})
+            author = subscribed_authors_queryset(
+                request.user, _recipes_limit(request)).get(pk=author_id)
             author_serializer = AuthorDetailSerializer(
                 author, context={'request': request})
             return Response(author_serializer.data,
                             status=status.HTTP_201_CREATED)
 
-        try:
-            subscription = request.user.subscribers.get(author=author)
-            subscription.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except Subscription.DoesNotExist:
+        if remove_subscription(request.user, author_id) is None:
+            get_object_or_404(CustomUser, pk=author_id)
             return Response(
                 {'error': 'Подписка не найдена'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['post', 'delete'],
             detail=True,
@@ -148,60 +235,149 @@ class RecipePagination(PageNumberPagination):
     page_size_query_param = 'limit'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class RecipeTrendingPagination(CursorPagination):
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE
+    ordering = ('-trending_score', '-id')
+
+
+class IngredientViewSet(StaleFallbackMixin, ThrottleHeadersMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     filter_backends = (DjangoFilterBackend, )
-    filterset_fields = ('name',)
+    throttle_scopes = {'list': 'ingredient_search'}
+    timeout_scopes = {'list': 'read', 'retrieve': 'read', 'stats': 'read'}
 
     def get_queryset(self):
-        search_field = self.request.query_params.get('name', '')
-        if search_field:
-            return self.queryset.filter(name__icontains=search_field)
+        if self.action == 'list':
+            return ingredient_queryset(self.request.query_params)
         return self.queryset
 
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Самые используемые ингредиенты: ``ordering`` - popularity,
+        recipes, cart или trend, ``limit`` - размер выдачи."""
+        now = timezone.now()
+        return Response([
+            ingredient_stats_representation(stats, now)
+            for stats in ingredient_stats_queryset(request.query_params)
+        ])
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(StaleFallbackMixin, ThrottleHeadersMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
     filterset_class = RecipeFilter
     pagination_class = RecipePagination
+    # Выгрузка списка покупок и запись рецептов с картинкой в base64 —
+    # самые тяжёлые запросы.
+    throttle_scopes = {
+        'download_shopping_cart': 'shopping_list',
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+    }
+    # Глубокие страницы списков и большие списки покупок не должны
+    # занимать воркер надолго.
+    timeout_scopes = {
+        'list': 'list',
+        'retrieve': 'read',
+        'feed': 'list',
+        'find_by_ingredients': 'list',
+        'similar': 'read',
+        'download_shopping_cart': 'shopping_list',
+    }
+    # Список покупок личный: при сбое базы его не отдаёт даже сохранённая
+    # копия.
+    stale_excluded_actions = frozenset({'download_shopping_cart'})
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator') and self.action == 'list'
+                and self.request.query_params.get('ordering') == 'trending'):
+            self._paginator = RecipeTrendingPagination()
+        return super().paginator
+
+    read_actions = ('list', 'retrieve', 'feed', 'find_by_ingredients')
+
+    @cached_property
+    def requested_fields(self):
+        available = RECIPE_FIELDS
+        if self.action == 'find_by_ingredients':
+            available += ('missing_count',)
+        return sparse_fields(self.request.query_params, available)
+
+    def get_queryset(self):
+        if self.action in self.read_actions:
+            fields = self.requested_fields
+            if fields is not None:
+                fields = tuple(name for name in fields
+                               if name in RECIPE_FIELDS)
+            return recipe_queryset(self.request.user, fields)
+        return super().get_queryset()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in self.read_actions:
+            context['fields'] = self.requested_fields
+        return context
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeCreateUpdateSerializer
+        if self.action == 'find_by_ingredients':
+            return RecipeCoverageSerializer
         return RecipeDetailSerializer
 
+    @conditional_get(lambda view, request, *args, **kwargs:
+                     recipe_list_validators(
+                         request,
+                         view.filter_queryset(view.get_queryset())))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(lambda view, request, pk=None:
+                     recipe_validators(request, pk))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def _handle_relation(self, request,
-                         recipe_id, serializer_class, operation):
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        context = {'request': request}
-
+    def _handle_relation(self, request, recipe_id, model, operation):
+        recipe_id = _object_id(recipe_id)
         if operation == 'add':
-            data = {'user': request.user.id, 'recipe': recipe.id}
-            serializer = serializer_class(data=data, context=context)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            recipe_serializer = ShortRecipeSerializer(recipe, context=context)
+            recipe, relation = add_recipe_relation(
+                model, request.user, recipe_id,
+                exclude_author=model is Favorites)
+            if recipe is None:
+                get_object_or_404(Recipe, id=recipe_id)
+            if relation is None:
+                if model is Favorites and recipe.author_id == request.user.id:
+                    message = 'Собственный рецепт нельзя обрабатывать'
+                elif model is Favorites:
+                    message = 'Рецепт уже в избранном'
+                else:
+                    message = 'Рецепт уже в корзине'
+                raise ValidationError(
+                    {api_settings.NON_FIELD_ERRORS_KEY: [message]})
+            recipe_serializer = ShortRecipeSerializer(
+                recipe, context={'request': request})
             return Response(recipe_serializer.data,
                             status=status.HTTP_201_CREATED)
 
         if operation == 'remove':
-            if serializer_class == FavoriteSerializer:
-                model = Favorites
-            else:
-                model = ShoppingCart
-            relation = model.objects.filter(user=request.user, recipe=recipe)
-            if not relation.exists():
+            if remove_recipe_relation(model, request.user,
+                                      recipe_id) is None:
+                get_object_or_404(Recipe, id=recipe_id)
                 return Response(
                     {'errors': 'Рецепт не найден в списке.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            relation.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -212,13 +388,97 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def download_shopping_cart(self, request):
         return deliver_shopping_list(request.user)
 
+    def _serialize_recipe_page(self, recipe_ids, **kwargs):
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True,
+            **kwargs
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        detail=False
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        page = self.paginate_queryset(get_feed_ids(request.user))
+        return self._serialize_recipe_page(
+            [recipe_id for recipe_id, _ in page])
+
+    def _parse_int_list(self, values, name):
+        try:
+            return {int(value)
+                    for raw in values
+                    for value in raw.split(',') if value}
+        except ValueError:
+            raise ValidationError({name: 'Ожидается список целых чисел.'})
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='by_ingredients'
+    )
+    def find_by_ingredients(self, request):
+        """Подбирает рецепты по имеющимся у пользователя ингредиентам."""
+        ingredient_ids = self._parse_int_list(
+            request.query_params.getlist('ingredients'), 'ingredients')
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент.'})
+        max_missing = request.query_params.get('max_missing')
+        if max_missing is not None:
+            try:
+                max_missing = int(max_missing)
+            except ValueError:
+                raise ValidationError(
+                    {'max_missing': 'Ожидается целое число.'})
+
+        ranking = ingredient_index.rank(ingredient_ids, max_missing)
+        page = dict(self.paginate_queryset(ranking))
+        context = self.get_serializer_context()
+        context['missing'] = page
+        return self._serialize_recipe_page(
+            list(page),
+            context=context
+        )
+
+    @action(
+        methods=['get'],
+        detail=True
+    )
+    def similar(self, request, pk=None):
+        """Возвращает рецепты, похожие по набору ингредиентов."""
+        pk = _object_id(pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=pk
+        ).only(
+            'id', 'name', 'image', 'cooking_time'
+        ).order_by('-similar_to__score')[:SIMILAR_RECIPES_LIMIT]
+        serializer = ShortRecipeSerializer(recipes,
+                                           many=True,
+                                           context={'request': request})
+        if not serializer.data:
+            get_object_or_404(Recipe, id=pk)
+        return Response(serializer.data)
+
     @action(
         methods=['get'],
         url_path='get-link',
         detail=True
     )
     def get_short_link(self, request, pk=None):
-        relative_path = reverse('recipes:recipe_short_link', args=[pk])
+        recipe = get_object_or_404(Recipe.objects.only('id', 'short_code'),
+                                   id=pk)
+        # Коды присваиваются при сохранении рецепта и командой
+        # backfill_short_codes; GET ничего не записывает.
+        if not recipe.short_code:
+            raise Http404('У рецепта ещё нет короткой ссылки.')
+        relative_path = reverse('recipes:recipe_short_link',
+                                args=[recipe.short_code])
         full_url = request.build_absolute_uri(relative_path)
         return Response({'short-link': full_url})
 
@@ -231,7 +491,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._handle_relation(
             request,
             pk,
-            FavoriteSerializer,
+            Favorites,
             'add'
         )
 
@@ -244,7 +504,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._handle_relation(
             request,
             pk,
-            ShoppingCartSerializer,
+            ShoppingCart,
             'add'
         )
 
@@ -253,7 +513,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._handle_relation(
             request,
             pk,
-            FavoriteSerializer,
+            Favorites,
             'remove'
         )
 
@@ -262,11 +522,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._handle_relation(
             request,
             pk,
-            ShoppingCartSerializer,
+            ShoppingCart,
             'remove'
         )
 
 
-def copy_short_link(request, pk):
-    recipe = get_object_or_404(Recipe, id=pk)
-    return redirect(reverse('api:recipe_detail', kwargs={'pk': recipe.id}))
+def short_link_redirect(request, code):
+    recipe_id = resolve_short_code(code)
+    if recipe_id is None:
+        response = HttpResponseNotFound()
+        patch_cache_control(response, public=True,
+                            max_age=SHORT_LINK_MISS_TIMEOUT)
+        return response
+    response = redirect(f'/recipes/{recipe_id}')
+    patch_cache_control(response, public=True,
+                        max_age=SHORT_LINK_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,138 @@
+"""Чтение с реплик для безопасных запросов к API.
+
+Middleware помечает GET/HEAD/OPTIONS-запросы к ``/api/`` как допускающие
+чтение с реплики, роутер выбирает для них одну из баз
+``DATABASE_REPLICAS``. Всё остальное — запись, чтение внутри транзакции,
+чтение после записи в том же запросе, запросы вне HTTP (команды,
+миграции) — идёт в основную базу.
+
+Чтобы пользователь сразу видел свои изменения, после записи клиент
+закрепляется за основной базой на ``DATABASE_REPLICA_PIN_SECONDS``:
+браузер — через cookie, API-клиент — по хэшу заголовка авторизации в
+кэше.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Токены и сессии нужны сразу после входа, отставание реплики для них
+# недопустимо.
+PRIMARY_ONLY = {'authtoken.token', 'sessions.session'}
+
+
+class RoutingState:
+    __slots__ = ('use_replicas', 'wrote')
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (state is None or not state.use_replicas or state.wrote
+                or not replicas()
+                or model._meta.label_lower in PRIMARY_ONLY
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    digest = hashlib.sha256(authorization.encode()).hexdigest()
+    return f'db-pin:{digest}'
+
+
+def _is_pinned(request):
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    key = _pin_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def _pin(request, response):
+    if not replicas():
+        return
+    seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True,
+                        samesite='Lax')
+    key = _pin_key(request)
+    if key is not None:
+        cache.set(key, 1, seconds)
+
+
+def _start(request):
+    return RoutingState(bool(
+        replicas()
+        and request.method in SAFE_METHODS
+        and request.path.startswith('/api/')
+        and not _is_pinned(request)
+    ))
+
+
+def _finish(request, response, state):
+    # Без реплик закреплять клиента не за чем.
+    if not replicas():
+        return response
+    if state.wrote or request.method not in SAFE_METHODS:
+        _pin(request, response)
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = await sync_to_async(_start)(request)
+            token = _state.set(state)
+            try:
+                response = await get_response(request)
+            finally:
+                _state.reset(token)
+            return await sync_to_async(_finish)(request, response, state)
+        return middleware
+
+    def middleware(request):
+        state = _start(request)
+        token = _state.set(state)
+        try:
+            response = get_response(request)
+        finally:
+            _state.reset(token)
+        return _finish(request, response, state)
+    return middleware
@@ -0,0 +1,20 @@
+"""Настройки gunicorn для воркеров API:
+``gunicorn -c python:foodgram.gunicorn_api``.
+
+Число воркеров задаётся ``WEB_CONCURRENCY`` или ``--workers``.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings_api')
+
+wsgi_app = 'foodgram.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+preload_app = True
+
+
+def when_ready(server):
+    # При preload_app вызывается в мастере после загрузки приложения и
+    # до запуска воркеров.
+    from foodgram.preload import preload
+
+    preload()
@@ -0,0 +1,310 @@
+"""Шина инвалидации кэшей в памяти процессов.
+
+Сигналы моделей публикуют события «тема, ключ, данные» после коммита
+транзакции. Шина сразу передаёт их обработчикам своего процесса, а
+остальным воркерам и узлам — через транспорт: ``PostgresTransport``
+(NOTIFY/LISTEN) или ``LocalTransport`` (шины одного процесса).
+
+Сообщения каждого процесса нумеруются подряд. Отставание кэшей от базы
+ограничено: пропуск номера, переподключение слушателя и отсутствие
+подтверждения его работы дольше ``INVALIDATION_MAX_STALENESS`` секунд
+сбрасывают все локальные кэши процесса (обработчики ``on_reset``).
+"""
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils.module_loading import import_string
+
+from api.constants import (INVALIDATION_CHANNEL,
+                           INVALIDATION_MAX_ORIGINS,
+                           INVALIDATION_PAYLOAD_LIMIT,
+                           INVALIDATION_POLL_INTERVAL,
+                           INVALIDATION_RECONNECT_DELAY)
+
+logger = logging.getLogger(__name__)
+
+# Тема события, по которому сбрасываются все кэши.
+RESET = '*'
+
+
+class Event(NamedTuple):
+    topic: str
+    key: object
+    data: dict
+    # Событие опубликовано этим же процессом.
+    local: bool = False
+
+
+class LocalTransport:
+    """Доставка между шинами одного процесса.
+
+    Отключённая ``disconnect`` шина не получает сообщений и не
+    подтверждает свежесть; ``connect`` подключает её со сбросом кэшей, как
+    при переподключении слушателя PostgreSQL. ``drop`` теряет следующие
+    сообщения для шины.
+    """
+
+    def __init__(self):
+        self._connected = {}
+        self._dropped = {}
+        self._lock = threading.Lock()
+
+    def start(self, bus):
+        with self._lock:
+            self._connected[bus] = True
+
+    def send(self, message, using):
+        with self._lock:
+            receivers = []
+            for bus, connected in self._connected.items():
+                if connected and self._dropped.get(bus):
+                    self._dropped[bus] -= 1
+                elif connected:
+                    receivers.append(bus)
+        for bus in receivers:
+            bus.receive(message)
+
+    def poll(self, bus):
+        if self._connected.get(bus):
+            bus.heartbeat()
+
+    def stop(self, bus):
+        with self._lock:
+            self._connected.pop(bus, None)
+            self._dropped.pop(bus, None)
+
+    def disconnect(self, bus):
+        with self._lock:
+            self._connected[bus] = False
+
+    def connect(self, bus):
+        with self._lock:
+            self._connected[bus] = True
+        bus.reset()
+
+    def drop(self, bus, count=1):
+        with self._lock:
+            self._dropped[bus] = self._dropped.get(bus, 0) + count
+
+
+class PostgresTransport:
+    """NOTIFY/LISTEN в PostgreSQL: каждый процесс слушает канал в
+    отдельном потоке со своим соединением.
+
+    На других СУБД сообщения никуда не отправляются: шина работает
+    только внутри процесса.
+    """
+
+    def __init__(self, using='default'):
+        self.using = using
+        self.listening = False
+        self._listener = None
+        self._stopped = False
+
+    def _connect(self):
+        connection = connections[self.using]
+        params = connection.get_connection_params()
+        params.pop('cursor_factory', None)
+        listener = connection.Database.connect(**params)
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN {INVALIDATION_CHANNEL}')
+        return listener
+
+    def start(self, bus):
+        if connections[self.using].vendor != 'postgresql':
+            return
+        # Канал слушается до возврата, поэтому кэши, построенные после
+        # запуска шины, получат все последующие события.
+        self._listener = self._connect()
+        self.listening = True
+        threading.Thread(target=self._listen, args=(bus,),
+                         name='invalidation-listener', daemon=True).start()
+
+    def _listen(self, bus):
+        errors = connections[self.using].Database.Error
+        while not self._stopped:
+            listener = self._listener
+            try:
+                if listener is None:
+                    listener = self._listener = self._connect()
+                    # Пока слушателя не было, события могли потеряться.
+                    bus.reset()
+                if select.select([listener], [], [],
+                                 INVALIDATION_POLL_INTERVAL)[0]:
+                    listener.poll()
+                else:
+                    with listener.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                while listener.notifies:
+                    bus.receive(listener.notifies.pop(0).payload)
+                bus.heartbeat()
+            except (errors, OSError, ValueError):
+                if self._stopped:
+                    return
+                logger.exception('Слушатель шины инвалидации отключился')
+                if listener is not None:
+                    listener.close()
+                self._listener = None
+                time.sleep(INVALIDATION_RECONNECT_DELAY)
+
+    def send(self, message, using):
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)',
+                           (INVALIDATION_CHANNEL, message))
+
+    def poll(self, bus):
+        if not self.listening:
+            bus.heartbeat()
+
+    def stop(self, bus):
+        self._stopped = True
+        if self._listener is not None:
+            self._listener.close()
+
+
+class InvalidationBus:
+    """Шина событий об изменении данных для локальных кэшей."""
+
+    def __init__(self, transport=None, max_staleness=None):
+        self._transport = transport
+        self._max_staleness = max_staleness
+        self._handlers = {}
+        self._reset_callbacks = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._seen = OrderedDict()
+        self._fresh_at = time.monotonic()
+        self.transport = None
+        self.origin = None
+        self.version = 0
+
+    @property
+    def max_staleness(self):
+        if self._max_staleness is None:
+            return settings.INVALIDATION_MAX_STALENESS
+        return self._max_staleness
+
+    def subscribe(self, topic):
+        """Декоратор обработчика событий темы ``topic``."""
+        def decorator(handler):
+            self._handlers.setdefault(topic, []).append(handler)
+            return handler
+        return decorator
+
+    def on_reset(self, callback):
+        """Регистрирует сброс локального кэша целиком."""
+        self._reset_callbacks.append(callback)
+        return callback
+
+    def start(self):
+        """Подключает шину к транспорту; после fork — заново."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.origin = (f'{socket.gethostname()}:{os.getpid()}:'
+                           f'{uuid.uuid4().hex[:8]}')
+            self.version = 0
+            self.transport = self._transport or import_string(
+                settings.INVALIDATION_TRANSPORT)()
+            self.transport.start(self)
+            self._fresh_at = time.monotonic()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Отключает шину от транспорта."""
+        with self._lock:
+            if self._pid == os.getpid():
+                self.transport.stop(self)
+            self._pid = None
+
+    def heartbeat(self):
+        """Транспорт подтверждает, что все события до этого момента
+        доставлены."""
+        self._fresh_at = time.monotonic()
+
+    def reset(self):
+        for callback in self._reset_callbacks:
+            callback()
+        self._fresh_at = time.monotonic()
+
+    def check(self):
+        """Вызывается перед чтением локального кэша: если свежесть давно
+        не подтверждалась, кэши сбрасываются."""
+        self.start()
+        self.transport.poll(self)
+        if time.monotonic() - self._fresh_at > self.max_staleness:
+            self.reset()
+
+    def publish(self, topic, key, data=None, using='default'):
+        """Отправляет событие после коммита транзакции ``using``."""
+        event = [topic, key, data or {}]
+        transaction.on_commit(lambda: self._send(event, using), using=using)
+
+    def _send(self, event, using):
+        self.start()
+        self._dispatch(Event(*event, local=True))
+        # Номер выдаётся и отправляется под блокировкой, чтобы сообщения
+        # процесса уходили по порядку.
+        with self._lock:
+            self.version += 1
+            message = self._encode([event])
+            if len(message.encode()) > INVALIDATION_PAYLOAD_LIMIT:
+                message = self._encode([[RESET, None, {}]])
+            try:
+                self.transport.send(message, using)
+            except DatabaseError:
+                # Получатели увидят пропуск номера и сбросят кэши.
+                logger.exception('Событие инвалидации не отправлено')
+
+    def _encode(self, events):
+        return json.dumps({'o': self.origin, 'v': self.version,
+                           'e': events},
+                          ensure_ascii=False, separators=(',', ':'))
+
+    def receive(self, message):
+        """Обрабатывает сообщение транспорта."""
+        message = json.loads(message)
+        origin, version = message['o'], message['v']
+        if origin == self.origin:
+            return
+        with self._lock:
+            last = self._seen.pop(origin, None)
+            self._seen[origin] = version
+            if len(self._seen) > INVALIDATION_MAX_ORIGINS:
+                self._seen.popitem(last=False)
+        if last is not None and version != last + 1:
+            self.reset()
+            return
+        for event in message['e']:
+            self._dispatch(Event(*event))
+
+    def _dispatch(self, event):
+        if event.topic == RESET:
+            self.reset()
+            return
+        for handler in self._handlers.get(event.topic, ()):
+            try:
+                handler(event)
+            except Exception:
+                logger.exception('Ошибка обработчика инвалидации %s',
+                                 event.topic)
+                self.reset()
+
+
+bus = InvalidationBus()
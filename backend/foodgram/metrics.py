@@ -0,0 +1,151 @@
+"""Метрики процесса в текстовом формате Prometheus.
+
+Значения хранятся в памяти воркера, поэтому под gunicorn каждый воркер
+отдаёт свои метрики; эндпоинт не проксируется nginx и предназначен для
+сборщика внутри сети. Отвечает только адресам ``METRICS_ALLOWED_IPS``,
+запросам с токеном ``METRICS_TOKEN`` и сотрудникам, остальным — 404.
+"""
+import hmac
+import ipaddress
+import math
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_histograms = {}
+_collectors = []
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    rendered = ','.join(
+        '{}="{}"'.format(
+            key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for key, value in pairs
+    )
+    return f'{{{rendered}}}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами и произвольными метками."""
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [
+                    [0] * (len(self.buckets) + 1), 0.0
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self._series.items()
+            )
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(key, le=_format_value(bound))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def histogram(name, documentation, buckets=DEFAULT_BUCKETS):
+    """Возвращает гистограмму по имени, создавая её при первом обращении."""
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name, documentation, buckets)
+        return _histograms[name]
+
+
+def register_collector(collector):
+    """Регистрирует функцию, которая при каждом запросе метрик
+    возвращает строки в формате Prometheus."""
+    with _lock:
+        if collector not in _collectors:
+            _collectors.append(collector)
+    return collector
+
+
+def gauge_lines(name, documentation, samples, kind='gauge'):
+    """Строки для метрики типа gauge/counter из пар (метки, значение)."""
+    yield f'# HELP {name} {documentation}'
+    yield f'# TYPE {name} {kind}'
+    for labels, value in samples:
+        yield (f'{name}{_format_labels(sorted(labels.items()))} '
+               f'{_format_value(value)}')
+
+
+def render():
+    with _lock:
+        histograms = list(_histograms.values())
+        collectors = list(_collectors)
+    lines = []
+    for collector in collectors:
+        lines.extend(collector())
+    for item in histograms:
+        lines.extend(item.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _allowed_address(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in settings.METRICS_ALLOWED_IPS)
+
+
+def _valid_token(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(
+        ' ')
+    return bool(settings.METRICS_TOKEN and scheme.lower() == 'bearer'
+                and hmac.compare_digest(token.encode(),
+                                        settings.METRICS_TOKEN.encode()))
+
+
+def has_metrics_access(request):
+    user = getattr(request, 'user', None)
+    return (_allowed_address(request.META.get('REMOTE_ADDR', ''))
+            or _valid_token(request)
+            or (user is not None and user.is_staff))
+
+
+def metrics_view(request):
+    if not has_metrics_access(request):
+        raise Http404
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
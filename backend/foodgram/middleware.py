@@ -0,0 +1,81 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from . import request_timing
+from .metrics import histogram
+
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+request_seconds = histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса по представлениям.')
+request_queries = histogram(
+    'foodgram_http_request_queries',
+    'Число SQL-запросов на HTTP-запрос по представлениям.',
+    QUERY_BUCKETS)
+
+
+def view_label(request):
+    """Имя представления для меток: ``RecipeViewSet.download_shopping_cart``
+    для DRF, модуль и имя функции для остальных."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'metrics_view', match.func)
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return f'{view.__module__}.{view.__qualname__}'
+    action = (getattr(view, 'actions', None) or {}).get(
+        request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+def _server_timing(timings, total):
+    return ', '.join((
+        f'db;desc="SQL, {timings.queries} queries";'
+        f'dur={timings.sql * 1000:.2f}',
+        f'serialize;dur={timings.serialize * 1000:.2f}',
+        f'render;dur={timings.render * 1000:.2f}',
+        f'total;dur={total * 1000:.2f}',
+    ))
+
+
+def _finish(request, response, timings, started):
+    total = time.perf_counter() - started
+    label = view_label(request)
+    request_seconds.observe(total, view=label, method=request.method,
+                            status=response.status_code)
+    request_queries.observe(timings.queries, view=label,
+                            method=request.method)
+    if settings.SERVER_TIMING_HEADER:
+        response['Server-Timing'] = _server_timing(timings, total)
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Заголовок ``Server-Timing`` и гистограммы времени и числа запросов
+    к базе по представлениям."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            timings, token = request_timing.start()
+            try:
+                response = await get_response(request)
+            finally:
+                request_timing.finish(token)
+            return _finish(request, response, timings, started)
+        return middleware
+
+    def middleware(request):
+        started = time.perf_counter()
+        timings, token = request_timing.start()
+        try:
+            response = get_response(request)
+        finally:
+            request_timing.finish(token)
+        return _finish(request, response, timings, started)
+    return middleware
@@ -0,0 +1,50 @@
+"""Пагинация списков админки для больших таблиц."""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from api.constants import ADMIN_EXACT_COUNT_LIMIT
+
+
+def estimated_count(queryset):
+    """Оценка числа строк таблицы из статистики планировщика PostgreSQL.
+
+    Возвращает ``None`` для запросов с фильтрами, других СУБД и таблиц,
+    для которых статистика ещё не собрана.
+    """
+    if not isinstance(queryset, QuerySet) or queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            (connection.ops.quote_name(queryset.model._meta.db_table),))
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Без фильтров на больших таблицах показывает приблизительное число
+    записей вместо ``COUNT(*)`` по всей таблице."""
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= ADMIN_EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без полного подсчёта записей и с сортировкой по индексу
+    первичного ключа."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
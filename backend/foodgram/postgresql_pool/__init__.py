@@ -0,0 +1,5 @@
+"""Бэкенд PostgreSQL с пулом соединений внутри процесса.
+
+Подключается через ``ENGINE = 'foodgram.postgresql_pool'``, параметры
+пула задаются ключом ``POOL`` в настройках базы.
+"""
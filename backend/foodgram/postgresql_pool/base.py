@@ -0,0 +1,47 @@
+from functools import partial
+
+from django.db.backends.postgresql import base, creation
+
+from .pool import close_pools, get_pool
+
+TRANSACTION_STATUS_IDLE = 0
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные соединения пула держат тестовую базу открытой.
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Соединения берутся из пула процесса и возвращаются в него при
+    ``close()``, поэтому ``CONN_MAX_AGE`` для этого бэкенда должен быть 0:
+    соединение освобождается в конце каждого запроса."""
+
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire(
+            partial(super().get_new_connection, conn_params))
+
+    def _is_reusable(self):
+        connection = self.connection
+        if connection.closed:
+            return False
+        try:
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except self.Database.Error:
+            return False
+        return not self.errors_occurred or self.is_usable()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection, self._is_reusable())
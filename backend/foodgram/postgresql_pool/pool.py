@@ -0,0 +1,217 @@
+"""Потокобезопасный пул соединений DB-API.
+
+Пул не зависит от драйвера: соединение создаётся переданной функцией,
+от него требуется только атрибут ``closed`` и метод ``close()``.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+from foodgram.metrics import gauge_lines, histogram, register_collector
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5.0,
+    'MAX_IDLE': 300.0,
+    'MAX_LIFETIME': 1800.0,
+}
+
+wait_seconds = histogram(
+    'foodgram_db_pool_wait_seconds',
+    'Время ожидания свободного места в пуле.')
+checkout_seconds = histogram(
+    'foodgram_db_pool_checkout_seconds',
+    'Время выдачи соединения из пула, включая установку нового.')
+
+
+class PoolTimeout(OperationalError):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+class ConnectionPool:
+
+    def __init__(self, alias, max_size=DEFAULTS['MAX_SIZE'],
+                 timeout=DEFAULTS['TIMEOUT'],
+                 max_idle=DEFAULTS['MAX_IDLE'],
+                 max_lifetime=DEFAULTS['MAX_LIFETIME']):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._born = {}
+        self.size = 0
+        self.waiting = 0
+        self.created = 0
+        self.timeouts = 0
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @property
+    def in_use(self):
+        return self.size - len(self._idle)
+
+    def _is_stale(self, connection, released, now):
+        return (connection.closed
+                or now - released > self.max_idle
+                or now - self._born[id(connection)] > self.max_lifetime)
+
+    def _forget(self, connection):
+        """Убирает соединение из учёта; вызывается под блокировкой."""
+        self._born.pop(id(connection), None)
+        self.size -= 1
+        self._condition.notify()
+
+    def acquire(self, connect):
+        """Выдаёт свободное соединение или создаёт новое через
+        ``connect()``, если пул ещё не заполнен."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        stale = []
+        connection = None
+        try:
+            with self._condition:
+                while connection is None:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate, released = self._idle.pop()
+                        if self._is_stale(candidate, released, now):
+                            self._forget(candidate)
+                            stale.append(candidate)
+                            continue
+                        connection = candidate
+                        break
+                    if connection is not None or self.size < self.max_size:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f'Нет свободных соединений с базой '
+                            f'{self.alias!r} за {self.timeout} с '
+                            f'(размер пула {self.max_size}).')
+                    self.waiting += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+                if connection is None:
+                    self.size += 1
+            wait_seconds.observe(time.monotonic() - started,
+                                 alias=self.alias)
+        finally:
+            for candidate in stale:
+                _close_quietly(candidate)
+        if connection is None:
+            try:
+                connection = connect()
+            except BaseException:
+                with self._condition:
+                    self.size -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._born[id(connection)] = time.monotonic()
+                self.created += 1
+        checkout_seconds.observe(time.monotonic() - started,
+                                 alias=self.alias)
+        return connection
+
+    def release(self, connection, reusable=True):
+        """Возвращает соединение в пул или закрывает его."""
+        with self._condition:
+            if id(connection) not in self._born:
+                reusable = False
+            elif reusable and not connection.closed:
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+                return
+            else:
+                self._forget(connection)
+        _close_quietly(connection)
+
+    def close_idle(self):
+        """Закрывает все свободные соединения."""
+        with self._condition:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            for connection in idle:
+                self._forget(connection)
+        for connection in idle:
+            _close_quietly(connection)
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """Пул для базы в текущем процессе; после fork создаётся новый,
+    унаследованные соединения родителя не используются."""
+    key = (alias, settings_dict['NAME'], settings_dict['HOST'],
+           settings_dict['PORT'], settings_dict['USER'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+            pool = _pools[key] = ConnectionPool(
+                alias,
+                max_size=int(options['MAX_SIZE']),
+                timeout=float(options['TIMEOUT']),
+                max_idle=float(options['MAX_IDLE']),
+                max_lifetime=float(options['MAX_LIFETIME']),
+            )
+        return pool
+
+
+def close_pools(alias=None):
+    """Закрывает свободные соединения всех пулов базы (или всех баз)."""
+    with _pools_lock:
+        pools = [pool for (pool_alias, *_), pool in _pools.items()
+                 if alias is None or pool_alias == alias]
+    for pool in pools:
+        pool.close_idle()
+
+
+@register_collector
+def _collect():
+    with _pools_lock:
+        pools = [pool for pool in _pools.values()
+                 if pool.pid == os.getpid()]
+    for name, documentation, attribute, kind in (
+        ('foodgram_db_pool_size', 'Открытые соединения пула.',
+         'size', 'gauge'),
+        ('foodgram_db_pool_max_size', 'Максимальный размер пула.',
+         'max_size', 'gauge'),
+        ('foodgram_db_pool_idle', 'Свободные соединения пула.',
+         'idle', 'gauge'),
+        ('foodgram_db_pool_in_use', 'Выданные соединения пула.',
+         'in_use', 'gauge'),
+        ('foodgram_db_pool_waiting', 'Потоки, ожидающие соединение.',
+         'waiting', 'gauge'),
+        ('foodgram_db_pool_connections_created_total',
+         'Установленные пулом соединения.', 'created', 'counter'),
+        ('foodgram_db_pool_timeouts_total',
+         'Отказы по таймауту ожидания.', 'timeouts', 'counter'),
+    ):
+        yield from gauge_lines(
+            name, documentation,
+            [({'alias': pool.alias}, getattr(pool, attribute))
+             for pool in pools],
+            kind=kind,
+        )
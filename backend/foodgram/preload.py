@@ -0,0 +1,28 @@
+"""Загрузка приложения в мастере gunicorn до запуска воркеров.
+
+При ``preload_app`` воркеры получают уже импортированный код общими с
+мастером страницами памяти и не импортируют представления при первом
+запросе.
+"""
+import gc
+from importlib import import_module
+
+from django.db import connections
+from django.urls import get_resolver
+
+# Модули, импорт которых в приложении отложен до первого использования:
+# без preload они не замедляют запуск, с preload - загружаются один раз.
+DEFERRED_MODULES = ('numpy', 'recipes.similarity',
+                    'drf_extra_fields.fields', 'PIL.Image')
+
+
+def preload():
+    get_resolver().url_patterns
+    for name in DEFERRED_MODULES:
+        import_module(name)
+    # Соединения мастера не должны достаться воркерам.
+    connections.close_all()
+    # Объекты мастера исключаются из сборки мусора, чтобы её обход в
+    # воркерах не копировал общие страницы.
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,326 @@
+"""Профилирование отдельных запросов по выборке стеков.
+
+Запрос сотрудника с заголовком ``X-Profile`` или параметром ``_profile``
+выполняется под профилировщиком: отдельный поток раз в
+``PROFILE_INTERVAL`` миллисекунд снимает стек потока запроса. Профиль
+вместе с журналом SQL-запросов сохраняется в ``PROFILE_DIR``, а его
+номер возвращается в ``X-Profile-Id``; со значением ``return`` вместо
+ответа возвращается сам профиль. Кроме того, доля ``PROFILE_SAMPLE_RATE``
+всех запросов профилируется и сохраняется без запроса. Журнал SQL
+ведёт учёт времени ``request_metrics_middleware``, поэтому профилирование
+подключается после него.
+
+Выборочные профили пишет на диск фоновый поток через ограниченную
+очередь; при переполнении профиль отбрасывается. В ``PROFILE_DIR``
+хранится не больше ``PROFILE_MAX_FILES`` профилей, старые удаляются.
+
+Стеки хранятся в свёрнутом формате (``кадр;кадр;кадр число``), который
+понимают flamegraph.pl, speedscope и inferno:
+``jq -r .folded профиль.json | flamegraph.pl > профиль.svg``. Под ASGI
+снимаются стеки только потоков запроса: потока цикла событий, пока в нём
+выполняется задача запроса, и потока, в котором ``sync_to_async``
+выполняет синхронный код запроса. Профили по представлениям сводит
+команда ``aggregate_profiles``.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.constants import PROFILE_QUEUE_SIZE
+
+from . import request_timing
+from .middleware import view_label
+from .query_audit import normalize
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+RETURN = 'return'
+SAMPLED = 'sampled'
+
+logger = logging.getLogger(__name__)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    module = frame.f_globals.get('__name__', '?')
+    return f'{name} ({module}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """Поток, который раз в ``interval`` секунд снимает стеки потоков
+    ``threads`` и считает свёрнутые стеки. ``threads`` сопоставляет
+    номеру потока задачу asyncio: стек такого потока учитывается, только
+    пока в нём выполняется эта задача (``None`` — всегда). Кадры выше
+    ``root`` отбрасываются."""
+
+    # Поток профилировщика получает GIL не чаще интервала переключения
+    # (5 мс). Для запросов сотрудников (``fast``) интервал на время
+    # профилирования уменьшается; выборочные профили снимаются не чаще
+    # него и не замедляют остальные потоки процесса.
+    _lock = threading.Lock()
+    _active = 0
+    _switch_interval = None
+
+    def __init__(self, interval, threads, root=None, fast=False):
+        self.fast = fast
+        self.interval = (interval if fast
+                         else max(interval, sys.getswitchinterval()))
+        self.threads = threads
+        self.root = root
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler',
+                                        daemon=True)
+
+    def _fold(self, frame):
+        names = []
+        while frame is not None and frame is not self.root:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            # После остановки поток запроса уже ждёт профилировщик.
+            if self._stop.is_set():
+                break
+            for ident, task in self.threads.items():
+                frame = frames.get(ident)
+                if frame is None or (task is not None and asyncio.current_task(
+                        task.get_loop()) is not task):
+                    continue
+                self.stacks[self._fold(frame)] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        if self.fast:
+            with Sampler._lock:
+                if not Sampler._active:
+                    Sampler._switch_interval = sys.getswitchinterval()
+                    sys.setswitchinterval(
+                        min(Sampler._switch_interval, self.interval / 2))
+                Sampler._active += 1
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if self.fast:
+            with Sampler._lock:
+                Sampler._active -= 1
+                if not Sampler._active:
+                    sys.setswitchinterval(Sampler._switch_interval)
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count
+                         in sorted(self.stacks.items()) if stack)
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # Воркеры API не подключают сессии: сотрудник определяется по токену.
+    try:
+        credentials = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return credentials is not None and credentials[0].is_staff
+
+
+def _flag(request):
+    return (request.META.get(PROFILE_HEADER)
+            or request.GET.get(PROFILE_PARAM))
+
+
+def requested_mode(request):
+    """``'return'``, ``'store'``, ``'sampled'`` или ``None``, если запрос
+    не профилируется."""
+    flag = _flag(request)
+    if flag and _is_staff(request):
+        return RETURN if flag == RETURN else 'store'
+    if (settings.PROFILE_SAMPLE_RATE
+            and random.random() < settings.PROFILE_SAMPLE_RATE):
+        return SAMPLED
+    return None
+
+
+def _requested_mode_and_thread(request):
+    """Режим и номер потока, в котором ``sync_to_async`` выполняет
+    синхронный код этого запроса."""
+    return requested_mode(request), threading.get_ident()
+
+
+def _document(request, response, sampler, queries, started_at, duration,
+              mode):
+    return {
+        'id': uuid.uuid4().hex,
+        'view': view_label(request),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'trigger': SAMPLED if mode == SAMPLED else 'staff',
+        'started_at': started_at.isoformat(),
+        'duration_ms': round(duration * 1000, 3),
+        'interval_ms': sampler.interval * 1000,
+        'samples': sampler.samples,
+        'folded': sampler.folded(),
+        'queries': [
+            {'database': database, 'sql': normalize(sql),
+             'duration_ms': round(seconds * 1000, 3)}
+            for database, sql, seconds in queries
+        ],
+    }
+
+
+def _prune(directory):
+    paths = sorted(directory.glob('*.json'))
+    for path in paths[:max(len(paths) - settings.PROFILE_MAX_FILES, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def store(document):
+    """Сохраняет профиль и удаляет самые старые сверх
+    ``PROFILE_MAX_FILES``."""
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    started_at = document['started_at'][:19].replace(':', '')
+    path = directory / f'{started_at}-{document["id"]}.json'
+    path.write_text(json.dumps(document, ensure_ascii=False))
+    _prune(directory)
+    return path
+
+
+class ProfileWriter:
+    """Фоновый поток, который собирает и сохраняет выборочные профили."""
+
+    def __init__(self, size=PROFILE_QUEUE_SIZE):
+        self.size = size
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _start(self):
+        """Запускает поток; после fork — заново."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.size)
+            threading.Thread(target=self._run, name='profile-writer',
+                             daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            build = self._queue.get()
+            try:
+                store(build())
+            except Exception:
+                logger.exception('Не удалось сохранить профиль')
+            finally:
+                self._queue.task_done()
+
+    def submit(self, build):
+        """Ставит в очередь функцию, которая собирает профиль."""
+        self._start()
+        try:
+            self._queue.put_nowait(build)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Ждёт, пока очередь опустеет."""
+        self._start()
+        self._queue.join()
+
+
+writer = ProfileWriter()
+
+
+def _finish(request, response, document, mode):
+    if mode == RETURN:
+        return JsonResponse(document, json_dumps_params={
+            'ensure_ascii': False})
+    store(document)
+    response['X-Profile-Id'] = document['id']
+    return response
+
+
+def _collect(request, response, sampler, queries, started_at, duration,
+             mode):
+    """Профиль сотрудника собирается сразу, выборочный — в фоне."""
+    if mode == SAMPLED:
+        queries = list(queries)
+        writer.submit(lambda: _document(request, response, sampler, queries,
+                                        started_at, duration, mode))
+        return None
+    return _document(request, response, sampler, queries, started_at,
+                     duration, mode)
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    """Профилирует запросы сотрудников с флагом и случайную выборку."""
+    interval = settings.PROFILE_INTERVAL / 1000
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            mode = None
+            if _flag(request) or settings.PROFILE_SAMPLE_RATE:
+                mode, worker = await sync_to_async(
+                    _requested_mode_and_thread)(request)
+            if mode is None:
+                return await get_response(request)
+            started_at, started = timezone.now(), time.perf_counter()
+            queries = request_timing.log_queries()
+            threads = {threading.get_ident(): asyncio.current_task(),
+                       worker: None}
+            with Sampler(interval, threads, fast=mode != SAMPLED) as sampler:
+                response = await get_response(request)
+            document = _collect(request, response, sampler, queries,
+                                started_at, time.perf_counter() - started,
+                                mode)
+            if document is None:
+                return response
+            return await sync_to_async(_finish)(request, response,
+                                                document, mode)
+        return middleware
+
+    def middleware(request):
+        mode = requested_mode(request)
+        if mode is None:
+            return get_response(request)
+        started_at, started = timezone.now(), time.perf_counter()
+        queries = request_timing.log_queries()
+        with Sampler(interval, {threading.get_ident(): None},
+                     sys._getframe(), fast=mode != SAMPLED) as sampler:
+            response = get_response(request)
+        document = _collect(request, response, sampler, queries, started_at,
+                            time.perf_counter() - started, mode)
+        if document is None:
+            return response
+        return _finish(request, response, document, mode)
+    return middleware
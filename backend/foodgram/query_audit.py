@@ -0,0 +1,53 @@
+"""Запись SQL-запросов для поиска N+1 и проверки бюджетов.
+
+Запросы сравниваются по шаблону: параметры уже вынесены драйвером в
+``%s``, а списки ``IN (%s, %s, ...)`` сворачиваются, поэтому запросы,
+отличающиеся только значениями, считаются одинаковыми.
+"""
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def normalize(sql):
+    return _IN_LIST.sub('IN (...)', sql.strip())
+
+
+class QueryRecorder:
+    """Контекстный менеджер, записывающий шаблоны выполненных запросов
+    во всех базах."""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def _record(self, execute, sql, params, many, context):
+        template = normalize(sql)
+        if not template.startswith(_IGNORED):
+            self.queries.append(template)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(
+                connection.execute_wrapper(self._record))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=2):
+        """Шаблоны, выполненные не меньше ``threshold`` раз, — признак
+        N+1."""
+        return [(template, count)
+                for template, count in Counter(self.queries).most_common()
+                if count >= threshold]
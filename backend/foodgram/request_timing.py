@@ -0,0 +1,100 @@
+"""Учёт времени внутри запроса: SQL, сериализация и рендеринг.
+
+Состояние запроса хранится в контекстной переменной, поэтому доступно и
+из потоков ``sync_to_async``. Запросы к базе считаются обёрткой,
+которая ставится на каждое новое соединение.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'sql', 'serialize', 'render', 'log', '_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        # Журнал запросов (база, SQL, секунды), если его кто-то ведёт.
+        self.log = None
+        self._depth = {}
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+def start():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def log_queries():
+    """Начинает журнал запросов текущего запроса и возвращает его."""
+    timings = _current.get()
+    if timings is None:
+        return []
+    timings.log = []
+    return timings.log
+
+
+def timed(bucket):
+    """Прибавляет время вызова к ``bucket`` текущего запроса; вложенные
+    вызовы с тем же ``bucket`` не учитываются повторно."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None:
+                return function(*args, **kwargs)
+            depth = timings._depth.get(bucket, 0)
+            timings._depth[bucket] = depth + 1
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings._depth[bucket] = depth
+                if not depth:
+                    setattr(timings, bucket, getattr(timings, bucket)
+                            + time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def _record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        timings.sql += duration
+        timings.queries += 1
+        if timings.log is not None:
+            timings.log.append((context['connection'].alias, sql, duration))
+
+
+@receiver(connection_created)
+def _install_query_wrapper(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+for _connection in connections.all(initialized_only=True):
+    if _connection.connection is not None:
+        _install_query_wrapper(None, _connection)
@@ -8,6 +8,18 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'django_secret_key')
 DEBUG = False
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
+# Заголовок Server-Timing с временем SQL, сериализации и рендеринга.
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', '1') == '1'
+
+# Доступ к /metrics: адреса и подсети сборщика через запятую, токен для
+# заголовка "Authorization: Bearer <токен>"; сотрудникам доступ открыт.
+METRICS_ALLOWED_IPS = [
+    address.strip() for address in os.getenv(
+        'METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+    if address.strip()
+]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -26,11 +38,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.request_metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.profiling.profiling_middleware',
+    'foodgram.db_router.replica_routing_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,10 +79,54 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+if os.getenv('DB_POOL', '').lower() in ('1', 'true', 'yes'):
+    DATABASES['default'].update(
+        ENGINE='foodgram.postgresql_pool',
+        CONN_MAX_AGE=0,
+        POOL={
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'MAX_IDLE': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        },
+    )
+
+# Реплики только для чтения: DB_REPLICA_HOSTS=replica1,replica2
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -125,5 +184,64 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'SEARCH_PARAM': 'name',
+    # Перед бэкендом стоит nginx: IP клиента - последний адрес в
+    # X-Forwarded-For, более ранние клиент мог подставить сам.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+    'DEFAULT_THROTTLE_CLASSES': ['api.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'shopping_list': os.getenv('THROTTLE_SHOPPING_LIST', '10/min'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', '30/min'),
+        'avatar': os.getenv('THROTTLE_AVATAR', '10/min'),
+        'ingredient_search': os.getenv('THROTTLE_INGREDIENT_SEARCH',
+                                       '120/min'),
+    },
+}
+
+# Хранилище вёдер ограничителя частоты: в памяти процесса или общее в
+# Redis (api.throttling.RedisBucketStore) для нескольких воркеров.
+THROTTLE_STORE = os.getenv('THROTTLE_STORE',
+                           'api.throttling.LocalBucketStore')
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL',
+                               os.getenv('REDIS_URL',
+                                         'redis://localhost:6379/0'))
+
+# Шина инвалидации локальных кэшей между воркерами (foodgram.invalidation):
+# LISTEN/NOTIFY в PostgreSQL или только внутри процесса
+# (foodgram.invalidation.LocalTransport). Кэши отстают от базы не больше
+# чем на INVALIDATION_MAX_STALENESS секунд.
+INVALIDATION_TRANSPORT = os.getenv(
+    'INVALIDATION_TRANSPORT', 'foodgram.invalidation.PostgresTransport')
+INVALIDATION_MAX_STALENESS = float(
+    os.getenv('INVALIDATION_MAX_STALENESS', 30))
+
+# Ограничение времени SQL-запросов (мс) для чтения в API по областям
+# (api.degradation). Если база не отвечает, отдаётся последний удачный
+# ответ с пометкой устаревшего, а после DB_BREAKER_FAILURES ошибок за
+# DB_BREAKER_WINDOW секунд чтение на DB_BREAKER_COOLDOWN секунд не
+# доходит до базы.
+STATEMENT_TIMEOUTS = {
+    'read': int(os.getenv('STATEMENT_TIMEOUT_READ', 1000)),
+    'list': int(os.getenv('STATEMENT_TIMEOUT_LIST', 2000)),
+    'shopping_list': int(os.getenv('STATEMENT_TIMEOUT_SHOPPING_LIST', 5000)),
 }
+DB_BREAKER_FAILURES = int(os.getenv('DB_BREAKER_FAILURES', 5))
+DB_BREAKER_WINDOW = float(os.getenv('DB_BREAKER_WINDOW', 10))
+DB_BREAKER_COOLDOWN = float(os.getenv('DB_BREAKER_COOLDOWN', 10))
+
+# Профилирование запросов (foodgram.profiling): каталог профилей, период
+# снятия стеков (мс), доля запросов, которые профилируются без флага, и
+# сколько последних профилей хранить.
+PROFILE_DIR = os.getenv('PROFILE_DIR', BASE_DIR / 'profiles')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 1))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 1000))
@@ -0,0 +1,45 @@
+"""Профиль воркеров, которые обслуживают только API.
+
+API принимает токены и отвечает JSON, поэтому админка, сессии, сообщения,
+CSRF и защита от встраивания во фрейм здесь не подключаются. Запуск:
+``gunicorn -c python:foodgram.gunicorn_api``.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, TEMPLATES
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in {'django.contrib.admin', 'django.contrib.sessions',
+                   'django.contrib.messages'}
+]
+
+# AuthenticationMiddleware требует сессий; пользователя по токену
+# определяет DRF.
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in {
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    }
+]
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        'context_processors': [
+            'django.template.context_processors.debug',
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+        ],
+    },
+}]
+
+ROOT_URLCONF = 'foodgram.urls_api'
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['api.renderers.ORJSONRenderer'],
+}
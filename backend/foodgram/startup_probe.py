@@ -0,0 +1,103 @@
+"""Замер запуска воркера для команды ``bench_startup``.
+
+Запускается отдельным интерпретатором, чтобы импорт шёл с нуля:
+``python -m foodgram.startup_probe /api/recipes/ [--preload]``. С
+``--preload`` приложение загружается как в мастере gunicorn с
+``preload_app``, а запрос обслуживает порождённый ``fork`` воркер.
+Печатает JSON: время импорта, готовности воркера и первого запроса (мс),
+RSS воркера и его собственную, не общую с мастером, память (КБ).
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+
+def memory():
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            usage = {
+                name: int(value.split()[0])
+                for name, _, value in (line.partition(':') for line in smaps)
+                if name in {'Rss', 'Private_Clean', 'Private_Dirty'}
+            }
+    except OSError:
+        # Не Linux: только пиковый RSS, разделяемые страницы не видны.
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'rss': rss, 'private': rss}
+    return {'rss': usage['Rss'],
+            'private': usage['Private_Clean'] + usage['Private_Dirty']}
+
+
+def first_request(application, path):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+    }
+    statuses = []
+    started = time.perf_counter()
+    body = application(environ,
+                       lambda status, headers, *args: statuses.append(status))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return time.perf_counter() - started, statuses[0]
+
+
+def serve(application, path, imported, ready):
+    elapsed, status = first_request(application, path)
+    return {'import_ms': imported * 1000, 'ready_ms': ready * 1000,
+            'request_ms': elapsed * 1000, 'status': status, **memory()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--preload', action='store_true')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    if args.preload:
+        from foodgram.preload import preload
+
+        preload()
+    imported = time.perf_counter() - started
+    if not args.preload:
+        # Без preload каждый воркер импортирует приложение сам.
+        print(json.dumps(serve(application, args.path, imported, imported)))
+        return
+    read, write = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        try:
+            with os.fdopen(write, 'w') as result:
+                json.dump(serve(application, args.path, imported,
+                                time.perf_counter() - forked), result)
+        finally:
+            os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as result:
+        print(result.read())
+    os.waitpid(pid, 0)
+
+
+if __name__ == '__main__':
+    main()
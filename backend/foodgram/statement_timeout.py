@@ -0,0 +1,143 @@
+"""Ограничение времени SQL-запросов внутри участка кода.
+
+``with statement_timeout(2000):`` ограничивает каждый запрос участка
+двумя секундами. Ограничение ставится на соединение перед его первым
+запросом в участке и снимается при выходе, поэтому соединения, которые
+участок не использовал, не затрагиваются. В PostgreSQL это
+``statement_timeout`` сеанса, в SQLite — прерывание запроса по
+истечении времени. Запрос, превысивший время, поднимает
+``StatementTimeout``. В асинхронном коде используется
+``async_statement_timeout``.
+
+Служебные команды выполняются курсором драйвера и не попадают в число
+запросов метрик и бюджетов.
+"""
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from api.constants import SQLITE_PROGRESS_STEPS
+
+# SQLSTATE отменённого запроса в PostgreSQL.
+QUERY_CANCELED = '57014'
+
+
+class StatementTimeout(OperationalError):
+    """Запрос выполнялся дольше разрешённого."""
+
+
+class _Scope:
+    __slots__ = ('milliseconds', 'deadline', 'connections')
+
+    def __init__(self, milliseconds):
+        self.milliseconds = milliseconds
+        self.deadline = None
+        self.connections = set()
+
+
+_current = ContextVar('statement_timeout', default=None)
+
+
+def _apply(connection, scope):
+    if connection.vendor == 'postgresql':
+        with connection.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, false)",
+                (str(scope.milliseconds),))
+    elif connection.vendor == 'sqlite':
+        connection.connection.set_progress_handler(
+            lambda: time.monotonic() > scope.deadline,
+            SQLITE_PROGRESS_STEPS)
+
+
+def _reset(connection):
+    if connection.connection is None:
+        return
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.connection.cursor() as cursor:
+                cursor.execute('RESET statement_timeout')
+        elif connection.vendor == 'sqlite':
+            connection.connection.set_progress_handler(None, 0)
+    except connection.Database.Error:
+        # Соединение с неизвестным ограничением не используется дальше.
+        connection.close()
+
+
+def _timed_out(connection, error):
+    if connection.vendor == 'postgresql':
+        cause = error.__cause__
+        return QUERY_CANCELED in (getattr(cause, 'sqlstate', None),
+                                  getattr(cause, 'pgcode', None))
+    return connection.vendor == 'sqlite' and 'interrupted' in str(error)
+
+
+def _limit_query(execute, sql, params, many, context):
+    scope = _current.get()
+    if scope is None:
+        return execute(sql, params, many, context)
+    connection = context['connection']
+    if connection not in scope.connections:
+        _apply(connection, scope)
+        scope.connections.add(connection)
+    scope.deadline = time.monotonic() + scope.milliseconds / 1000
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as error:
+        if _timed_out(connection, error):
+            raise StatementTimeout(
+                f'Запрос выполнялся дольше {scope.milliseconds} мс'
+            ) from error
+        raise
+
+
+def _release(scope, outer):
+    for connection in scope.connections:
+        _reset(connection)
+        # Внешний участок поставит своё ограничение заново.
+        if outer is not None:
+            outer.connections.discard(connection)
+
+
+@contextmanager
+def statement_timeout(milliseconds):
+    """Ограничивает время каждого запроса участка ``milliseconds``."""
+    outer = _current.get()
+    scope = _Scope(milliseconds)
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+        _release(scope, outer)
+
+
+@asynccontextmanager
+async def async_statement_timeout(milliseconds):
+    """То же для асинхронного кода: запросы идут в потоках
+    ``sync_to_async``, и ограничение снимается в том же потоке."""
+    outer = _current.get()
+    scope = _Scope(milliseconds)
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+        if scope.connections:
+            await sync_to_async(_release)(scope, outer)
+
+
+@receiver(connection_created)
+def _install_query_wrapper(sender, connection, **kwargs):
+    if _limit_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_limit_query)
+
+
+for _connection in connections.all(initialized_only=True):
+    if _connection.connection is not None:
+        _install_query_wrapper(None, _connection)
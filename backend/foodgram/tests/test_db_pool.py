@@ -0,0 +1,147 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from foodgram.postgresql_pool.pool import (ConnectionPool, PoolTimeout,
+                                           _collect, _pools)
+
+
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Connector:
+    """``connect()`` пула: считает созданные соединения."""
+
+    def __init__(self):
+        self.created = []
+
+    def __call__(self):
+        connection = FakeConnection()
+        self.created.append(connection)
+        return connection
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.connect = Connector()
+
+    def test_released_connection_reused(self):
+        pool = ConnectionPool('test', max_size=2)
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+        self.assertIs(pool.acquire(self.connect), connection)
+        self.assertEqual(pool.created, 1)
+        self.assertEqual((pool.size, pool.in_use, pool.idle), (1, 1, 0))
+
+    def test_timeout_when_pool_full(self):
+        pool = ConnectionPool('test', max_size=2, timeout=0.05)
+        held = [pool.acquire(self.connect) for _ in range(2)]
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(pool.timeouts, 1)
+        self.assertEqual(pool.waiting, 0)
+        self.assertEqual(len(self.connect.created), 2)
+        pool.release(held[0])
+        self.assertIs(pool.acquire(self.connect), held[0])
+
+    def test_waiter_gets_released_connection(self):
+        pool = ConnectionPool('test', max_size=1, timeout=5)
+        connection = pool.acquire(self.connect)
+        received = []
+        waiter = threading.Thread(
+            target=lambda: received.append(pool.acquire(self.connect)))
+        waiter.start()
+        while not pool.waiting:
+            time.sleep(0.001)
+        pool.release(connection)
+        waiter.join()
+        self.assertEqual(received, [connection])
+        self.assertEqual(pool.created, 1)
+
+    def test_failed_connect_frees_slot(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.01)
+
+        def fail():
+            raise OSError
+        with self.assertRaises(OSError):
+            pool.acquire(fail)
+        self.assertEqual(pool.size, 0)
+        self.assertIsNotNone(pool.acquire(self.connect))
+
+    def test_unusable_connection_closed(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.01)
+        connection = pool.acquire(self.connect)
+        pool.release(connection, reusable=False)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.size, 0)
+        self.assertIsNot(pool.acquire(self.connect), connection)
+
+    def test_stale_connections_replaced(self):
+        pool = ConnectionPool('test', max_size=3, max_idle=0.02,
+                              max_lifetime=60)
+        closed, idle = (pool.acquire(self.connect) for _ in range(2))
+        pool.release(closed)
+        pool.release(idle)
+        closed.closed = True
+        time.sleep(0.03)
+        connection = pool.acquire(self.connect)
+        self.assertNotIn(connection, (closed, idle))
+        self.assertTrue(idle.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_connection_lifetime_limited(self):
+        pool = ConnectionPool('test', max_size=1, max_lifetime=0.02)
+        connection = pool.acquire(self.connect)
+        time.sleep(0.03)
+        pool.release(connection)
+        self.assertIsNot(pool.acquire(self.connect), connection)
+        self.assertTrue(connection.closed)
+
+    def test_close_idle(self):
+        pool = ConnectionPool('test', max_size=2)
+        connections = [pool.acquire(self.connect) for _ in range(2)]
+        pool.release(connections[0])
+        pool.close_idle()
+        self.assertTrue(connections[0].closed)
+        self.assertEqual((pool.size, pool.idle), (1, 0))
+
+    def test_concurrent_checkouts_bounded(self):
+        pool = ConnectionPool('test', max_size=4, timeout=5)
+        peak, errors = [], []
+
+        def worker():
+            try:
+                for _ in range(50):
+                    connection = pool.acquire(self.connect)
+                    peak.append(pool.in_use)
+                    pool.release(connection)
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(max(peak), pool.max_size)
+        self.assertLessEqual(pool.created, pool.max_size)
+        self.assertEqual(pool.in_use, 0)
+
+    def test_metrics(self):
+        pool = ConnectionPool('metrics_test', max_size=2)
+        _pools[('metrics_test',)] = pool
+        self.addCleanup(_pools.pop, ('metrics_test',))
+        pool.acquire(self.connect)
+        lines = list(_collect())
+        self.assertIn('foodgram_db_pool_in_use{alias="metrics_test"} 1',
+                      lines)
+        self.assertIn('foodgram_db_pool_max_size{alias="metrics_test"} 2',
+                      lines)
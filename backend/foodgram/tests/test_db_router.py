@@ -0,0 +1,148 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.http import HttpResponse
+from django.test import (RequestFactory, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from foodgram.db_router import PIN_COOKIE, _state, replica_routing_middleware
+from recipes.models import Ingredient
+from recipes.tests.factories import create_user
+
+REPLICA = 'replica_1'
+
+# Реплика для тестов — зеркало основной базы. Алиас объявляется при
+# импорте модуля, раньше создания тестовых баз, и не входит в
+# DATABASE_REPLICAS: его включают только тесты ниже.
+connections.settings.setdefault(REPLICA, {
+    **connections.settings[DEFAULT_DB_ALIAS],
+    'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+})
+
+
+# Внутри транзакции чтение всегда идёт в основную базу, поэтому тесты
+# работают без обёртывающей транзакции TestCase.
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA], DATABASE_REPLICA_PIN_SECONDS=10,
+    CACHES={'default': {'BACKEND': 'django.core.cache.'
+                        'backends.locmem.LocMemCache'}})
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.routes = []
+
+    def _view(self, write=False):
+        def view(request):
+            if write:
+                router.db_for_write(Ingredient)
+            self.routes.append(router.db_for_read(Ingredient))
+            return HttpResponse()
+        return view
+
+    def _get(self, path='/api/ingredients/', write=False, **extra):
+        middleware = replica_routing_middleware(self._view(write))
+        return middleware(self.factory.get(path, **extra))
+
+    def test_api_reads_use_replica(self):
+        self._get()
+        self.assertEqual(self.routes, [REPLICA])
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(router.db_for_read(Ingredient), DEFAULT_DB_ALIAS)
+        self._get('/admin/')
+        self.assertEqual(self.routes, [DEFAULT_DB_ALIAS])
+
+    def test_tokens_and_transactions_use_primary(self):
+        def view(request):
+            self.routes.append(router.db_for_read(Token))
+            with transaction.atomic():
+                self.routes.append(router.db_for_read(Ingredient))
+            return HttpResponse()
+        replica_routing_middleware(view)(
+            self.factory.get('/api/ingredients/'))
+        self.assertEqual(self.routes, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS])
+
+    def test_write_pins_request_and_client(self):
+        response = self._get(write=True)
+        self.assertEqual(self.routes, [DEFAULT_DB_ALIAS])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+
+        self.factory.cookies[PIN_COOKIE] = '1'
+        self._get()
+        self.assertEqual(self.routes[-1], DEFAULT_DB_ALIAS)
+
+    def test_unsafe_method_pins_token(self):
+        middleware = replica_routing_middleware(self._view())
+        response = middleware(self.factory.post(
+            '/api/recipes/', HTTP_AUTHORIZATION='Token own'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self._get(HTTP_AUTHORIZATION='Token own')
+        self._get(HTTP_AUTHORIZATION='Token other')
+        self.assertEqual(self.routes,
+                         [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS, REPLICA])
+
+    def test_no_pin_without_replicas(self):
+        middleware = replica_routing_middleware(self._view(write=True))
+        with self.settings(DATABASE_REPLICAS=[]), \
+                mock.patch.object(cache, 'set') as cache_set:
+            response = middleware(self.factory.post(
+                '/api/recipes/', HTTP_AUTHORIZATION='Token own'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        cache_set.assert_not_called()
+        self.assertEqual(self.routes, [DEFAULT_DB_ALIAS])
+
+    def test_state_reset_after_request(self):
+        self._get()
+        self.assertIsNone(_state.get())
+
+        def failing(request):
+            raise ValueError
+        with self.assertRaises(ValueError):
+            replica_routing_middleware(failing)(
+                self.factory.get('/api/ingredients/'))
+        self.assertIsNone(_state.get())
+        self.assertEqual(router.db_for_read(Ingredient), DEFAULT_DB_ALIAS)
+
+    def test_async_state_reset_after_request(self):
+        async def view(request):
+            self.routes.append(router.db_for_read(Ingredient))
+            return HttpResponse()
+
+        async def request():
+            middleware = replica_routing_middleware(view)
+            await middleware(self.factory.get('/api/ingredients/'))
+            return _state.get()
+
+        self.assertIsNone(async_to_sync(request)())
+        self.assertEqual(self.routes, [REPLICA])
+        self.assertIsNone(_state.get())
+
+    def test_api_request_reads_replica_connection(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        primary = CaptureQueriesContext(connections[DEFAULT_DB_ALIAS])
+        with CaptureQueriesContext(connections[REPLICA]) as replica, primary:
+            response = self.client.get('/api/ingredients/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(replica.captured_queries), 1)
+        self.assertEqual(primary.captured_queries, [])
+
+    def test_api_write_then_read_uses_primary(self):
+        user = create_user('user')
+        author = create_user('author')
+        token = Token.objects.create(user=user)
+        response = self.client.post(
+            f'/api/users/{author.id}/subscribe/',
+            HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 201)
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.get(
+                '/api/users/me/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica.captured_queries, [])
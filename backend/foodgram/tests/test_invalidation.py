@@ -0,0 +1,270 @@
+import json
+import time
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from api.constants import INVALIDATION_PAYLOAD_LIMIT
+from foodgram.invalidation import (RESET, InvalidationBus, LocalTransport,
+                                   PostgresTransport, bus)
+from recipes.models import Ingredient
+
+TOPIC = 'check'
+MAX_STALENESS = 0.2
+
+
+class Rollback(Exception):
+    pass
+
+
+class Worker:
+    """Шина воркера с кэшем-словарём: события удаляют ключи, сброс
+    очищает кэш целиком."""
+
+    def __init__(self, transport, max_staleness=MAX_STALENESS):
+        self.bus = InvalidationBus(transport, max_staleness)
+        self.cache = {}
+        self.resets = 0
+        self.bus.subscribe(TOPIC)(
+            lambda event: self.cache.pop(event.key, None))
+        self.bus.on_reset(self._reset)
+        self.bus.start()
+
+    def _reset(self):
+        self.cache.clear()
+        self.resets += 1
+
+    def fill(self, *keys):
+        self.cache.update(dict.fromkeys(keys, True))
+
+
+def wait(condition, timeout):
+    """Ждёт выполнения условия; возвращает время ожидания или None."""
+    started = time.monotonic()
+    while time.monotonic() - started <= timeout:
+        if condition():
+            return time.monotonic() - started
+        time.sleep(0.005)
+    return None
+
+
+class LocalDeliveryTests(TestCase):
+
+    def setUp(self):
+        self.transport = LocalTransport()
+        self.publisher = Worker(self.transport)
+        self.worker = Worker(self.transport)
+        self.addCleanup(self.publisher.bus.stop)
+        self.addCleanup(self.worker.bus.stop)
+
+    def test_event_evicts_key_after_commit(self):
+        self.worker.fill(1, 2)
+        published = time.monotonic()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.publisher.bus.publish(TOPIC, 1)
+            self.assertIn(1, self.worker.cache)
+        self.assertLess(time.monotonic() - published, MAX_STALENESS)
+        self.assertEqual(self.worker.cache, {2: True})
+        self.assertEqual(self.worker.resets, 0)
+
+    def test_publisher_dispatches_locally(self):
+        received = []
+        self.publisher.bus.subscribe(TOPIC)(received.append)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.publisher.bus.publish(TOPIC, 1, {'deleted': True})
+        self.assertEqual(len(received), 1)
+        self.assertTrue(received[0].local)
+        self.assertEqual(received[0].data, {'deleted': True})
+
+    def test_rolled_back_event_not_delivered(self):
+        self.worker.fill(1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.publisher.bus.publish(TOPIC, 1)
+                    raise Rollback
+            except Rollback:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertIn(1, self.worker.cache)
+
+
+class VersionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.transport = LocalTransport()
+        self.publisher = Worker(self.transport)
+        self.worker = Worker(self.transport)
+        self.addCleanup(self.publisher.bus.stop)
+        self.addCleanup(self.worker.bus.stop)
+
+    def _message(self, version, *keys, origin='other:1:test'):
+        return json.dumps({'o': origin, 'v': version,
+                           'e': [[TOPIC, key, {}] for key in keys]})
+
+    def test_messages_numbered_in_order(self):
+        sent = []
+        self.worker.bus.receive = sent.append
+        for key in range(3):
+            self.publisher.bus._send([TOPIC, key, {}], 'default')
+        self.assertEqual([json.loads(message)['v'] for message in sent],
+                         [1, 2, 3])
+        self.assertEqual({json.loads(message)['o'] for message in sent},
+                         {self.publisher.bus.origin})
+
+    def test_consecutive_versions_apply_events(self):
+        self.worker.fill(1, 2, 3)
+        self.worker.bus.receive(self._message(1, 1))
+        self.worker.bus.receive(self._message(2, 2))
+        self.assertEqual(self.worker.cache, {3: True})
+        self.assertEqual(self.worker.resets, 0)
+
+    def test_gap_in_versions_resets(self):
+        self.worker.bus.receive(self._message(1, 1))
+        self.worker.fill(1, 2, 3)
+        self.worker.bus.receive(self._message(3, 1))
+        self.assertEqual(self.worker.cache, {})
+        self.assertEqual(self.worker.resets, 1)
+
+    def test_repeated_version_resets(self):
+        self.worker.bus.receive(self._message(1, 1))
+        self.worker.fill(2)
+        self.worker.bus.receive(self._message(1, 1))
+        self.assertEqual(self.worker.resets, 1)
+
+    def test_versions_counted_per_origin(self):
+        self.worker.bus.receive(self._message(5, origin='a:1:test'))
+        self.worker.bus.receive(self._message(1, origin='b:1:test'))
+        self.worker.bus.receive(self._message(6, origin='a:1:test'))
+        self.assertEqual(self.worker.resets, 0)
+
+    def test_own_messages_ignored(self):
+        self.worker.fill(1)
+        self.worker.bus.receive(
+            self._message(7, 1, origin=self.worker.bus.origin))
+        self.assertEqual(self.worker.cache, {1: True})
+
+    def test_dropped_message_resets_receiver(self):
+        # Пропуск виден начиная со второго сообщения процесса.
+        self.publisher.bus._send([TOPIC, 0, {}], 'default')
+        self.worker.fill(1, 2, 3)
+        self.transport.drop(self.worker.bus)
+        self.publisher.bus._send([TOPIC, 1, {}], 'default')
+        self.publisher.bus._send([TOPIC, 2, {}], 'default')
+        self.assertEqual(self.worker.cache, {})
+        self.assertEqual(self.worker.resets, 1)
+
+
+class ResetTests(SimpleTestCase):
+
+    def setUp(self):
+        self.transport = LocalTransport()
+        self.publisher = Worker(self.transport)
+        self.worker = Worker(self.transport)
+        self.addCleanup(self.publisher.bus.stop)
+        self.addCleanup(self.worker.bus.stop)
+
+    def test_reset_event_clears_all_caches(self):
+        self.publisher.fill(1)
+        self.worker.fill(1, 2)
+        self.publisher.bus._send([RESET, None, {}], 'default')
+        self.assertEqual(self.publisher.cache, {})
+        self.assertEqual(self.worker.cache, {})
+        self.assertEqual(self.worker.resets, 1)
+
+    def test_oversized_event_sent_as_reset(self):
+        sent = []
+        self.worker.bus.receive = sent.append
+        self.publisher.bus._send(
+            [TOPIC, 1, {'ids': list(range(INVALIDATION_PAYLOAD_LIMIT))}],
+            'default')
+        self.assertEqual(json.loads(sent[0])['e'], [[RESET, None, {}]])
+
+    def test_failing_handler_resets(self):
+        def fail(event):
+            raise ValueError
+        self.worker.bus.subscribe(TOPIC)(fail)
+        self.worker.fill(1, 2)
+        with self.assertLogs('foodgram.invalidation', 'ERROR'):
+            self.publisher.bus._send([TOPIC, 1, {}], 'default')
+        self.assertEqual(self.worker.cache, {})
+
+    def test_staleness_bounded_without_heartbeat(self):
+        self.worker.fill(1, 2)
+        self.transport.disconnect(self.worker.bus)
+        published = time.monotonic()
+        self.publisher.bus._send([TOPIC, 1, {}], 'default')
+        self.worker.bus.check()
+        self.assertIn(1, self.worker.cache)
+        self.assertIsNotNone(wait(
+            lambda: self.worker.bus.check() or 1 not in self.worker.cache,
+            2 * MAX_STALENESS))
+        self.assertLessEqual(time.monotonic() - published,
+                             MAX_STALENESS + 0.05)
+        self.assertEqual(self.worker.resets, 1)
+
+    def test_heartbeat_keeps_cache(self):
+        self.worker.fill(1)
+        time.sleep(MAX_STALENESS * 1.5)
+        self.worker.bus.check()
+        self.assertEqual(self.worker.cache, {1: True})
+
+    def test_reconnect_resets(self):
+        self.worker.fill(1)
+        self.transport.disconnect(self.worker.bus)
+        self.transport.connect(self.worker.bus)
+        self.assertEqual(self.worker.cache, {})
+        self.assertEqual(self.worker.resets, 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'NOTIFY есть только в '
+            'PostgreSQL')
+class PostgresDeliveryTests(TransactionTestCase):
+
+    def _workers(self):
+        publisher = Worker(PostgresTransport())
+        worker = Worker(PostgresTransport())
+        self.addCleanup(publisher.bus.stop)
+        self.addCleanup(worker.bus.stop)
+        return publisher, worker
+
+    def test_event_delivered_after_commit(self):
+        publisher, worker = self._workers()
+        worker.fill(1, 2)
+        with transaction.atomic():
+            publisher.bus.publish(TOPIC, 1)
+            self.assertIsNone(wait(lambda: 1 not in worker.cache,
+                                   MAX_STALENESS / 4))
+        self.assertIsNotNone(wait(lambda: 1 not in worker.cache,
+                                  MAX_STALENESS))
+        self.assertIn(2, worker.cache)
+
+    def test_rolled_back_event_not_delivered(self):
+        publisher, worker = self._workers()
+        worker.fill(1, 2)
+        try:
+            with transaction.atomic():
+                publisher.bus.publish(TOPIC, 1)
+                raise Rollback
+        except Rollback:
+            pass
+        publisher.bus.publish(TOPIC, 2)
+        self.assertIsNotNone(wait(lambda: 2 not in worker.cache,
+                                  MAX_STALENESS))
+        self.assertIn(1, worker.cache)
+        self.assertEqual(worker.resets, 0)
+
+    def test_model_events_delivered(self):
+        worker = InvalidationBus(PostgresTransport(), MAX_STALENESS)
+        received = []
+        worker.subscribe('recipes.ingredient')(received.append)
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.addCleanup(bus.stop)
+        ingredient = Ingredient.objects.create(name='проверка',
+                                               measurement_unit='г')
+        ingredient.delete()
+        self.assertIsNotNone(wait(lambda: len(received) == 2,
+                                  MAX_STALENESS))
+        self.assertEqual(received[1].data, {'deleted': True})
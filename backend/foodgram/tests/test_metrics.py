@@ -0,0 +1,45 @@
+from django.test import TestCase, override_settings
+
+from recipes.tests.factories import create_user
+
+
+@override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8'],
+                   METRICS_TOKEN='metrics-secret')
+class MetricsAccessTests(TestCase):
+
+    def test_anonymous_outside_allowlist_denied(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_allowed_network(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'foodgram_http_request', response.content)
+
+    def test_token(self):
+        for header, status in (('Bearer metrics-secret', 200),
+                               ('Bearer wrong', 404),
+                               ('Token metrics-secret', 404)):
+            with self.subTest(header=header):
+                response = self.client.get(
+                    '/metrics', REMOTE_ADDR='192.0.2.1',
+                    HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, status)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_disabled(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='192.0.2.1',
+                                   HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
+
+    def test_staff(self):
+        user = create_user('user')
+        self.client.force_login(user)
+        self.assertEqual(
+            self.client.get('/metrics', REMOTE_ADDR='192.0.2.1').status_code,
+            404)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(
+            self.client.get('/metrics', REMOTE_ADDR='192.0.2.1').status_code,
+            200)
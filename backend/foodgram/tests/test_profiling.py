@@ -0,0 +1,195 @@
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import (AsyncClient, SimpleTestCase, TestCase,
+                         override_settings)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram import profiling
+from foodgram.profiling import ProfileWriter, Sampler, store, writer
+from recipes.tests.factories import create_user, token_client
+
+INTERVAL = 0.001
+
+
+def spin_in_background(stop):
+    """Чужой для запроса поток, занятый вычислениями."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def busy(seconds):
+    finish = time.perf_counter() + seconds
+    while time.perf_counter() < finish:
+        sum(range(1000))
+
+
+class BackgroundThreadMixin:
+
+    def start_background_thread(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=spin_in_background, args=(stop,),
+                                  daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+
+
+class SamplerTests(BackgroundThreadMixin, SimpleTestCase):
+
+    def test_switch_interval_lowered_only_when_fast(self):
+        default = sys.getswitchinterval()
+        with Sampler(INTERVAL, {}) as sampler:
+            self.assertEqual(sys.getswitchinterval(), default)
+        self.assertEqual(sampler.interval, max(INTERVAL, default))
+        with Sampler(INTERVAL, {}, fast=True) as sampler:
+            self.assertLess(sys.getswitchinterval(), default)
+        self.assertEqual(sampler.interval, INTERVAL)
+        self.assertEqual(sys.getswitchinterval(), default)
+
+    def test_only_requested_threads_sampled(self):
+        self.start_background_thread()
+        with Sampler(INTERVAL, {threading.get_ident(): None},
+                     fast=True) as sampler:
+            busy(0.05)
+        self.assertIn('busy', sampler.folded())
+        self.assertNotIn('spin_in_background', sampler.folded())
+
+    def test_loop_thread_sampled_only_for_request_task(self):
+        async def other():
+            while True:
+                busy(0.002)
+                await asyncio.sleep(0)
+
+        async def request():
+            for _ in range(20):
+                busy(0.002)
+                await asyncio.sleep(0)
+
+        async def main():
+            background = asyncio.create_task(other())
+            task = asyncio.create_task(request())
+            with Sampler(INTERVAL, {threading.get_ident(): task},
+                         fast=True) as sampler:
+                await task
+            background.cancel()
+            return sampler.folded()
+
+        folded = asyncio.run(main())
+        self.assertIn('request', folded)
+        self.assertNotIn('other', folded)
+
+
+class ProfileStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def _document(self, number):
+        return {'id': f'{number:032x}',
+                'started_at': f'2026-01-01T00:00:{number:02d}+00:00'}
+
+    def test_retention_keeps_newest(self):
+        with self.settings(PROFILE_DIR=self.directory, PROFILE_MAX_FILES=3):
+            for number in range(5):
+                store(self._document(number))
+        self.assertEqual(
+            sorted(json.loads(path.read_text())['id'][-1]
+                   for path in self.directory.glob('*.json')),
+            ['2', '3', '4'])
+
+    def test_full_queue_drops_profiles(self):
+        release = threading.Event()
+        profile_writer = ProfileWriter(size=1)
+
+        def build(number):
+            release.wait()
+            return self._document(number)
+
+        with self.settings(PROFILE_DIR=self.directory, PROFILE_MAX_FILES=10):
+            for number in range(3):
+                profile_writer.submit(lambda number=number: build(number))
+            self.assertGreaterEqual(profile_writer.dropped, 1)
+            release.set()
+            profile_writer.flush()
+        self.assertEqual(len(list(self.directory.glob('*.json'))),
+                         3 - profile_writer.dropped)
+
+
+@override_settings(PROFILE_INTERVAL=INTERVAL * 1000)
+class ProfilingMiddlewareTests(BackgroundThreadMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+        cls.token = Token.objects.create(user=cls.staff)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.client = token_client(self.token)
+
+    def test_sampled_profile_stored_in_background(self):
+        threads = []
+
+        def recording_store(document):
+            threads.append(threading.current_thread().name)
+            return store(document)
+
+        with self.settings(PROFILE_SAMPLE_RATE=1,
+                           PROFILE_DIR=self.directory), \
+                mock.patch.object(profiling, 'store', recording_store), \
+                mock.patch('sys.setswitchinterval') as setswitchinterval:
+            response = APIClient().get('/api/ingredients/')
+            writer.flush()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(threads, ['profile-writer'])
+        setswitchinterval.assert_not_called()
+        [path] = self.directory.glob('*.json')
+        self.assertEqual(json.loads(path.read_text())['trigger'], 'sampled')
+
+    def test_staff_profile_stored_with_request(self):
+        with self.settings(PROFILE_DIR=self.directory), \
+                mock.patch('sys.setswitchinterval') as setswitchinterval:
+            response = self.client.get('/api/ingredients/',
+                                       HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        [path] = self.directory.glob('*.json')
+        self.assertIn(response['X-Profile-Id'], path.name)
+        self.assertEqual(setswitchinterval.call_count, 2)
+
+    @override_settings(ROOT_URLCONF='foodgram.urls_asgi')
+    async def test_asgi_profile_excludes_other_threads(self):
+        def slow_query(execute, sql, params, many, context):
+            busy(0.01)
+            return execute(sql, params, many, context)
+
+        # Запросы к базе идут в потоке sync_to_async со своим соединением.
+        slow = await sync_to_async(
+            lambda: connection.execute_wrapper(slow_query))()
+        await sync_to_async(slow.__enter__)()
+        try:
+            self.start_background_thread()
+            response = await AsyncClient().get(
+                '/api/ingredients/', headers={
+                    'Authorization': f'Token {self.token.key}',
+                    'X-Profile': 'return'})
+        finally:
+            await sync_to_async(slow.__exit__)(None, None, None)
+        self.assertEqual(response.status_code, 200)
+        folded = response.json()['folded']
+        self.assertIn('slow_query', folded)
+        self.assertNotIn('spin_in_background', folded)
@@ -0,0 +1,10 @@
+"""Маршруты воркеров API (``foodgram.settings_api``): всё, кроме админки."""
+from django.urls import include, path
+
+from .metrics import metrics_view
+
+urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
+    path('api/', include('api.urls')),
+    path('', include('recipes.urls')),
+]
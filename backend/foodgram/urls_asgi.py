@@ -0,0 +1,10 @@
+"""Маршруты для ASGI: асинхронные читающие эндпоинты перекрывают
+одноимённые синхронные, остальные маршруты те же, что в ``foodgram.urls``.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('api.async_urls')),
+] + sync_urlpatterns
@@ -1,25 +1,54 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from foodgram.paginators import LargeTableAdmin
 from .models import (
     Ingredient, Recipe, IngredientInRecipe, Favorites, ShoppingCart
 )
-from django.db.models import Count
+from .signals import ingredients_changed
 
 
 class RecipeIngredientTab(admin.TabularInline):
     model = IngredientInRecipe
     min_num = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient')
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = ('id', 'name', 'author', 'favorites_count')
-    list_filter = ('author', 'name')
+    list_filter = ('pub_date',)
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author',)
     inlines = (RecipeIngredientTab,)
 
     def get_queryset(self, request):
+        # Подзапрос считается только для строк текущей страницы, а
+        # подсчёт записей списка его не включает.
+        favorites = Favorites.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(total=Count('id'))
         return super().get_queryset(request).annotate(
-            total_favorites=Count('favorites')
+            total_favorites=Coalesce(Subquery(favorites.values('total')), 0)
+        )
+
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        previous_ids = set(recipe.ingredients_in_recipe.values_list(
+            'ingredient_id', flat=True)) if change else set()
+        super().save_related(request, form, formsets, change)
+        ingredients_changed.send(
+            sender=Recipe,
+            recipe_id=recipe.id,
+            ingredient_ids=set(recipe.ingredients_in_recipe.values_list(
+                'ingredient_id', flat=True)),
+            previous_ids=previous_ids,
         )
 
     @admin.display(description="В избранном")
@@ -28,18 +57,23 @@ class RecipeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorites)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('id', 'name', 'measurement_unit')
     search_fields = ('name',)
+    ordering = ('name',)
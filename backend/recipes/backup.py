@@ -0,0 +1,246 @@
+"""Потоковая выгрузка и загрузка контента в формате JSON Lines.
+
+Первая строка - заголовок с версией формата, дальше по строке на объект в
+порядке зависимостей (``SPECS``): ``{"model", "pk", "fields"}``, внешние
+ключи - id исходной базы. Таблицы читаются курсором пачками, поэтому
+память не растёт с размером базы; файлы ``.gz``, ``.bz2`` и ``.xz``
+сжимаются.
+
+При загрузке объекты получают новые id, ссылки пересчитываются.
+Пользователи и ингредиенты, которые уже есть в базе (по почте или имени
+пользователя, по названию с единицей измерения), не дублируются. Файлы
+изображений не выгружаются - только их имена в хранилище.
+"""
+import bz2
+import gzip
+import lzma
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+import orjson
+from django.db import connections, transaction
+from django.db.models import Q
+
+from api.constants import DUMP_FORMAT_VERSION
+from users.models import CustomUser, Subscription
+
+from .models import (Favorites, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart)
+from .search import index_recipe
+
+FORMAT = 'foodgram'
+OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+
+class Spec(NamedTuple):
+    model: type
+    fields: tuple
+    # Внешние ключи среди fields: поле -> модель, на которую оно ссылается.
+    references: dict = {}
+
+
+SPECS = (
+    Spec(CustomUser, ('username', 'email', 'first_name', 'last_name',
+                      'password', 'avatar', 'is_active', 'is_staff',
+                      'is_superuser', 'last_login', 'date_joined',
+                      'updated_at', 'relations_changed_at')),
+    Spec(Ingredient, ('name', 'measurement_unit')),
+    Spec(Recipe, ('author', 'name', 'image', 'text', 'cooking_time',
+                  'pub_date', 'updated_at', 'trending_score', 'short_code'),
+         {'author': CustomUser}),
+    Spec(IngredientInRecipe, ('recipe', 'ingredient', 'amount'),
+         {'recipe': Recipe, 'ingredient': Ingredient}),
+    Spec(Favorites, ('user', 'recipe', 'added_at'),
+         {'user': CustomUser, 'recipe': Recipe}),
+    Spec(ShoppingCart, ('user', 'recipe', 'added_at'),
+         {'user': CustomUser, 'recipe': Recipe}),
+    Spec(Subscription, ('user', 'author'),
+         {'user': CustomUser, 'author': CustomUser}),
+)
+LABELS = {spec.model._meta.label_lower: spec for spec in SPECS}
+
+
+def rate(count, seconds):
+    return f'{count / seconds if seconds else 0:.0f} строк/с'
+
+
+def open_dump(path, mode):
+    """Открывает файл выгрузки в двоичном режиме, сжатие - по расширению."""
+    return OPENERS.get(Path(path).suffix, open)(path, mode)
+
+
+def dump(stream, using, chunk_size):
+    """Пишет выгрузку в ``stream``; после каждой модели отдаёт её метку,
+    число строк и время в секундах."""
+    stream.write(orjson.dumps(
+        {'format': FORMAT, 'version': DUMP_FORMAT_VERSION}) + b'\n')
+    with transaction.atomic(using=using):
+        if connections[using].vendor == 'postgresql':
+            # Все таблицы читаются из одного снимка базы.
+            with connections[using].cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL '
+                               'REPEATABLE READ READ ONLY')
+        for label, spec in LABELS.items():
+            started, count = time.perf_counter(), 0
+            rows = spec.model.objects.using(using).order_by('pk').values_list(
+                'pk', *spec.fields).iterator(chunk_size=chunk_size)
+            for pk, *values in rows:
+                stream.write(orjson.dumps({
+                    'model': label, 'pk': pk,
+                    'fields': dict(zip(spec.fields, values)),
+                }) + b'\n')
+                count += 1
+            yield label, count, time.perf_counter() - started
+
+
+@contextmanager
+def _dated_as_dumped(models):
+    """``bulk_create`` заполняет ``auto_now`` и ``auto_now_add`` текущим
+    временем; на время загрузки они отключаются, чтобы сохранить даты."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _existing_users(rows, using):
+    emails = {row['fields']['email'] for row in rows}
+    usernames = {row['fields']['username'] for row in rows}
+    by_email, by_username = {}, {}
+    for pk, email, username in CustomUser.objects.using(using).filter(
+        Q(email__in=emails) | Q(username__in=usernames)
+    ).values_list('pk', 'email', 'username'):
+        by_email[email], by_username[username] = pk, pk
+    return {
+        row['pk']: (by_email.get(row['fields']['email'])
+                    or by_username.get(row['fields']['username']))
+        for row in rows
+    }
+
+
+def _existing_ingredients(rows, using):
+    existing = {
+        (name, unit): pk
+        for pk, name, unit in Ingredient.objects.using(using).filter(
+            name__in={row['fields']['name'] for row in rows}
+        ).values_list('pk', 'name', 'measurement_unit')
+    }
+    return {
+        row['pk']: existing.get((row['fields']['name'],
+                                 row['fields']['measurement_unit']))
+        for row in rows
+    }
+
+
+MATCHERS = {CustomUser: _existing_users, Ingredient: _existing_ingredients}
+# На эти модели ссылаются другие, поэтому их новые id запоминаются.
+REFERENCED = {CustomUser, Ingredient, Recipe}
+
+
+class Restore:
+    """Загрузка выгрузки пачками с пересчётом id."""
+
+    def __init__(self, using, batch_size):
+        self.using = using
+        self.batch_size = batch_size
+        self.ids = {model: {} for model in REFERENCED}
+        self.recipe_ids = []
+
+    def _object(self, spec, row):
+        values = {}
+        for name, value in row['fields'].items():
+            if name in spec.references:
+                try:
+                    values[f'{name}_id'] = (
+                        self.ids[spec.references[name]][value])
+                except KeyError:
+                    raise ValueError(
+                        f'{spec.model._meta.label_lower} {row["pk"]}: '
+                        f'{name} {value} нет в выгрузке.')
+            else:
+                values[name] = spec.model._meta.get_field(
+                    name).to_python(value)
+        return spec.model(**values)
+
+    def _free_short_codes(self, recipes):
+        codes = {recipe.short_code for recipe in recipes} - {None}
+        taken = set(Recipe.objects.using(self.using).filter(
+            short_code__in=codes).values_list('short_code', flat=True))
+        for recipe in recipes:
+            if recipe.short_code in taken:
+                # Код выдаст backfill_short_codes.
+                recipe.short_code = None
+
+    def _flush(self, spec, rows):
+        if not rows:
+            return
+        model = spec.model
+        matched = {}
+        if model in MATCHERS:
+            matched = {pk: existing for pk, existing
+                       in MATCHERS[model](rows, self.using).items()
+                       if existing is not None}
+            self.ids[model].update(matched)
+        rows = [row for row in rows if row['pk'] not in matched]
+        objects = [self._object(spec, row) for row in rows]
+        if model is Recipe:
+            self._free_short_codes(objects)
+        objects = model.objects.using(self.using).bulk_create(
+            objects, ignore_conflicts=model not in REFERENCED)
+        if model in REFERENCED:
+            for row, obj in zip(rows, objects):
+                self.ids[model][row['pk']] = obj.pk
+        if model is Recipe:
+            for recipe in objects:
+                index_recipe(recipe, self.using)
+            self.recipe_ids.extend(recipe.pk for recipe in objects)
+
+    def run(self, stream):
+        """Загружает выгрузку из ``stream``; после каждой модели отдаёт её
+        метку, число строк и время в секундах."""
+        header = orjson.loads(stream.readline() or b'null')
+        if header != {'format': FORMAT, 'version': DUMP_FORMAT_VERSION}:
+            raise ValueError(f'Неизвестный формат выгрузки: {header}.')
+        order = list(LABELS)
+        with ExitStack() as stack:
+            stack.enter_context(transaction.atomic(using=self.using))
+            stack.enter_context(
+                _dated_as_dumped(spec.model for spec in SPECS))
+            spec, rows, count, started = None, [], 0, time.perf_counter()
+            for line in stream:
+                row = orjson.loads(line)
+                label = row['model']
+                if spec is None or label != spec.model._meta.label_lower:
+                    if label not in LABELS or (
+                        spec is not None and order.index(label)
+                        <= order.index(spec.model._meta.label_lower)
+                    ):
+                        raise ValueError(
+                            f'{label}: модель неизвестна или нарушен '
+                            f'порядок зависимостей.')
+                    if spec is not None:
+                        self._flush(spec, rows)
+                        yield (spec.model._meta.label_lower, count,
+                               time.perf_counter() - started)
+                    spec, rows, count = LABELS[label], [], 0
+                    started = time.perf_counter()
+                rows.append(row)
+                count += 1
+                if len(rows) >= self.batch_size:
+                    self._flush(spec, rows)
+                    rows = []
+            if spec is not None:
+                self._flush(spec, rows)
+                yield (spec.model._meta.label_lower, count,
+                       time.perf_counter() - started)
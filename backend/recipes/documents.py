@@ -0,0 +1,161 @@
+"""Готовые карточки рецептов (``RecipeDocument``).
+
+Карточка — не зависящая от пользователя часть ответа API о рецепте:
+поля рецепта, автор и состав, ссылки на файлы относительные. Списки и
+страница рецепта читают её тем же запросом, что и сам рецепт, и
+добавляют только флаги пользователя (см. ``api.representations``).
+
+Карточки пересобираются после коммита изменений рецепта, его состава,
+ингредиентов и профиля автора (см. ``signals``) и командой
+``rebuild_recipe_documents``. Вместо отсутствующих карточек и карточек
+старой версии при чтении используются данные таблиц; чтение в базу не
+пишет.
+"""
+import threading
+
+from django.db import router, transaction
+from django.db.models import Prefetch, QuerySet
+from django.db.models.query import ModelIterable
+
+from api.constants import RECIPE_DOCUMENT_BATCH_SIZE, RECIPE_DOCUMENT_VERSION
+
+from .models import IngredientInRecipe, Recipe, RecipeDocument
+
+# Поля моделей, от которых зависит карточка.
+SOURCE_RECIPE_FIELDS = frozenset({'name', 'image', 'text',
+                                  'cooking_time', 'author'})
+SOURCE_AUTHOR_FIELDS = frozenset({'username', 'first_name', 'last_name',
+                                  'email', 'avatar'})
+
+# Колонки рецепта, нужные при чтении вместе с карточкой: автор для
+# проверки прав, даты и популярность для курсорной пагинации.
+ROW_FIELDS = ('id', 'author', 'pub_date', 'trending_score')
+
+
+def _file_url(file):
+    return file.url if file else None
+
+
+def build_document(recipe):
+    """Карточка рецепта с загруженными автором и составом."""
+    author = recipe.author
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'image': _file_url(recipe.image),
+        'author': {
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'id': author.id,
+            'email': author.email,
+            'avatar': _file_url(author.avatar),
+        },
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'ingredients': [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'amount': item.amount,
+                'measurement_unit': item.ingredient.measurement_unit,
+            }
+            for item in recipe.ingredients_in_recipe.all()
+        ],
+    }
+
+
+def live_queryset(using=None):
+    """Рецепты со всем, что нужно для ``build_document``."""
+    return Recipe.objects.using(using).select_related(
+        'author'
+    ).prefetch_related(
+        Prefetch('ingredients_in_recipe',
+                 queryset=IngredientInRecipe.objects.select_related(
+                     'ingredient')))
+
+
+def store_documents(recipes, using):
+    """Собирает и сохраняет карточки рецептов из ``live_queryset``."""
+    documents = [
+        RecipeDocument(recipe=recipe, version=RECIPE_DOCUMENT_VERSION,
+                       document=build_document(recipe))
+        for recipe in recipes
+    ]
+    return RecipeDocument.objects.using(using).bulk_create(
+        documents, update_conflicts=True, unique_fields=['recipe'],
+        update_fields=['version', 'document', 'updated_at'])
+
+
+def refresh_documents(recipe_ids, using=None):
+    """Пересобирает карточки рецептов ``recipe_ids``; удалённые рецепты
+    пропускаются. Возвращает число сохранённых карточек."""
+    using = using or router.db_for_write(RecipeDocument)
+    recipe_ids = sorted(recipe_ids)
+    stored = 0
+    for start in range(0, len(recipe_ids), RECIPE_DOCUMENT_BATCH_SIZE):
+        batch = recipe_ids[start:start + RECIPE_DOCUMENT_BATCH_SIZE]
+        stored += len(store_documents(
+            live_queryset(using).filter(id__in=batch), using))
+    return stored
+
+
+_pending = threading.local()
+
+
+def _flush(using):
+    recipe_ids = _pending.__dict__.pop(using, None)
+    if recipe_ids:
+        refresh_documents(recipe_ids, using)
+
+
+def schedule_refresh(recipe_ids, using):
+    """Пересобирает карточки после коммита текущей транзакции.
+
+    Вызовы в одной транзакции объединяются в одну пересборку. Рецепты
+    из откатившейся транзакции пересобираются со следующим коммитом,
+    что безопасно: пересборка идемпотентна.
+    """
+    _pending.__dict__.setdefault(using, set()).update(recipe_ids)
+    transaction.on_commit(lambda: _flush(using), using=using)
+
+
+def loaded_document(recipe):
+    """Карточка, загруженная вместе с рецептом, или ``None``."""
+    if not Recipe.document.is_cached(recipe):
+        return None
+    document = getattr(recipe, 'document', None)
+    return None if document is None else document.document
+
+
+class DocumentIterable(ModelIterable):
+    """Рецепты с карточками; вместо недостающих карточки собираются из
+    таблиц одним пакетом без сохранения."""
+
+    def __iter__(self):
+        recipes = list(super().__iter__())
+        missing = {
+            recipe.id: recipe for recipe in recipes
+            if getattr(recipe, 'document', None) is None
+            or recipe.document.version != RECIPE_DOCUMENT_VERSION
+        }
+        if missing:
+            for live in live_queryset(self.queryset.db).filter(
+                    id__in=missing):
+                missing[live.id].document = RecipeDocument(
+                    recipe_id=live.id, version=RECIPE_DOCUMENT_VERSION,
+                    document=build_document(live))
+        return iter(recipes)
+
+
+class DocumentQuerySet(QuerySet):
+
+    def __init__(self, model=None, *args, **kwargs):
+        super().__init__(model, *args, **kwargs)
+        self._iterable_class = DocumentIterable
+
+
+def document_queryset():
+    """Рецепты вместе с карточками одним запросом."""
+    return DocumentQuerySet(Recipe).select_related('document').only(
+        *ROW_FIELDS, 'document__version', 'document__document')
@@ -0,0 +1,149 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Новые рецепты обычных авторов сразу раскладываются по лентам подписчиков
+(fan-out-on-write). Авторы, у которых подписчиков больше
+``FEED_FANOUT_LIMIT``, помечаются как популярные: их рецепты в ленты не
+пишутся, а подмешиваются при чтении (fan-out-on-read). Обратно автор
+переключается, когда подписчиков становится не больше
+``FEED_FANOUT_RESUME_LIMIT``: ленты подписчиков дозаполняются в фоновом
+потоке, а до конца дозаполнения рецепты автора по-прежнему подмешиваются
+при чтении.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from users.models import Subscription
+
+from api.constants import (FEED_BACKFILL_LIMIT, FEED_FANOUT_LIMIT,
+                           FEED_FANOUT_RESUME_LIMIT)
+from .models import CelebrityAuthor, FeedEntry, Recipe
+
+backfills = ThreadPoolExecutor(max_workers=1,
+                               thread_name_prefix='feed-backfill')
+
+
+def _has_more_followers(author_id, limit):
+    return Subscription.objects.filter(
+        author_id=author_id
+    ).order_by().values('id')[limit:].exists()
+
+
+def _fill_timeline(user_id, author_id):
+    recipes = (Recipe.objects
+               .filter(author_id=author_id)
+               .order_by('-pub_date')
+               .values_list('id', 'pub_date')[:FEED_BACKFILL_LIMIT])
+    FeedEntry.objects.bulk_create([
+        FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                  author_id=author_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes
+    ], ignore_conflicts=True)
+
+
+def resume_fanout(author_id):
+    """Дозаполняет ленты подписчиков и возвращает автора к записи лент.
+
+    Пока идёт дозаполнение, автор остаётся популярным; подписчики и
+    рецепты, появившиеся за это время, дописываются после снятия метки.
+    """
+    if (not CelebrityAuthor.objects.filter(author_id=author_id).exists()
+            or _has_more_followers(author_id, FEED_FANOUT_RESUME_LIMIT)):
+        return
+    started = timezone.now()
+    followers = Subscription.objects.filter(author_id=author_id)
+    last_id = 0
+    for subscription_id, user_id in followers.order_by('id').values_list(
+            'id', 'user_id'):
+        _fill_timeline(user_id, author_id)
+        last_id = subscription_id
+    CelebrityAuthor.objects.filter(author_id=author_id).delete()
+    for user_id in followers.filter(id__gt=last_id).values_list(
+            'user_id', flat=True):
+        _fill_timeline(user_id, author_id)
+    for recipe in Recipe.objects.filter(author_id=author_id,
+                                        pub_date__gte=started):
+        fan_out_recipe(recipe)
+
+
+def _resume_in_background(author_id):
+    try:
+        resume_fanout(author_id)
+    finally:
+        # Соединения фонового потока сами не закрываются.
+        connections.close_all()
+
+
+def update_author_mode(author_id, background=True):
+    """Переключает автора между записью и чтением ленты по числу
+    подписчиков: в чтение - при числе больше ``FEED_FANOUT_LIMIT``,
+    обратно - при числе не больше ``FEED_FANOUT_RESUME_LIMIT``.
+    Дозаполнение лент при возврате идёт после коммита в фоновом потоке,
+    а при ``background=False`` - сразу."""
+    if not CelebrityAuthor.objects.filter(author_id=author_id).exists():
+        if _has_more_followers(author_id, FEED_FANOUT_LIMIT):
+            CelebrityAuthor.objects.get_or_create(author_id=author_id)
+    elif not _has_more_followers(author_id, FEED_FANOUT_RESUME_LIMIT):
+        if not background:
+            resume_fanout(author_id)
+            return
+        transaction.on_commit(
+            lambda: backfills.submit(_resume_in_background, author_id))
+
+
+def fan_out_recipe(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    if CelebrityAuthor.objects.filter(author_id=recipe.author_id).exists():
+        return
+    followers = Subscription.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create([
+        FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                  author_id=recipe.author_id, pub_date=recipe.pub_date)
+        for user_id in followers
+    ], ignore_conflicts=True)
+
+
+def subscribe_timeline(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    update_author_mode(author_id)
+    if not CelebrityAuthor.objects.filter(author_id=author_id).exists():
+        _fill_timeline(user_id, author_id)
+
+
+def unsubscribe_timeline(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    update_author_mode(author_id)
+
+
+def rebuild_timeline(user_id):
+    """Пересобирает ленту пользователя по его подпискам."""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Subscription.objects.filter(
+        user_id=user_id
+    ).exclude(
+        author__celebrity__isnull=False
+    ).values_list('author_id', flat=True)
+    for author_id in author_ids:
+        _fill_timeline(user_id, author_id)
+
+
+def get_feed_ids(user):
+    """Возвращает queryset пар (recipe_id, pub_date) ленты пользователя,
+    отсортированный от новых к старым."""
+    timeline = FeedEntry.objects.filter(
+        user=user).order_by().values_list('recipe_id', 'pub_date')
+    pulled = Recipe.objects.filter(
+        author__celebrity__isnull=False,
+        author__authors__user=user,
+    ).order_by().values_list('id', 'pub_date')
+    return timeline.union(pulled).order_by('-pub_date')
+
+
+def get_feed_ids_naive(user):
+    """Та же лента, собранная соединением подписок с рецептами."""
+    return Recipe.objects.filter(
+        author__authors__user=user
+    ).order_by('-pub_date').values_list('id', 'pub_date')
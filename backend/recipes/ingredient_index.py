@@ -0,0 +1,188 @@
+"""Инвертированный индекс «ингредиент -> рецепты» для поиска по продуктам.
+
+Индекс хранится в памяти процесса: для каждого ингредиента - отсортированный
+компактный массив id рецептов, для каждого рецепта - число его ингредиентов.
+Индекс строится при первом обращении и дальше обновляется инкрементально
+событиями шины инвалидации, в том числе от других воркеров. numpy
+импортируется при первом поиске, чтобы не замедлять запуск процессов.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+
+from foodgram.invalidation import bus
+
+from .models import IngredientInRecipe
+
+BUILD_CHUNK_SIZE = 10000
+
+# Ключ ранжирования: недостающие ингредиенты, затем обратное число
+# совпадений, затем обратный id рецепта.
+MAX_COUNT = 2 ** 16 - 1
+MAX_RECIPE_ID = 2 ** 31 - 1
+MATCHED_SHIFT = 31
+MISSING_SHIFT = 47
+# Если совпадений мало относительно числа рецептов, сортировка кандидатов
+# дешевле подсчёта по всему диапазону id.
+SPARSE_RATIO = 16
+
+
+class IngredientIndex:
+    """Индекс рецептов по входящим в них ингредиентам."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = None
+        self._sizes = array('H')
+
+    def _ensure_size(self, recipe_id):
+        if recipe_id >= len(self._sizes):
+            self._sizes.extend([0] * (recipe_id + 1 - len(self._sizes)))
+
+    def _ensure_built(self):
+        if self._postings is None:
+            self.build()
+
+    def build(self):
+        """Строит индекс заново по таблице ``IngredientInRecipe``."""
+        postings = {}
+        sizes = array('H')
+        rows = (IngredientInRecipe.objects
+                .order_by('ingredient_id', 'recipe_id')
+                .values_list('ingredient_id', 'recipe_id')
+                .iterator(chunk_size=BUILD_CHUNK_SIZE))
+        for ingredient_id, recipe_id in rows:
+            postings.setdefault(ingredient_id, array('q')).append(recipe_id)
+            if recipe_id >= len(sizes):
+                sizes.extend([0] * (recipe_id + 1 - len(sizes)))
+            sizes[recipe_id] += 1
+        with self._lock:
+            self._postings = postings
+            self._sizes = sizes
+
+    def reset(self):
+        """Сбрасывает индекс; он будет построен при следующем запросе."""
+        with self._lock:
+            self._postings = None
+            self._sizes = array('H')
+
+    def set_recipe(self, recipe_id, ingredient_ids, previous_ids=()):
+        """Обновляет состав рецепта в индексе."""
+        with self._lock:
+            if self._postings is None:
+                return
+            ingredient_ids = set(ingredient_ids)
+            for ingredient_id in set(previous_ids) - ingredient_ids:
+                recipes = self._postings.get(ingredient_id)
+                if recipes is None:
+                    continue
+                position = bisect_left(recipes, recipe_id)
+                if (position < len(recipes)
+                        and recipes[position] == recipe_id):
+                    del recipes[position]
+            for ingredient_id in ingredient_ids:
+                recipes = self._postings.setdefault(ingredient_id, array('q'))
+                position = bisect_left(recipes, recipe_id)
+                if (position == len(recipes)
+                        or recipes[position] != recipe_id):
+                    recipes.insert(position, recipe_id)
+            self._ensure_size(recipe_id)
+            self._sizes[recipe_id] = len(ingredient_ids)
+
+    def remove_recipe(self, recipe_id):
+        """Помечает рецепт удалённым.
+
+        Сами id остаются в списках ингредиентов до следующей перестройки,
+        но рецепты с нулевым размером не попадают в выдачу.
+        """
+        with self._lock:
+            if recipe_id < len(self._sizes):
+                self._sizes[recipe_id] = 0
+
+    def remove_ingredient(self, ingredient_id):
+        """Исключает удалённый ингредиент из индекса."""
+        with self._lock:
+            if self._postings is None:
+                return
+            for recipe_id in self._postings.pop(ingredient_id, ()):
+                if self._sizes[recipe_id]:
+                    self._sizes[recipe_id] -= 1
+
+    def rank(self, ingredient_ids, max_missing=None):
+        """Ранжирует рецепты по покрытию набора ингредиентов.
+
+        Сначала идут рецепты, для которых есть всё, затем рецепты без
+        одного ингредиента и так далее; при равенстве выше рецепты с большим
+        числом совпадений и более новые.
+        """
+        import numpy as np
+
+        bus.check()
+        with self._lock:
+            self._ensure_built()
+            # Представления numpy над array нельзя держать вне блокировки:
+            # пока они живы, массивы не могут менять размер.
+            postings = [
+                np.frombuffer(self._postings[ingredient_id], dtype=np.int64)
+                for ingredient_id in set(ingredient_ids)
+                if self._postings.get(ingredient_id)
+            ]
+            if not postings:
+                return Ranking(np.empty(0, dtype=np.int64))
+            candidates = np.concatenate(postings)
+            sizes = np.frombuffer(self._sizes, dtype=np.uint16)
+            if len(candidates) * SPARSE_RATIO < len(sizes):
+                recipe_ids, matched = np.unique(candidates,
+                                                return_counts=True)
+            else:
+                matched = np.bincount(candidates, minlength=len(sizes))
+                recipe_ids = np.flatnonzero(matched)
+                matched = matched[recipe_ids]
+            total = sizes[recipe_ids].astype(np.int64)
+            del postings, sizes
+        alive = total > 0
+        recipe_ids, matched = recipe_ids[alive], matched[alive]
+        missing = total[alive] - matched
+        if max_missing is not None:
+            fits = missing <= max_missing
+            recipe_ids, matched, missing = (
+                recipe_ids[fits], matched[fits], missing[fits])
+        return Ranking((missing << MISSING_SHIFT)
+                       | ((MAX_COUNT - matched) << MATCHED_SHIFT)
+                       | (MAX_RECIPE_ID - recipe_ids))
+
+
+class Ranking:
+    """Отсортированная выдача, упорядочиваемая лениво.
+
+    Каждый рецепт закодирован одним ключом int64, поэтому для страницы
+    достаточно частичной сортировки ``np.partition`` по её концу, а не
+    полной сортировки всех кандидатов.
+    """
+
+    def __init__(self, keys):
+        self._keys = keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError('Ranking поддерживает только срезы.')
+        start, stop, _ = item.indices(len(self._keys))
+        if start >= stop:
+            return []
+        import numpy as np
+
+        keys = self._keys
+        if stop < len(keys):
+            keys = np.partition(keys, stop - 1)[:stop]
+        keys = np.sort(keys)[start:stop]
+        return [
+            (int(MAX_RECIPE_ID - (key & MAX_RECIPE_ID)),
+             int(key >> MISSING_SHIFT))
+            for key in keys
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,175 @@
+"""Сводка использования ингредиентов (``IngredientStats``).
+
+Для ингредиента хранится число рецептов с ним, число попаданий в списки
+покупок (записей корзины с такими рецептами) и динамика - логарифм суммы
+затухающих вкладов рецептов (на дату публикации) и добавлений в корзину,
+как у популярности рецептов (см. ``recipes.trending``).
+
+Сигналы вычисляют изменения сводки в транзакции запроса, а применяют
+их после её коммита отдельной короткой транзакцией: горячие строки
+популярных ингредиентов не остаются заблокированными до конца запроса,
+а откаченные изменения в сводку не попадают. Изменение, которое не
+удалось применить после коммита, только записывается в журнал; команда
+``rollup_ingredient_stats`` пересчитывает сводку целиком и исправляет
+такие расхождения.
+"""
+import math
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField
+from django.db.models.functions import Coalesce, Greatest
+
+from api.constants import (INGREDIENT_POPULARITY_CART_WEIGHT,
+                           INGREDIENT_TREND_CART_WEIGHT,
+                           INGREDIENT_TREND_RECIPE_WEIGHT,
+                           TRENDING_EMPTY_SCORE)
+
+from .models import (Ingredient, IngredientInRecipe, IngredientStats,
+                     Recipe, ShoppingCart)
+from .trending import logsumexp, score_added, score_removed, weighted_score
+
+BATCH_SIZE = 1000
+
+
+def popularity(prefix='stats__'):
+    """Взвешенная популярность для сортировки ингредиентов (``prefix`` -
+    путь к сводке, пустой для запросов к самой ``IngredientStats``)."""
+    return ExpressionWrapper(
+        Coalesce(F(f'{prefix}recipes_count'), 0)
+        + Coalesce(F(f'{prefix}cart_count'), 0)
+        * INGREDIENT_POPULARITY_CART_WEIGHT,
+        output_field=FloatField())
+
+
+def _ingredient_ids(recipe_id, using):
+    return list(IngredientInRecipe.objects.using(using).filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+
+
+def _apply(ingredient_ids, using, recipes, carts, value, added):
+    stats = IngredientStats.objects.using(using)
+    with transaction.atomic(using=using):
+        if added:
+            # Строки сводки для новых ингредиентов.
+            stats.bulk_create(
+                [IngredientStats(ingredient_id=pk) for pk in ingredient_ids],
+                ignore_conflicts=True)
+        # Блокировки в порядке ключей: параллельные изменения с
+        # пересекающимися ингредиентами не взаимоблокируются.
+        rows = stats.select_for_update().filter(
+            ingredient_id__in=ingredient_ids).order_by('pk')
+        locked = list(rows.values_list('pk', flat=True))
+        if added:
+            changes = dict(
+                recipes_count=F('recipes_count') + recipes,
+                cart_count=F('cart_count') + carts,
+                trend_score=score_added(value, 'trend_score'))
+        else:
+            changes = dict(
+                recipes_count=Greatest(F('recipes_count') - recipes, 0),
+                cart_count=Greatest(F('cart_count') - carts, 0),
+                trend_score=score_removed(value, 'trend_score'))
+        stats.filter(pk__in=locked).update(**changes)
+
+
+def _schedule(ingredient_ids, using, recipes, carts, value, added=True):
+    """Применяет изменение сводки после коммита текущей транзакции."""
+    if not ingredient_ids:
+        return
+    ingredient_ids = sorted(ingredient_ids)
+    transaction.on_commit(
+        lambda: _apply(ingredient_ids, using, recipes, carts, value, added),
+        using=using, robust=True)
+
+
+def record_recipe_ingredients(recipe_id, added, removed, using):
+    """Ингредиенты ``added`` появились в рецепте, ``removed`` - исчезли:
+    вместе с рецептом меняются и попадания в корзины с ним."""
+    if not (added or removed):
+        return
+    pub_date = Recipe.objects.using(using).filter(
+        pk=recipe_id).values_list('pub_date', flat=True).first()
+    if pub_date is None:
+        return
+    values = [weighted_score(INGREDIENT_TREND_RECIPE_WEIGHT, pub_date)] + [
+        weighted_score(INGREDIENT_TREND_CART_WEIGHT, added_at)
+        for added_at in ShoppingCart.objects.using(using).filter(
+            recipe_id=recipe_id).values_list('added_at', flat=True)
+    ]
+    value, carts = logsumexp(values), len(values) - 1
+    _schedule(added, using, 1, carts, value)
+    _schedule(removed, using, 1, carts, value, added=False)
+
+
+# Рецепты, которые удаляются в текущем потоке: их корзины уже учтены.
+_deleting = threading.local()
+
+
+def record_recipe_deleting(recipe, using):
+    """Вызывается до удаления рецепта, пока его состав ещё в базе:
+    убирает вклад рецепта и корзин с ним. Удаление этих корзин каскадом
+    затем не учитывается повторно."""
+    _deleting.__dict__.setdefault('ids', set()).add(recipe.pk)
+    record_recipe_ingredients(recipe.pk, (),
+                              _ingredient_ids(recipe.pk, using), using)
+
+
+def record_recipe_deleted(recipe):
+    _deleting.__dict__.get('ids', set()).discard(recipe.pk)
+
+
+def record_cart(cart, using, added=True):
+    """Рецепт добавлен в корзину или убран из неё."""
+    if not added and cart.recipe_id in _deleting.__dict__.get('ids', ()):
+        return
+    _schedule(_ingredient_ids(cart.recipe_id, using), using, 0, 1,
+              weighted_score(INGREDIENT_TREND_CART_WEIGHT, cart.added_at),
+              added)
+
+
+def _logaddexp(total, value):
+    if total is None:
+        return value
+    top = max(total, value)
+    return top + math.log(math.exp(total - top) + math.exp(value - top))
+
+
+def rollup(using=None):
+    """Полный пересчёт: ``{ingredient_id: (рецептов, корзин, динамика)}``
+    для всех ингредиентов."""
+    recipes, carts = defaultdict(int), defaultdict(int)
+    trend = defaultdict(lambda: None)
+    links = IngredientInRecipe.objects.using(using)
+    for ingredient_id, pub_date in links.values_list(
+            'ingredient_id', 'recipe__pub_date').iterator():
+        recipes[ingredient_id] += 1
+        trend[ingredient_id] = _logaddexp(trend[ingredient_id], weighted_score(
+            INGREDIENT_TREND_RECIPE_WEIGHT, pub_date))
+    for ingredient_id, added_at in links.filter(
+        recipe__in_shopping_carts__isnull=False
+    ).values_list('ingredient_id',
+                  'recipe__in_shopping_carts__added_at').iterator():
+        carts[ingredient_id] += 1
+        trend[ingredient_id] = _logaddexp(trend[ingredient_id], weighted_score(
+            INGREDIENT_TREND_CART_WEIGHT, added_at))
+    return {
+        pk: (recipes[pk], carts[pk],
+             TRENDING_EMPTY_SCORE if trend[pk] is None else trend[pk])
+        for pk in Ingredient.objects.using(using).values_list(
+            'pk', flat=True).iterator()
+    }
+
+
+def store(stats, using=None):
+    """Записывает сводку из ``rollup`` пачками."""
+    rows = [
+        IngredientStats(ingredient_id=pk, recipes_count=recipes_count,
+                        cart_count=cart_count, trend_score=trend_score)
+        for pk, (recipes_count, cart_count, trend_score) in stats.items()
+    ]
+    IngredientStats.objects.using(using).bulk_create(
+        rows, batch_size=BATCH_SIZE, update_conflicts=True,
+        unique_fields=['ingredient'],
+        update_fields=['recipes_count', 'cart_count', 'trend_score'])
@@ -0,0 +1,118 @@
+import json
+import statistics
+from collections import Counter, defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    return values[round(share * (len(values) - 1))]
+
+
+class Command(BaseCommand):
+    help = ('Сводка сохранённых профилей запросов по представлениям: '
+            'время, SQL, самые затратные функции и запросы; объединённые '
+            'свёрнутые стеки для flame graph')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help='Каталог профилей; по умолчанию '
+                                 'PROFILE_DIR.')
+        parser.add_argument('--view', action='append',
+                            help='Только эти представления, например '
+                                 'RecipeViewSet.list. Можно указать '
+                                 'несколько.')
+        parser.add_argument('--since', type=float,
+                            help='Только профили за последние часы.')
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--output',
+                            help='Каталог для объединённых стеков '
+                                 '<представление>.folded.')
+        parser.add_argument('--prune', type=float,
+                            help='Удалить профили старше стольких дней.')
+
+    def _load(self, directory, views, since, prune):
+        profiles = defaultdict(list)
+        for path in sorted(directory.glob('*.json')):
+            try:
+                profile = json.loads(path.read_text())
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{path.name}: {error}')
+                continue
+            started_at = parse_datetime(profile['started_at'])
+            if prune is not None and started_at < prune:
+                path.unlink()
+                continue
+            if since is not None and started_at < since:
+                continue
+            if views and profile['view'] not in views:
+                continue
+            profiles[profile['view']].append(profile)
+        return profiles
+
+    def _report(self, view, profiles, top):
+        stacks = Counter()
+        own = Counter()
+        queries = defaultdict(lambda: [0, 0.0])
+        for profile in profiles:
+            for line in profile['folded'].splitlines():
+                stack, count = line.rsplit(' ', 1)
+                stacks[stack] += int(count)
+                own[stack.rsplit(';', 1)[-1]] += int(count)
+            for query in profile['queries']:
+                queries[query['sql']][0] += 1
+                queries[query['sql']][1] += query['duration_ms']
+        durations = [profile['duration_ms'] for profile in profiles]
+        staff = sum(profile['trigger'] == 'staff' for profile in profiles)
+        sql_count = sum(len(profile['queries']) for profile in profiles)
+        sql_time = sum(query[1] for query in queries.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{view}: профилей {len(profiles)} (по запросу {staff}), '
+            f'время медиана {statistics.median(durations):.1f} мс, '
+            f'p95 {_percentile(durations, 0.95):.1f} мс; '
+            f'SQL {sql_count / len(profiles):.1f} запроса, '
+            f'{sql_time / len(profiles):.1f} мс на запрос'))
+        samples = sum(own.values())
+        if samples:
+            self.stdout.write('  Собственное время функций:')
+            for name, count in own.most_common(top):
+                self.stdout.write(f'    {count / samples:6.1%}  {name}')
+        if queries:
+            self.stdout.write('  SQL по суммарному времени:')
+            for sql, (count, total) in sorted(
+                    queries.items(), key=lambda item: -item[1][1])[:top]:
+                self.stdout.write(f'    {total:9.1f} мс  x{count:<4} '
+                                  f'{sql[:160]}')
+        return stacks
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'] or settings.PROFILE_DIR)
+        if not directory.is_dir():
+            raise CommandError(f'Каталог профилей {directory} не найден.')
+        now = timezone.now()
+        since = prune = None
+        if options['since'] is not None:
+            since = now - timedelta(hours=options['since'])
+        if options['prune'] is not None:
+            prune = now - timedelta(days=options['prune'])
+        profiles = self._load(directory, options['view'], since, prune)
+        if not profiles:
+            self.stdout.write('Профилей нет.')
+            return
+        output = options['output'] and Path(options['output'])
+        if output:
+            output.mkdir(parents=True, exist_ok=True)
+        for view in sorted(profiles):
+            stacks = self._report(view, profiles[view], options['top'])
+            if output:
+                (output / f'{view}.folded').write_text(''.join(
+                    f'{stack} {count}\n'
+                    for stack, count in sorted(stacks.items())))
+        if output:
+            self.stdout.write(f'Объединённые стеки записаны в {output}.')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.short_links import generate_short_code
+
+
+class Command(BaseCommand):
+    help = 'Присвоение кодов коротких ссылок рецептам, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            recipes = list(Recipe.objects
+                           .filter(short_code__isnull=True)
+                           .only('id')
+                           .order_by('id')[:options['batch_size']])
+            if not recipes:
+                break
+            codes = set()
+            for recipe in recipes:
+                code = generate_short_code()
+                while code in codes:
+                    code = generate_short_code()
+                codes.add(code)
+                recipe.short_code = code
+            # bulk_update не вызывает сигналы сохранения рецепта.
+            Recipe.objects.bulk_update(recipes, ['short_code'])
+            total += len(recipes)
+        self.stdout.write(f'Присвоено кодов: {total}')
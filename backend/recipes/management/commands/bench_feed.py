@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from api.constants import PAGE_SIZE
+from recipes.feed import get_feed_ids, get_feed_ids_naive
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Сравнение ленты на готовых записях (fan-out-on-write) '
+            'с лентой через соединение подписок и рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20,
+                            help='Число пользователей с наибольшим '
+                                 'количеством подписок.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Повторов на пользователя (не меньше 2).')
+        parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+
+    def _measure(self, build, users, repeat, page_size):
+        timings = []
+        for user in users:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                queryset = build(user)
+                queryset.count()
+                list(queryset[:page_size])
+                timings.append((time.perf_counter() - started) * 1000)
+        return (statistics.mean(timings),
+                statistics.quantiles(timings, n=20)[-1])
+
+    def handle(self, *args, **options):
+        users = list(
+            CustomUser.objects
+            .annotate(following=Count('subscribers'))
+            .filter(following__gt=0)
+            .order_by('-following')[:options['users']]
+        )
+        if not users:
+            self.stdout.write('Нет пользователей с подписками.')
+            return
+        for title, build in (('fan-out-on-write', get_feed_ids),
+                             ('join on read', get_feed_ids_naive)):
+            mean, p95 = self._measure(build, users, options['repeat'],
+                                      options['page_size'])
+            self.stdout.write(
+                f'{title:>18}: среднее {mean:.2f} мс, p95 {p95:.2f} мс')
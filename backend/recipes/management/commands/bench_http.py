@@ -0,0 +1,63 @@
+import statistics
+import threading
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер эндпоинта: пропускная способность и '
+            'задержки. Для сравнения WSGI и ASGI запустите его против '
+            'обоих серверов с одинаковым числом воркеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--token', help='Токен авторизации.')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        remaining = iter(range(options['requests']))
+        lock = threading.Lock()
+        timings, errors = [], []
+
+        def worker():
+            session = requests.Session()
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                started = time.perf_counter()
+                try:
+                    response = session.get(options['url'], headers=headers)
+                    failed = response.status_code >= 500
+                except requests.RequestException:
+                    failed = True
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    (errors if failed else timings).append(elapsed)
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = time.perf_counter() - started
+
+        if len(timings) < 2:
+            self.stdout.write(self.style.ERROR(
+                f'Успешных запросов: {len(timings)}, ошибок: {len(errors)}.'))
+            return
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'Запросов: {len(timings) + len(errors)}, '
+            f'ошибок: {len(errors)}, за {total:.2f} с\n'
+            f'RPS: {(len(timings) + len(errors)) / total:.1f}\n'
+            f'p50: {percentiles[49]:.1f} мс, p95: {percentiles[94]:.1f} мс, '
+            f'p99: {percentiles[98]:.1f} мс, max: {max(timings):.1f} мс')
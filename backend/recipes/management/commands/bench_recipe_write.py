@@ -0,0 +1,105 @@
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from rest_framework.test import APIClient
+
+from foodgram.query_audit import QueryRecorder
+from recipes.models import Ingredient
+from users.models import CustomUser
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+         'FcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+class Command(BaseCommand):
+    help = ('Замер создания и обновления рецептов с большим составом на '
+            'временной тестовой базе: время запроса и число SQL-запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[10, 30, 100],
+                            help='Число ингредиентов в рецепте.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _payload(self, ingredient_ids, amount=1, changed=None):
+        return {
+            'name': 'Рецепт', 'text': 'описание', 'cooking_time': 10,
+            'image': IMAGE,
+            'ingredients': [
+                {'id': ingredient_id,
+                 'amount': amount + (ingredient_id == changed)}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+
+    def _measure(self, request):
+        timings, queries = [], 0
+        for _ in range(self._repeat):
+            with QueryRecorder() as recorder:
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code not in (200, 201):
+                raise CommandError(f'Ответ {response.status_code}: '
+                                   f'{response.content!r}')
+            queries = len(recorder)
+        return statistics.mean(timings), queries
+
+    def _bench(self, client, ingredient_ids, size):
+        used, spare = ingredient_ids[:size], ingredient_ids[size:2 * size]
+        recipe_id = client.post('/api/recipes/', self._payload(used),
+                                format='json').json()['id']
+        url = f'/api/recipes/{recipe_id}/'
+        # Замена одного ингредиента чередуется, чтобы каждый повтор
+        # действительно менял состав.
+        swaps = iter(range(10 ** 9))
+        for title, request in (
+            ('создание', lambda: client.post(
+                '/api/recipes/', self._payload(used), format='json')),
+            ('одно количество', lambda: client.patch(
+                url, self._payload(used, changed=used[next(swaps) % size]),
+                format='json')),
+            ('один ингредиент', lambda: client.patch(
+                url, self._payload(
+                    used[:-1] + [spare[next(swaps) % len(spare)]]),
+                format='json')),
+            ('без изменений', lambda: client.patch(
+                url, self._payload(used), format='json')),
+        ):
+            mean, queries = self._measure(request)
+            self.stdout.write(f'{size:>5} {title:>16}: {mean:8.2f} мс, '
+                              f'запросов {queries}')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        self._repeat = options['repeat']
+        setup_test_environment()
+        old_config = setup_databases(verbosity, interactive=False,
+                                     aliases={'default'})
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(ALLOWED_HOSTS=['*'],
+                                      DATABASE_REPLICAS=[],
+                                      MEDIA_ROOT=media_root):
+                author = CustomUser.objects.create_user(
+                    username='author', email='author@example.com',
+                    password='bench-recipe-write')
+                ingredient_ids = [
+                    ingredient.id
+                    for ingredient in Ingredient.objects.bulk_create(
+                        Ingredient(name=f'ингредиент {number}',
+                                   measurement_unit='г')
+                        for number in range(2 * max(options['sizes'])))
+                ]
+                client = APIClient()
+                client.force_authenticate(author)
+                for size in options['sizes']:
+                    self._bench(client, ingredient_ids, size)
+        finally:
+            teardown_databases(old_config, verbosity)
+            teardown_test_environment()
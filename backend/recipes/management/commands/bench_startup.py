@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ('foodgram.settings', 'foodgram.settings_api')
+COLUMNS = ('import_ms', 'ready_ms', 'request_ms', 'rss', 'private')
+
+
+class Command(BaseCommand):
+    help = ('Замер запуска воркера для профилей настроек без preload и с '
+            'ним: импорт приложения, готовность воркера, первый запрос, '
+            'RSS и собственная память воркера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipes/',
+                            help='Адрес первого запроса.')
+        parser.add_argument('--profile', action='append',
+                            help='Модуль настроек; по умолчанию '
+                                 f'{" и ".join(PROFILES)}. Можно указать '
+                                 'несколько.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Запусков на вариант, берётся медиана.')
+
+    def _probe(self, profile, path, preload):
+        env = dict(
+            os.environ, DJANGO_SETTINGS_MODULE=profile,
+            PYTHONPATH=os.pathsep.join(filter(None, (
+                str(settings.BASE_DIR), os.environ.get('PYTHONPATH')))))
+        command = [sys.executable, '-m', 'foodgram.startup_probe', path]
+        if preload:
+            command.append('--preload')
+        result = subprocess.run(command, env=env, cwd=settings.BASE_DIR,
+                                capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f'{profile}: {result.stderr.strip()}')
+        probe = json.loads(result.stdout)
+        if not probe['status'].startswith('2'):
+            raise CommandError(f'{profile} {path}: {probe["status"]}')
+        return probe
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"профиль":<28} {"preload":>7} {"импорт":>8} '
+            f'{"готов":>8} {"запрос":>8} {"RSS":>8} {"своя":>8}')
+        for profile in options['profile'] or PROFILES:
+            for preload in (False, True):
+                probes = [self._probe(profile, options['path'], preload)
+                          for _ in range(options['repeat'])]
+                row = {column: median(probe[column] for probe in probes)
+                       for column in COLUMNS}
+                self.stdout.write(
+                    f'{profile:<28} {"да" if preload else "нет":>7} '
+                    f'{row["import_ms"]:6.0f}мс {row["ready_ms"]:6.0f}мс '
+                    f'{row["request_ms"]:6.0f}мс '
+                    f'{row["rss"] / 1024:5.1f}МБ '
+                    f'{row["private"] / 1024:5.1f}МБ')
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+
+from api.throttling import TokenBucketThrottle, get_store
+
+SCOPE = 'bench'
+
+
+class View:
+    """Минимальное представление: ограничитель читает только действие и
+    карту областей."""
+
+    action = 'list'
+    throttle_scopes = {'list': SCOPE}
+
+
+class Command(BaseCommand):
+    help = ('Замер накладных расходов ограничителя частоты: время '
+            'allow_request на пропущенный и отклонённый запрос')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=100000)
+        parser.add_argument('--store', action='append',
+                            help='Путь к хранилищу вёдер; по умолчанию '
+                                 'THROTTLE_STORE. Можно указать несколько.')
+
+    def _bench(self, request, rate, repeat):
+        rates = dict(api_settings.DEFAULT_THROTTLE_RATES, **{SCOPE: rate})
+        with override_settings(REST_FRAMEWORK=dict(
+                settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates)):
+            throttle, view = TokenBucketThrottle(), View()
+            started = time.perf_counter()
+            for _ in range(repeat):
+                # Решение кешируется на запросе, поэтому сбрасываем его.
+                request.throttle_decision = None
+                throttle.allow_request(request, view)
+            elapsed = time.perf_counter() - started
+        return elapsed / repeat * 10 ** 6, throttle.decision.allowed
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        request = APIRequestFactory().get('/api/ingredients/',
+                                          REMOTE_ADDR='10.0.0.1')
+        for store in options['store'] or [settings.THROTTLE_STORE]:
+            with override_settings(THROTTLE_STORE=store):
+                try:
+                    get_store().consume([f'{SCOPE}:check'], 1, 1)
+                except Exception as error:
+                    raise CommandError(f'{store}: {error}')
+                for title, rate, expected in (
+                    ('пропущен', f'{10 * repeat}/s', True),
+                    ('отклонён', '1/d', False),
+                ):
+                    micros, allowed = self._bench(request, rate, repeat)
+                    if allowed is not expected:
+                        raise CommandError(
+                            f'{store}: ожидалось allowed={expected}')
+                    self.stdout.write(f'{store} {title:>9}: '
+                                      f'{micros:7.2f} мкс на запрос')
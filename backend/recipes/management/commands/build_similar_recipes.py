@@ -0,0 +1,106 @@
+from collections import defaultdict
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import (IngredientInRecipe,
+                            RecipeBucket,
+                            RecipeSignature,
+                            SimilarRecipe)
+from recipes.similarity import (MAX_CANDIDATES,
+                                band_buckets,
+                                minhash_many,
+                                top_neighbours)
+
+
+class Command(BaseCommand):
+    help = 'Расчёт похожих рецептов по MinHash/LSH сигнатурам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Число рецептов в одной пачке.')
+
+    def _load(self, chunk_size):
+        """Считает сигнатуры всех рецептов пачками."""
+        rows = (IngredientInRecipe.objects
+                .order_by('recipe_id')
+                .values_list('recipe_id', 'ingredient_id')
+                .iterator(chunk_size=chunk_size * 10))
+        recipe_ids, signatures = [], []
+        batch_recipes, batch_ingredients, starts = [], [], []
+
+        def flush():
+            if batch_recipes:
+                recipe_ids.extend(batch_recipes)
+                signatures.append(minhash_many(batch_ingredients, starts))
+                batch_recipes.clear()
+                batch_ingredients.clear()
+                starts.clear()
+
+        for recipe_id, ingredient_id in rows:
+            if not batch_recipes or batch_recipes[-1] != recipe_id:
+                if len(batch_recipes) >= chunk_size:
+                    flush()
+                batch_recipes.append(recipe_id)
+                starts.append(len(batch_ingredients))
+            batch_ingredients.append(ingredient_id)
+        flush()
+        if not recipe_ids:
+            return np.empty(0, dtype=np.int64), None
+        return np.array(recipe_ids, dtype=np.int64), np.vstack(signatures)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        recipe_ids, signatures = self._load(chunk_size)
+        if not len(recipe_ids):
+            self.stdout.write('Нет рецептов с ингредиентами.')
+            return
+        buckets = band_buckets(signatures)
+
+        members = defaultdict(list)
+        for position, row in enumerate(buckets.tolist()):
+            for band, bucket in enumerate(row):
+                members[band, bucket].append(position)
+
+        with transaction.atomic():
+            RecipeSignature.objects.all().delete()
+            RecipeBucket.objects.all().delete()
+            SimilarRecipe.objects.all().delete()
+            for start in range(0, len(recipe_ids), chunk_size):
+                stop = start + chunk_size
+                RecipeSignature.objects.bulk_create([
+                    RecipeSignature(recipe_id=int(recipe_id),
+                                    minhash=signature.tobytes())
+                    for recipe_id, signature in zip(
+                        recipe_ids[start:stop], signatures[start:stop])
+                ])
+                RecipeBucket.objects.bulk_create([
+                    RecipeBucket(recipe_id=int(recipe_id), band=band,
+                                 bucket=bucket)
+                    for recipe_id, row in zip(recipe_ids[start:stop],
+                                              buckets[start:stop].tolist())
+                    for band, bucket in enumerate(row)
+                ])
+
+            similar = []
+            for position, recipe_id in enumerate(recipe_ids.tolist()):
+                candidates = set()
+                for band, bucket in enumerate(buckets[position].tolist()):
+                    candidates.update(members[band, bucket][:MAX_CANDIDATES])
+                candidates.discard(position)
+                candidates = np.fromiter(candidates, dtype=np.int64)
+                similar.extend(
+                    SimilarRecipe(recipe_id=recipe_id, similar_id=other,
+                                  score=score)
+                    for other, score in top_neighbours(
+                        recipe_id, signatures[position],
+                        recipe_ids[candidates], signatures[candidates])
+                )
+                if len(similar) >= chunk_size:
+                    SimilarRecipe.objects.bulk_create(similar)
+                    similar.clear()
+            SimilarRecipe.objects.bulk_create(similar)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Рассчитаны похожие рецепты для {len(recipe_ids)} рецептов.'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.constants import TRENDING_EMPTY_SCORE
+from recipes.models import Recipe
+from recipes.trending import decayed, recompute_scores
+
+
+class Command(BaseCommand):
+    help = ('Сверка инкрементальной популярности рецептов с полным '
+            'пересчётом')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tolerance', type=float, default=1e-6,
+                            help='Допустимое относительное расхождение.')
+        parser.add_argument('--fix', action='store_true',
+                            help='Записать пересчитанные значения.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expected = recompute_scores()
+        mismatched = []
+        recipes = Recipe.objects.only('id', 'trending_score').iterator()
+        for recipe in recipes:
+            score = expected.get(recipe.id, TRENDING_EMPTY_SCORE)
+            stored, actual = decayed(recipe.trending_score, now), decayed(
+                score, now)
+            if abs(stored - actual) > options['tolerance'] * max(actual, 1):
+                recipe.trending_score = score
+                mismatched.append(recipe)
+                self.stdout.write(
+                    f'Рецепт {recipe.id}: {stored:.6g} вместо {actual:.6g}')
+
+        if mismatched and options['fix']:
+            with transaction.atomic():
+                Recipe.objects.bulk_update(mismatched, ['trending_score'],
+                                           batch_size=1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено рецептов: {len(mismatched)}.'))
+        elif mismatched:
+            raise CommandError(f'Расхождений: {len(mismatched)}.')
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.constants import DUMP_CHUNK_SIZE
+from recipes.backup import dump, open_dump, rate
+
+
+class Command(BaseCommand):
+    help = ('Потоковая выгрузка пользователей, ингредиентов, рецептов, '
+            'избранного, корзин и подписок в JSON Lines '
+            '(.gz, .bz2, .xz - со сжатием)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки.')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--chunk-size', type=int,
+                            default=DUMP_CHUNK_SIZE,
+                            help='Строк на одно чтение курсором.')
+
+    def handle(self, *args, **options):
+        started, total = time.perf_counter(), 0
+        with open_dump(options['path'], 'wb') as stream:
+            for label, count, seconds in dump(stream, options['database'],
+                                              options['chunk_size']):
+                total += count
+                self.stdout.write(f'{label}: {count} строк, '
+                                  f'{rate(count, seconds)}')
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(options['path']) / 2 ** 20
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено строк: {total} за {elapsed:.1f} с '
+            f'({rate(total, elapsed)}), файл {size:.1f} МБ.'))
@@ -3,6 +3,7 @@ import os
 from django.core.management.base import BaseCommand
 from django.core.files.images import ImageFile
 from recipes.models import Recipe, Ingredient, IngredientInRecipe
+from recipes.signals import ingredients_changed
 from users.models import CustomUser
 
 
@@ -38,6 +39,7 @@ class Command(BaseCommand):
                     recipe.image.save(os.path.basename(image_path),
                                       ImageFile(img_file), save=True)
 
+            ingredient_ids = set()
             for ingredient_info in recipe_data['ingredients']:
                 ingredient = Ingredient.objects.filter(
                     name=ingredient_info['name']).first()
@@ -47,6 +49,10 @@ class Command(BaseCommand):
                         ingredient=ingredient,
                         amount=ingredient_info['amount']
                     )
+                    ingredient_ids.add(ingredient.id)
+            ingredients_changed.send(sender=Recipe,
+                                     recipe_id=recipe.id,
+                                     ingredient_ids=ingredient_ids)
             self.stdout.write(self.style.SUCCESS(
                 f'Создан рецепт: {recipe.name}')
             )
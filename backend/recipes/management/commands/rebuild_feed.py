@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild_timeline, update_author_mode
+from users.models import CustomUser, Subscription
+
+
+class Command(BaseCommand):
+    help = 'Пересборка лент подписок пользователей'
+
+    def handle(self, *args, **options):
+        author_ids = Subscription.objects.values_list(
+            'author_id', flat=True).distinct()
+        for author_id in author_ids:
+            update_author_mode(author_id, background=False)
+
+        user_ids = CustomUser.objects.filter(
+            subscribers__isnull=False).values_list('id', flat=True).distinct()
+        count = 0
+        for user_id in user_ids.iterator():
+            rebuild_timeline(user_id)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано лент: {count}.'))
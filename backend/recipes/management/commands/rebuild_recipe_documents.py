@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from api.constants import RECIPE_DOCUMENT_BATCH_SIZE, RECIPE_DOCUMENT_VERSION
+from recipes.documents import build_document, live_queryset, refresh_documents
+from recipes.models import Recipe, RecipeDocument
+
+
+class Command(BaseCommand):
+    help = 'Пересборка готовых карточек рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true',
+                            help='Только отсутствующие карточки и '
+                                 'карточки старой версии.')
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверить карточки с таблицами, не '
+                                 'записывая; при расхождениях завершиться '
+                                 'с ошибкой.')
+
+    def _problem(self, recipe, stored):
+        """Чем карточка отличается от собранной заново или ``None``."""
+        if stored is None:
+            return 'нет карточки'
+        if stored.version != RECIPE_DOCUMENT_VERSION:
+            return f'версия {stored.version}'
+        fresh = build_document(recipe)
+        if stored.document == fresh:
+            return None
+        if not isinstance(stored.document, dict):
+            return 'карточка повреждена'
+        fields = sorted(name for name in fresh.keys() | stored.document.keys()
+                        if fresh.get(name) != stored.document.get(name))
+        return 'поля ' + ', '.join(fields)
+
+    def _check(self):
+        mismatched = 0
+        last_id = 0
+        while True:
+            recipes = list(live_queryset().filter(id__gt=last_id).order_by(
+                'id')[:RECIPE_DOCUMENT_BATCH_SIZE])
+            if not recipes:
+                break
+            last_id = recipes[-1].id
+            documents = RecipeDocument.objects.in_bulk(
+                [recipe.id for recipe in recipes])
+            for recipe in recipes:
+                problem = self._problem(recipe, documents.get(recipe.id))
+                if problem:
+                    mismatched += 1
+                    self.stdout.write(f'Рецепт {recipe.id}: {problem}')
+        if mismatched:
+            raise CommandError(f'Расхождений: {mismatched}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self._check()
+        recipes = Recipe.objects.all()
+        if options['missing']:
+            recipes = recipes.filter(
+                Q(document__isnull=True)
+                | ~Q(document__version=RECIPE_DOCUMENT_VERSION))
+        count = refresh_documents(recipes.values_list('id', flat=True))
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано карточек: {count}.'))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from api.constants import RESTORE_BATCH_SIZE
+from foodgram.invalidation import RESET, bus
+from recipes.backup import Restore, open_dump, rate
+
+
+class Command(BaseCommand):
+    help = ('Загрузка выгрузки dump_content одной транзакцией: объекты '
+            'получают новые id, существующие пользователи и ингредиенты '
+            'не дублируются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки.')
+        parser.add_argument('--batch-size', type=int,
+                            default=RESTORE_BATCH_SIZE,
+                            help='Объектов на одну вставку.')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Не пересобирать карточки, похожие '
+                                 'рецепты, ленты, короткие ссылки и '
+                                 'статистику ингредиентов.')
+
+    def handle(self, *args, **options):
+        restore = Restore(DEFAULT_DB_ALIAS, options['batch_size'])
+        started, total = time.perf_counter(), 0
+        try:
+            with open_dump(options['path'], 'rb') as stream:
+                for label, count, seconds in restore.run(stream):
+                    total += count
+                    self.stdout.write(f'{label}: {count} строк, '
+                                      f'{rate(count, seconds)}')
+        except ValueError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {total} за {elapsed:.1f} с '
+            f'({rate(total, elapsed)}), новых рецептов: '
+            f'{len(restore.recipe_ids)}.'))
+        # Вставки пачками не отправляют сигналов моделей: кэши воркеров
+        # сбрасываются целиком, производные данные пересобираются.
+        bus.publish(RESET, None)
+        if not options['skip_derived']:
+            call_command('rebuild_recipe_documents', '--missing',
+                         stdout=self.stdout)
+            call_command('backfill_short_codes', stdout=self.stdout)
+            call_command('build_similar_recipes', stdout=self.stdout)
+            call_command('rebuild_feed', stdout=self.stdout)
+            call_command('rollup_ingredient_stats', stdout=self.stdout)
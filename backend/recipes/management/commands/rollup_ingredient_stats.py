@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.constants import TRENDING_EMPTY_SCORE
+from recipes.ingredient_stats import rollup, store
+from recipes.models import IngredientStats
+from recipes.trending import decayed
+
+
+class Command(BaseCommand):
+    help = ('Полный пересчёт сводки использования ингредиентов: число '
+            'рецептов, попаданий в списки покупок и динамика')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tolerance', type=float, default=1e-6,
+                            help='Допустимое относительное расхождение '
+                                 'динамики.')
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверить со сводкой, не записывая.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expected = rollup()
+        stored = {
+            stats.pk: (stats.recipes_count, stats.cart_count,
+                       stats.trend_score)
+            for stats in IngredientStats.objects.iterator()
+        }
+        mismatched = 0
+        for pk, (recipes, carts, trend) in expected.items():
+            stored_recipes, stored_carts, stored_trend = stored.get(
+                pk, (0, 0, TRENDING_EMPTY_SCORE))
+            actual, kept = decayed(trend, now), decayed(stored_trend, now)
+            if ((recipes, carts) != (stored_recipes, stored_carts)
+                    or abs(kept - actual)
+                    > options['tolerance'] * max(actual, 1)):
+                mismatched += 1
+                self.stdout.write(
+                    f'Ингредиент {pk}: {stored_recipes}/{stored_carts}/'
+                    f'{kept:.6g} вместо {recipes}/{carts}/{actual:.6g}')
+        self.stdout.write(f'Расхождений: {mismatched} из {len(expected)}.')
+        if not options['check']:
+            with transaction.atomic():
+                store(expected)
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитано ингредиентов: {len(expected)}.'))
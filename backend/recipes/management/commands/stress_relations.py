@@ -0,0 +1,94 @@
+import threading
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from rest_framework.test import APIClient
+
+from recipes.models import Favorites, Recipe, ShoppingCart
+from users.models import CustomUser, Subscription
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочная проверка избранного, корзины и подписок на '
+            'временной тестовой базе: параллельные одинаковые запросы '
+            'дают ровно один успех, остальные — 400, без ошибок 500')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def _race(self, user, method, path, threads):
+        """Выполняет запрос одновременно из ``threads`` потоков."""
+        barrier = threading.Barrier(threads)
+        statuses = []
+
+        def worker():
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                statuses.append(getattr(client, method)(path).status_code)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return Counter(statuses)
+
+    def _check(self, title, user, path, model, lookup, threads, rounds):
+        totals = Counter()
+        failures = []
+        for _ in range(rounds):
+            for method, success in (('post', 201), ('delete', 204)):
+                statuses = self._race(user, method, path, threads)
+                totals.update(statuses)
+                if statuses != Counter({success: 1, 400: threads - 1}):
+                    failures.append(f'{title} {method.upper()}: '
+                                    f'{dict(statuses)}')
+            if model.objects.filter(**lookup).exists():
+                failures.append(f'{title}: связь осталась после удаления')
+        self.stdout.write(f'{title}: ' + ', '.join(
+            f'{status} × {count}' for status, count in sorted(totals.items())))
+        return failures
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        threads, rounds = options['threads'], options['rounds']
+        setup_test_environment()
+        old_config = setup_databases(verbosity, interactive=False,
+                                     aliases={'default'})
+        try:
+            with override_settings(DATABASE_REPLICAS=[]):
+                user, author = (
+                    CustomUser.objects.create_user(
+                        username=name, email=f'{name}@example.com',
+                        password='stress-relations')
+                    for name in ('reader', 'author'))
+                recipe = Recipe.objects.create(
+                    author=author, name='рецепт', text='описание',
+                    cooking_time=10, image='recipes_images/recipe.png')
+                failures = []
+                for title, path, model, lookup in (
+                    ('Избранное', f'/api/recipes/{recipe.id}/favorite/',
+                     Favorites, {'user': user, 'recipe': recipe}),
+                    ('Корзина', f'/api/recipes/{recipe.id}/shopping_cart/',
+                     ShoppingCart, {'user': user, 'recipe': recipe}),
+                    ('Подписка', f'/api/users/{author.id}/subscribe/',
+                     Subscription, {'user': user, 'author': author}),
+                ):
+                    failures += self._check(title, user, path, model,
+                                            lookup, threads, rounds)
+        finally:
+            teardown_databases(old_config, verbosity)
+            teardown_test_environment()
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            'Гонок нет: на каждый раунд ровно один успех.'))
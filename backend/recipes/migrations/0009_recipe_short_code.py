@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='short_code',
+            field=models.CharField(editable=False, max_length=6, null=True, unique=True, verbose_name='Код короткой ссылки'),
+        ),
+    ]
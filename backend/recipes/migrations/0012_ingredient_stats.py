@@ -0,0 +1,28 @@
+# Generated by Django 4.2.21 on 2026-10-18 23:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientStats',
+            fields=[
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Число рецептов')),
+                ('cart_count', models.PositiveIntegerField(default=0, verbose_name='Число попаданий в списки покупок')),
+                ('trend_score', models.FloatField(default=-1000000.0, verbose_name='Динамика (логарифм с затуханием)')),
+            ],
+            options={
+                'verbose_name': 'Статистика ингредиента',
+                'verbose_name_plural': 'Статистика ингредиентов',
+                'indexes': [models.Index(fields=['-recipes_count'], name='ingredient_stats_recipes_idx'), models.Index(fields=['-cart_count'], name='ingredient_stats_cart_idx'), models.Index(fields=['-trend_score'], name='ingredient_stats_trend_idx')],
+            },
+        ),
+    ]
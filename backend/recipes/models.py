@@ -7,7 +7,10 @@ from api.constants import (MIN_COOK_TIME,
                            MAX_NAME_LEN,
                            MEANSUREMENT_UNIT,
                            MIN_AMOUNT,
-                           MAX_AMOUNT)
+                           MAX_AMOUNT,
+                           RECIPE_DOCUMENT_VERSION,
+                           SHORT_CODE_LENGTH,
+                           TRENDING_EMPTY_SCORE)
 
 
 class Ingredient(models.Model):
@@ -63,11 +66,28 @@ class Recipe(models.Model):
     pub_date: models.DateTimeField = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата публикации')
+    updated_at: models.DateTimeField = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения')
+    trending_score: models.FloatField = models.FloatField(
+        default=TRENDING_EMPTY_SCORE,
+        editable=False,
+        verbose_name='Популярность (логарифм с затуханием)')
+    short_code: models.CharField = models.CharField(
+        max_length=SHORT_CODE_LENGTH,
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name='Код короткой ссылки')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date',]
+        indexes = [
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -108,6 +128,78 @@ class IngredientInRecipe(models.Model):
         )
 
 
+class RecipeDocument(models.Model):
+    """Готовая карточка рецепта без данных текущего пользователя.
+
+    Содержит ответ API с автором и составом; флаги пользователя
+    добавляются при чтении (см. ``recipes.documents``).
+    """
+
+    recipe: models.OneToOneField = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='document'
+    )
+    version: models.PositiveSmallIntegerField = (
+        models.PositiveSmallIntegerField(
+            default=RECIPE_DOCUMENT_VERSION,
+            verbose_name='Версия формата'))
+    document: models.JSONField = models.JSONField(verbose_name='Карточка')
+    updated_at: models.DateTimeField = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата сборки')
+
+    class Meta:
+        verbose_name = 'Карточка рецепта'
+        verbose_name_plural = 'Карточки рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class IngredientStats(models.Model):
+    """Сводка использования ингредиента для сортировки и статистики.
+
+    Обновляется сигналами (см. ``recipes.ingredient_stats``) и
+    пересчитывается командой ``rollup_ingredient_stats``.
+    """
+
+    ingredient: models.OneToOneField = models.OneToOneField(
+        Ingredient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Ингредиент',
+        related_name='stats'
+    )
+    recipes_count: models.PositiveIntegerField = (
+        models.PositiveIntegerField(
+            default=0,
+            verbose_name='Число рецептов'))
+    cart_count: models.PositiveIntegerField = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число попаданий в списки покупок')
+    trend_score: models.FloatField = models.FloatField(
+        default=TRENDING_EMPTY_SCORE,
+        verbose_name='Динамика (логарифм с затуханием)')
+
+    class Meta:
+        verbose_name = 'Статистика ингредиента'
+        verbose_name_plural = 'Статистика ингредиентов'
+        indexes = [
+            models.Index(fields=['-recipes_count'],
+                         name='ingredient_stats_recipes_idx'),
+            models.Index(fields=['-cart_count'],
+                         name='ingredient_stats_cart_idx'),
+            models.Index(fields=['-trend_score'],
+                         name='ingredient_stats_trend_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.ingredient_id)
+
+
 class ShoppingCart(models.Model):
     """Модель списка покупок (корзины) для пользователя."""
 
@@ -123,6 +215,9 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         related_name='in_shopping_carts'
     )
+    added_at: models.DateTimeField = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления')
 
     class Meta:
         verbose_name = 'Корзина покупок'
@@ -154,6 +249,9 @@ class Favorites(models.Model):
         verbose_name='Рецепт',
         related_name='in_favorites'
     )
+    added_at: models.DateTimeField = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления')
 
     class Meta:
         verbose_name = 'Избранное'
@@ -168,3 +266,156 @@ class Favorites(models.Model):
 
     def __str__(self):
         return f"Избранное {self.user.username}: {self.recipe.name}"
+
+
+class FeedEntry(models.Model):
+    """Запись в ленте подписок пользователя (fan-out-on-write)."""
+
+    user: models.ForeignKey = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+        related_name='feed_entries'
+    )
+    recipe: models.ForeignKey = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries'
+    )
+    author: models.ForeignKey = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        verbose_name='Автор рецепта',
+        related_name='+'
+    )
+    pub_date: models.DateTimeField = models.DateTimeField(
+        verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'Лента {self.user_id}: {self.recipe_id}'
+
+
+class CelebrityAuthor(models.Model):
+    """Автор, рецепты которого попадают в ленты при чтении (fan-out-on-read).
+
+    Для авторов с большим числом подписчиков запись в ленту каждого
+    подписчика слишком дорога, поэтому их рецепты подмешиваются в ленту
+    при запросе.
+    """
+
+    author: models.OneToOneField = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Автор',
+        related_name='celebrity'
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+    def __str__(self):
+        return str(self.author_id)
+
+
+class RecipeSignature(models.Model):
+    """MinHash-сигнатура набора ингредиентов рецепта."""
+
+    recipe: models.OneToOneField = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='signature'
+    )
+    minhash: models.BinaryField = models.BinaryField(
+        verbose_name='Сигнатура')
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class RecipeBucket(models.Model):
+    """Корзина LSH: рецепты с одинаковой полосой сигнатуры."""
+
+    recipe: models.ForeignKey = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='buckets'
+    )
+    band: models.PositiveSmallIntegerField = models.PositiveSmallIntegerField(
+        verbose_name='Полоса')
+    bucket: models.BigIntegerField = models.BigIntegerField(
+        verbose_name='Хеш полосы')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = [
+            models.Index(fields=['bucket', 'band'],
+                         name='recipe_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band}/{self.bucket}'
+
+
+class SimilarRecipe(models.Model):
+    """Предрассчитанный похожий рецепт."""
+
+    recipe: models.ForeignKey = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='similar_recipes'
+    )
+    similar: models.ForeignKey = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to'
+    )
+    score: models.FloatField = models.FloatField(
+        verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('-score',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.similar_id}: {self.score:.2f}'
@@ -0,0 +1,154 @@
+"""Добавление и удаление связей пользователя: избранное, корзина, подписки.
+
+Каждая операция — один оператор ``INSERT ... ON CONFLICT DO NOTHING`` или
+``DELETE ... RETURNING``. Повторный запрос, в том числе параллельный, не
+падает на уникальном ограничении: о дубликате говорит пустой результат.
+Причину отказа (нет рецепта, свой рецепт, дубликат) выясняет отдельный
+запрос только на этом редком пути.
+
+Такие операторы не вызывают сигналы моделей, поэтому ``post_save`` и
+``post_delete`` отправляются вручную с объектом, собранным из строки
+``RETURNING``.
+"""
+from django.db import connections, router
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from users.models import CustomUser, Subscription
+
+from .models import Recipe
+
+RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time', 'author_id')
+
+
+def _columns(model, *names):
+    return ', '.join(model._meta.get_field(name).column for name in names)
+
+
+def _first(model, sql, params, using):
+    return next(iter(model.objects.raw(sql, params, using=using)), None)
+
+
+def _created(model, instance, using):
+    post_save.send(sender=model, instance=instance, created=True,
+                   update_fields=None, raw=False, using=using)
+
+
+def _deleted(model, instance, using):
+    post_delete.send(sender=model, instance=instance, using=using,
+                     origin=instance)
+
+
+def _insert_recipe_relation(model, user_id, recipe, added_at, using):
+    return _first(
+        model,
+        f'INSERT INTO {model._meta.db_table} '
+        f'({_columns(model, "user", "recipe", "added_at")}) '
+        f'VALUES (%s, %s, %s) ON CONFLICT DO NOTHING '
+        f'RETURNING {_columns(model, "id", "user", "recipe", "added_at")}',
+        (user_id, recipe.id, added_at), using)
+
+
+def _postgresql_add(model, user_id, recipe_id, added_at, exclude_author,
+                    using):
+    """Рецепт и вставленная связь одним запросом через CTE."""
+    recipe_table = Recipe._meta.db_table
+    own = 'WHERE author_id <> %s' if exclude_author else ''
+    params = [recipe_id, user_id, added_at]
+    if exclude_author:
+        params.append(user_id)
+    recipe = _first(
+        Recipe,
+        f'WITH recipe AS ('
+        f'  SELECT {_columns(Recipe, *RECIPE_FIELDS)} FROM {recipe_table}'
+        f'  WHERE id = %s'
+        f'), inserted AS ('
+        f'  INSERT INTO {model._meta.db_table} '
+        f'  ({_columns(model, "user", "recipe", "added_at")})'
+        f'  SELECT %s, id, %s FROM recipe {own}'
+        f'  ON CONFLICT DO NOTHING'
+        f'  RETURNING id, added_at'
+        f') SELECT recipe.*, inserted.id AS relation_id,'
+        f'  inserted.added_at AS relation_added_at'
+        f' FROM recipe LEFT JOIN inserted ON TRUE',
+        params, using)
+    if recipe is None or recipe.relation_id is None:
+        return recipe, None
+    return recipe, model(id=recipe.relation_id, user_id=user_id,
+                         recipe_id=recipe.id,
+                         added_at=recipe.relation_added_at)
+
+
+def add_recipe_relation(model, user, recipe_id, exclude_author=False):
+    """Добавляет рецепт в избранное или корзину (``model``).
+
+    Возвращает пару ``(recipe, relation)``: ``recipe`` — ``None``, если
+    рецепта нет; ``relation`` — ``None``, если связь уже есть или рецепт
+    принадлежит пользователю при ``exclude_author``.
+    """
+    using = router.db_for_write(model)
+    added_at = timezone.now()
+    if connections[using].vendor == 'postgresql':
+        recipe, relation = _postgresql_add(
+            model, user.id, recipe_id, added_at, exclude_author, using)
+    else:
+        recipe = Recipe.objects.using(using).only(*RECIPE_FIELDS).filter(
+            id=recipe_id).first()
+        relation = None
+        if recipe is not None and not (exclude_author
+                                       and recipe.author_id == user.id):
+            relation = _insert_recipe_relation(model, user.id, recipe,
+                                               added_at, using)
+    if relation is not None:
+        _created(model, relation, using)
+    return recipe, relation
+
+
+def remove_recipe_relation(model, user, recipe_id):
+    """Удаляет рецепт из избранного или корзины; возвращает удалённую
+    связь или ``None``, если её не было."""
+    using = router.db_for_write(model)
+    relation = _first(
+        model,
+        f'DELETE FROM {model._meta.db_table} '
+        f'WHERE {_columns(model, "user")} = %s '
+        f'AND {_columns(model, "recipe")} = %s '
+        f'RETURNING {_columns(model, "id", "user", "recipe", "added_at")}',
+        (user.id, recipe_id), using)
+    if relation is not None:
+        _deleted(model, relation, using)
+    return relation
+
+
+def add_subscription(user, author_id):
+    """Подписывает пользователя на автора; возвращает подписку или
+    ``None``, если автора нет, это сам пользователь или подписка уже
+    есть."""
+    using = router.db_for_write(Subscription)
+    subscription = _first(
+        Subscription,
+        f'INSERT INTO {Subscription._meta.db_table} '
+        f'({_columns(Subscription, "user", "author")}) '
+        f'SELECT %s, id FROM {CustomUser._meta.db_table} '
+        f'WHERE id = %s AND id <> %s ON CONFLICT DO NOTHING '
+        f'RETURNING {_columns(Subscription, "id", "user", "author")}',
+        (user.id, author_id, user.id), using)
+    if subscription is not None:
+        _created(Subscription, subscription, using)
+    return subscription
+
+
+def remove_subscription(user, author_id):
+    """Отписывает пользователя от автора; возвращает удалённую подписку
+    или ``None``."""
+    using = router.db_for_write(Subscription)
+    subscription = _first(
+        Subscription,
+        f'DELETE FROM {Subscription._meta.db_table} '
+        f'WHERE {_columns(Subscription, "user")} = %s '
+        f'AND {_columns(Subscription, "author")} = %s '
+        f'RETURNING {_columns(Subscription, "id", "user", "author")}',
+        (user.id, author_id), using)
+    if subscription is not None:
+        _deleted(Subscription, subscription, using)
+    return subscription
@@ -0,0 +1,85 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+Поисковый индекс поддерживается самой базой данных (см. миграцию
+``0004_recipe_search_index``): в PostgreSQL это генерируемая колонка
+``search_vector`` с GIN-индексом. В SQLite используется виртуальная
+таблица FTS5, которую синхронизируют сигналы модели ``Recipe``.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from api.constants import SEARCH_CONFIG
+
+RECIPE_TABLE = 'recipes_recipe'
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def _postgresql_search(queryset, query):
+    tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+    match = RawSQL(f'{RECIPE_TABLE}.search_vector @@ {tsquery}', (query,),
+                   output_field=BooleanField())
+    rank = RawSQL(f'ts_rank({RECIPE_TABLE}.search_vector, {tsquery})',
+                  (query,), output_field=FloatField())
+    return queryset.filter(match).annotate(search_rank=rank)
+
+
+def _sqlite_search(queryset, query):
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())).none()
+    # Стеммера для русского в FTS5 нет, поэтому ищем по префиксам слов.
+    match_expr = ' '.join(f'"{term}"*' for term in terms)
+    match = RawSQL(
+        f'{RECIPE_TABLE}.id IN (SELECT rowid FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s)',
+        (match_expr,), output_field=BooleanField())
+    rank = RawSQL(
+        f'(SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {RECIPE_TABLE}.id)',
+        (match_expr,), output_field=FloatField())
+    return queryset.filter(match).annotate(search_rank=rank)
+
+
+def _is_sqlite(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def index_recipe(recipe, using='default'):
+    """Обновляет запись рецепта в FTS5-индексе SQLite."""
+    if not _is_sqlite(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       (recipe.pk,))
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, name, text) VALUES (%s, %s, %s)',
+            (recipe.pk, recipe.name, recipe.text))
+
+
+def unindex_recipe(recipe_id, using='default'):
+    """Удаляет рецепт из FTS5-индекса SQLite."""
+    if not _is_sqlite(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       (recipe_id,))
+
+
+def search_recipes(queryset, query):
+    """Фильтрует рецепты по запросу и сортирует их по релевантности."""
+    query = query.strip()
+    if not query:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        queryset = _postgresql_search(queryset, query)
+    elif vendor == 'sqlite':
+        queryset = _sqlite_search(queryset, query)
+    else:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query))
+    return queryset.order_by('-search_rank', '-pub_date')
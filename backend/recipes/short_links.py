@@ -0,0 +1,96 @@
+"""Короткие ссылки на рецепты.
+
+Код рецепта — случайная base62-строка. Разрешение кода идёт через LRU в
+памяти процесса, затем через общий кэш и только потом в базу; отсутствие
+кода тоже кэшируется ненадолго, чтобы перебор не доходил до базы.
+Удалённые рецепты убираются из LRU всех воркеров шиной инвалидации.
+"""
+import secrets
+import string
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from api.constants import (SHORT_CODE_LENGTH,
+                           SHORT_LINK_CACHE_TIMEOUT,
+                           SHORT_LINK_LRU_SIZE,
+                           SHORT_LINK_MISS_TIMEOUT)
+from foodgram.invalidation import bus
+from .models import Recipe
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_PATTERN = f'[0-9A-Za-z]{{{SHORT_CODE_LENGTH}}}'
+MISSING = 0
+
+
+class LRUCache:
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+local_cache = LRUCache(SHORT_LINK_LRU_SIZE)
+
+
+def _cache_key(code):
+    return f'short-link:{code}'
+
+
+def generate_short_code():
+    while True:
+        code = ''.join(secrets.choice(ALPHABET)
+                       for _ in range(SHORT_CODE_LENGTH))
+        if not Recipe.objects.filter(short_code=code).exists():
+            return code
+
+
+def resolve(code):
+    """Возвращает id рецепта по коду или None."""
+    bus.check()
+    recipe_id = local_cache.get(code)
+    if recipe_id is not None:
+        return recipe_id
+    recipe_id = cache.get(_cache_key(code))
+    if recipe_id is None:
+        recipe_id = (Recipe.objects
+                     .filter(short_code=code)
+                     .values_list('id', flat=True)
+                     .first()) or MISSING
+        cache.set(_cache_key(code), recipe_id,
+                  SHORT_LINK_CACHE_TIMEOUT if recipe_id
+                  else SHORT_LINK_MISS_TIMEOUT)
+    if recipe_id == MISSING:
+        return None
+    local_cache.set(code, recipe_id)
+    return recipe_id
+
+
+def forget(code):
+    """Убирает код из кэшей после удаления рецепта."""
+    local_cache.discard(code)
+    cache.delete(_cache_key(code))
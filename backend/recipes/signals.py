@@ -0,0 +1,238 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from foodgram.invalidation import bus
+from users.models import CustomUser, Subscription
+
+from . import documents, ingredient_stats
+from .feed import fan_out_recipe, subscribe_timeline, unsubscribe_timeline
+from .ingredient_index import ingredient_index
+from .models import Favorites, Ingredient, Recipe, ShoppingCart
+from .search import index_recipe, unindex_recipe
+from .short_links import forget, generate_short_code, local_cache
+from .trending import record_event
+
+# Отправляется после записи состава рецепта: recipe_id, ingredient_ids
+# (новый набор id ингредиентов) и previous_ids (прежний набор).
+ingredients_changed = Signal()
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_index(sender, instance, using, **kwargs):
+    index_recipe(instance, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search_index(sender, instance, using, **kwargs):
+    unindex_recipe(instance.pk, using)
+
+
+@receiver(ingredients_changed)
+def publish_recipe_ingredients(sender, recipe_id, ingredient_ids,
+                               previous_ids=(), using='default', **kwargs):
+    bus.publish('recipes.recipe_ingredients', recipe_id, {
+        'ingredient_ids': sorted(ingredient_ids),
+        'previous_ids': sorted(previous_ids),
+    }, using=using)
+
+
+# Темы событий моделей, на которые подписаны кэши воркеров. Остальные
+# модели не публикуются: каждое событие — это pg_notify в транзакции.
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+def publish_saved(sender, instance, using, **kwargs):
+    bus.publish(sender._meta.label_lower, instance.pk, using=using)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Ingredient)
+def publish_deleted(sender, instance, using, **kwargs):
+    data = {'deleted': True}
+    if sender is Recipe and instance.short_code:
+        data['short_code'] = instance.short_code
+    bus.publish(sender._meta.label_lower, instance.pk, data, using=using)
+
+
+@bus.subscribe('recipes.recipe_ingredients')
+def update_ingredient_index(event):
+    ingredient_index.set_recipe(event.key, event.data['ingredient_ids'],
+                                event.data['previous_ids'])
+
+
+@bus.subscribe('recipes.recipe')
+def forget_deleted_recipe(event):
+    if not event.data.get('deleted'):
+        return
+    ingredient_index.remove_recipe(event.key)
+    code = event.data.get('short_code')
+    if code and event.local:
+        forget(code)
+    elif code:
+        local_cache.discard(code)
+
+
+@bus.subscribe('recipes.ingredient')
+def remove_ingredient_from_index(event):
+    if event.data.get('deleted'):
+        ingredient_index.remove_ingredient(event.key)
+
+
+bus.on_reset(ingredient_index.reset)
+bus.on_reset(local_cache.clear)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, using, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out_recipe(instance), using=using)
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, using, **kwargs):
+    if created:
+        user_id, author_id = instance.user_id, instance.author_id
+        transaction.on_commit(
+            lambda: subscribe_timeline(user_id, author_id), using=using)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, using, **kwargs):
+    user_id, author_id = instance.user_id, instance.author_id
+    transaction.on_commit(
+        lambda: unsubscribe_timeline(user_id, author_id), using=using)
+
+
+@receiver(ingredients_changed)
+def refresh_similar_recipes(sender, recipe_id, ingredient_ids,
+                            using='default', **kwargs):
+    # similarity импортирует numpy, поэтому модуль загружается при первой
+    # записи состава, а не при старте процесса.
+    from .similarity import refresh_recipe
+
+    ingredient_ids = set(ingredient_ids)
+    transaction.on_commit(
+        lambda: refresh_recipe(recipe_id, ingredient_ids), using=using)
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_save, sender=ShoppingCart)
+def add_trending_event(sender, instance, created, **kwargs):
+    if created:
+        record_event(sender, instance.recipe_id, instance.added_at)
+
+
+@receiver(post_delete, sender=Favorites)
+@receiver(post_delete, sender=ShoppingCart)
+def remove_trending_event(sender, instance, **kwargs):
+    record_event(sender, instance.recipe_id, instance.added_at, added=False)
+
+
+@receiver(pre_save, sender=Recipe)
+def assign_short_code(sender, instance, **kwargs):
+    if not instance.short_code:
+        instance.short_code = generate_short_code()
+
+
+@receiver(ingredients_changed)
+def touch_recipe(sender, recipe_id, using='default', **kwargs):
+    Recipe.objects.using(using).filter(pk=recipe_id).update(
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_with_ingredient(sender, instance, created, using,
+                                  **kwargs):
+    if not created:
+        Recipe.objects.using(using).filter(
+            ingredients_in_recipe__ingredient=instance
+        ).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Favorites)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def touch_user_relations(sender, instance, using, **kwargs):
+    CustomUser.objects.using(using).filter(pk=instance.user_id).update(
+        relations_changed_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_document(sender, instance, using, update_fields=None,
+                            **kwargs):
+    if (update_fields is None
+            or documents.SOURCE_RECIPE_FIELDS & update_fields):
+        documents.schedule_refresh({instance.pk}, using)
+
+
+@receiver(ingredients_changed)
+def refresh_document_ingredients(sender, recipe_id, using='default',
+                                 **kwargs):
+    documents.schedule_refresh({recipe_id}, using)
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_documents_with_ingredient(sender, instance, created, using,
+                                      **kwargs):
+    if not created:
+        documents.schedule_refresh(
+            Recipe.objects.using(using).filter(
+                ingredients_in_recipe__ingredient=instance
+            ).values_list('id', flat=True), using)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def refresh_documents_without_ingredient(sender, instance, using, **kwargs):
+    documents.schedule_refresh(
+        Recipe.objects.using(using).filter(
+            ingredients_in_recipe__ingredient=instance
+        ).values_list('id', flat=True), using)
+
+
+@receiver(post_save, sender=CustomUser)
+def refresh_author_documents(sender, instance, created, using,
+                             update_fields=None, **kwargs):
+    if created:
+        return
+    if (update_fields is None
+            or documents.SOURCE_AUTHOR_FIELDS & update_fields):
+        documents.schedule_refresh(
+            Recipe.objects.using(using).filter(
+                author=instance).values_list('id', flat=True), using)
+
+
+@receiver(ingredients_changed)
+def update_ingredient_stats(sender, recipe_id, ingredient_ids,
+                            previous_ids=(), using='default', **kwargs):
+    ingredient_ids, previous_ids = set(ingredient_ids), set(previous_ids)
+    ingredient_stats.record_recipe_ingredients(
+        recipe_id, ingredient_ids - previous_ids,
+        previous_ids - ingredient_ids, using)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_ingredient_stats(sender, instance, using, **kwargs):
+    ingredient_stats.record_recipe_deleting(instance, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def finish_recipe_removal_from_ingredient_stats(sender, instance,
+                                                **kwargs):
+    ingredient_stats.record_recipe_deleted(instance)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_to_ingredient_stats(sender, instance, created, using,
+                                 **kwargs):
+    if created:
+        ingredient_stats.record_cart(instance, using)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_cart_from_ingredient_stats(sender, instance, using, **kwargs):
+    ingredient_stats.record_cart(instance, using, added=False)
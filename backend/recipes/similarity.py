@@ -0,0 +1,129 @@
+"""Похожие рецепты по MinHash/LSH над наборами ингредиентов.
+
+Сходство двух рецептов - коэффициент Жаккара их наборов ингредиентов,
+который оценивается долей совпавших компонент MinHash-сигнатур. Кандидаты
+в похожие ищутся через LSH: сигнатура режется на полосы, и рецепты,
+совпавшие хотя бы в одной полосе, попадают в одну корзину.
+"""
+import numpy as np
+from django.db import transaction
+
+from api.constants import (MINHASH_BANDS,
+                           MINHASH_SIZE,
+                           SIMILAR_RECIPES_LIMIT)
+from .models import (IngredientInRecipe,
+                     RecipeBucket,
+                     RecipeSignature,
+                     SimilarRecipe)
+
+PRIME = 2 ** 31 - 1
+BAND_ROWS = MINHASH_SIZE // MINHASH_BANDS
+MAX_CANDIDATES = 1000
+
+_random = np.random.RandomState(20250601)
+_HASH_A = _random.randint(1, PRIME, size=(MINHASH_SIZE, 1), dtype=np.int64)
+_HASH_B = _random.randint(0, PRIME, size=(MINHASH_SIZE, 1), dtype=np.int64)
+_BAND_WEIGHTS = (_random.randint(1, 2 ** 62, size=BAND_ROWS, dtype=np.int64)
+                 .astype(np.uint64) * 2 + 1)
+
+
+def minhash_many(ingredient_ids, starts):
+    """Считает сигнатуры сразу для нескольких рецептов.
+
+    ``ingredient_ids`` - ингредиенты всех рецептов подряд, ``starts`` -
+    позиции, с которых начинается каждый рецепт. Возвращает массив
+    формы (число рецептов, MINHASH_SIZE).
+    """
+    values = np.asarray(ingredient_ids, dtype=np.int64) % PRIME
+    hashes = (_HASH_A * values + _HASH_B) % PRIME
+    return np.minimum.reduceat(hashes, starts, axis=1).T.astype(np.uint32)
+
+
+def minhash(ingredient_ids):
+    """Считает сигнатуру одного набора ингредиентов."""
+    return minhash_many(list(ingredient_ids), [0])[0]
+
+
+def band_buckets(signatures):
+    """Хеширует каждую полосу сигнатур в одно 64-битное число."""
+    bands = signatures.reshape(
+        len(signatures), MINHASH_BANDS, BAND_ROWS).astype(np.uint64)
+    return (bands * _BAND_WEIGHTS).sum(axis=2).view(np.int64)
+
+
+def estimate_similarity(signature, signatures):
+    """Оценивает коэффициент Жаккара сигнатуры с каждой из сигнатур."""
+    return (signatures == signature).mean(axis=1)
+
+
+def top_neighbours(recipe_id, signature, candidate_ids, signatures):
+    """Возвращает лучших соседей рецепта как список (id, сходство)."""
+    if not len(candidate_ids):
+        return []
+    scores = estimate_similarity(signature, signatures)
+    order = np.argsort(-scores, kind='stable')
+    return [
+        (int(candidate_ids[index]), float(scores[index]))
+        for index in order[:SIMILAR_RECIPES_LIMIT]
+        if candidate_ids[index] != recipe_id and scores[index] > 0
+    ]
+
+
+def _trim(recipe_ids):
+    for recipe_id in recipe_ids:
+        keep = SimilarRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).order_by('-score').values('id')[:SIMILAR_RECIPES_LIMIT]
+        SimilarRecipe.objects.filter(
+            recipe_id=recipe_id).exclude(id__in=keep).delete()
+
+
+def refresh_recipe(recipe_id, ingredient_ids=None):
+    """Пересчитывает сигнатуру и соседей одного рецепта."""
+    if ingredient_ids is None:
+        ingredient_ids = IngredientInRecipe.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', flat=True)
+    ingredient_ids = sorted(ingredient_ids)
+    if not ingredient_ids:
+        return
+    signature = minhash(ingredient_ids)
+    buckets = band_buckets(signature[np.newaxis])[0]
+
+    with transaction.atomic():
+        RecipeSignature.objects.update_or_create(
+            recipe_id=recipe_id,
+            defaults={'minhash': signature.tobytes()})
+        RecipeBucket.objects.filter(recipe_id=recipe_id).delete()
+        RecipeBucket.objects.bulk_create([
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(buckets.tolist())
+        ])
+
+        candidates = set()
+        matches = RecipeBucket.objects.filter(
+            bucket__in=buckets.tolist()
+        ).exclude(
+            recipe_id=recipe_id
+        ).values_list('recipe_id', 'band', 'bucket')[:MAX_CANDIDATES]
+        for candidate_id, band, bucket in matches:
+            if buckets[band] == bucket:
+                candidates.add(candidate_id)
+        rows = list(RecipeSignature.objects.filter(
+            recipe_id__in=candidates).values_list('recipe_id', 'minhash'))
+        candidate_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        signatures = np.array(
+            [np.frombuffer(row[1], dtype=np.uint32) for row in rows]
+        ).reshape(len(rows), MINHASH_SIZE)
+        neighbours = top_neighbours(recipe_id, signature,
+                                    candidate_ids, signatures)
+
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other, score=score)
+            for other, score in neighbours
+        ] + [
+            SimilarRecipe(recipe_id=other, similar_id=recipe_id, score=score)
+            for other, score in neighbours
+        ])
+        _trim(other for other, _ in neighbours)
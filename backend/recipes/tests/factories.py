@@ -0,0 +1,56 @@
+"""Общие заготовки данных для тестов приложений."""
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from recipes.signals import ingredients_changed
+from users.models import CustomUser
+
+IMAGE = 'recipes_images/recipe.png'
+PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+       'FcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+PASSWORD = 'foodgram-test'
+
+
+def create_user(username, **fields):
+    """Пользователь с почтой ``<username>@example.com``."""
+    return CustomUser.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password=PASSWORD, **fields)
+
+
+def create_ingredients(count):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+        for number in range(count))
+
+
+def create_recipe(author, name='рецепт', ingredients=(), **fields):
+    """Рецепт с составом ``ingredients``: список ингредиентов или
+    ``{ингредиент: количество}``.
+
+    Как и при записи через API, о составе сообщает
+    ``ingredients_changed``, поэтому сводки и индексы строятся после
+    фиксации транзакции.
+    """
+    recipe = Recipe.objects.create(
+        author=author, name=name,
+        **{'text': 'описание', 'cooking_time': 10, 'image': IMAGE,
+           **fields})
+    if not isinstance(ingredients, dict):
+        ingredients = dict.fromkeys(ingredients, 1)
+    if ingredients:
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                               amount=amount)
+            for ingredient, amount in ingredients.items())
+        ingredients_changed.send(
+            sender=Recipe, recipe_id=recipe.id,
+            ingredient_ids={ingredient.id for ingredient in ingredients})
+    return recipe
+
+
+def token_client(token):
+    """Клиент API, авторизованный токеном."""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
@@ -0,0 +1,163 @@
+import gzip
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+
+import orjson
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from api.constants import DUMP_FORMAT_VERSION
+from recipes.backup import FORMAT
+from recipes.tests.factories import create_recipe, create_user
+from recipes.models import (Favorites, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart)
+from users.models import CustomUser, Subscription
+
+DUMPED_AT = datetime(2020, 5, 17, 12, 30, tzinfo=timezone.utc)
+
+
+class BackupTests(TestCase):
+    """Выгрузка ``dump_content`` и загрузка ``restore_content`` на
+    заполненной базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (create_user(name)
+                                  for name in ('author', 'reader'))
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'мука'))
+        for number in range(2):
+            recipe = create_recipe(
+                cls.author, f'рецепт {number}',
+                {ingredient: number + amount for amount, ingredient
+                 in enumerate(cls.ingredients[number:], start=1)},
+                cooking_time=10 + number)
+            Favorites.objects.create(user=cls.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+        # Даты ``auto_now`` задаются в обход сохранения моделей.
+        Recipe.objects.update(pub_date=DUMPED_AT, updated_at=DUMPED_AT)
+        Favorites.objects.update(added_at=DUMPED_AT)
+        ShoppingCart.objects.update(added_at=DUMPED_AT)
+        CustomUser.objects.update(updated_at=DUMPED_AT)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def _dump(self, name='content.jsonl'):
+        path = self.directory / name
+        call_command('dump_content', str(path), stdout=StringIO())
+        return path
+
+    def _restore(self, path):
+        call_command('restore_content', str(path), '--skip-derived',
+                     stdout=StringIO())
+
+    def _clear(self):
+        CustomUser.objects.all().delete()
+        Ingredient.objects.all().delete()
+
+    def _content(self):
+        """Содержимое базы без id: ссылки - по естественным ключам."""
+        return {
+            'users': sorted(CustomUser.objects.values_list(
+                'username', 'email', 'password', 'date_joined',
+                'updated_at')),
+            'recipes': sorted(Recipe.objects.values_list(
+                'author__username', 'name', 'text', 'cooking_time',
+                'image', 'pub_date', 'updated_at', 'short_code')),
+            'ingredients': sorted(IngredientInRecipe.objects.values_list(
+                'recipe__name', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount')),
+            'favorites': sorted(Favorites.objects.values_list(
+                'user__username', 'recipe__name', 'added_at')),
+            'cart': sorted(ShoppingCart.objects.values_list(
+                'user__username', 'recipe__name', 'added_at')),
+            'subscriptions': sorted(Subscription.objects.values_list(
+                'user__username', 'author__username')),
+        }
+
+    def test_gzip_round_trip(self):
+        content = self._content()
+        path = self._dump('content.jsonl.gz')
+        with gzip.open(path) as stream:
+            self.assertEqual(orjson.loads(stream.readline()), {
+                'format': FORMAT, 'version': DUMP_FORMAT_VERSION})
+        self._clear()
+        self.assertFalse(Recipe.objects.exists())
+        self._restore(path)
+        self.assertEqual(self._content(), content)
+
+    def test_dates_kept_as_dumped(self):
+        path = self._dump()
+        self._clear()
+        self._restore(path)
+        self.assertEqual(set(Recipe.objects.values_list(
+            'pub_date', 'updated_at')), {(DUMPED_AT, DUMPED_AT)})
+        self.assertEqual(set(Favorites.objects.values_list(
+            'added_at', flat=True)), {DUMPED_AT})
+        self.assertEqual(set(CustomUser.objects.values_list(
+            'updated_at', flat=True)), {DUMPED_AT})
+        # После загрузки даты снова ставятся автоматически.
+        recipe = Recipe.objects.first()
+        recipe.save()
+        self.assertGreater(recipe.updated_at, DUMPED_AT)
+
+    def test_existing_users_and_ingredients_reused(self):
+        content = self._content()
+        path = self._dump()
+        self._clear()
+        author = create_user('author')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        # Другая единица измерения - другой ингредиент.
+        Ingredient.objects.create(name='сахар', measurement_unit='кг')
+        self._restore(path)
+        self.assertEqual(CustomUser.objects.count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 4)
+        self.assertEqual(set(Recipe.objects.values_list(
+            'author', flat=True)), {author.pk})
+        self.assertEqual(Subscription.objects.get().author_id, author.pk)
+        self.assertEqual(
+            IngredientInRecipe.objects.filter(ingredient=salt).count(), 1)
+        content['users'] = sorted(CustomUser.objects.values_list(
+            'username', 'email', 'password', 'date_joined', 'updated_at'))
+        self.assertEqual(self._content(), content)
+
+    def test_taken_short_codes_cleared(self):
+        codes = set(Recipe.objects.values_list('short_code', flat=True))
+        self._restore(self._dump())
+        self.assertEqual(Recipe.objects.count(), 4)
+        self.assertEqual(CustomUser.objects.count(), 2)
+        self.assertEqual(set(Recipe.objects.exclude(
+            short_code=None).values_list('short_code', flat=True)), codes)
+        self.assertEqual(Recipe.objects.filter(short_code=None).count(), 2)
+
+    def test_dependency_order_violation_rejected(self):
+        path = self.directory / 'content.jsonl'
+        path.write_bytes(b''.join(orjson.dumps(line) + b'\n' for line in (
+            {'format': FORMAT, 'version': DUMP_FORMAT_VERSION},
+            {'model': 'recipes.ingredient', 'pk': 1,
+             'fields': {'name': 'перец', 'measurement_unit': 'г'}},
+            {'model': 'users.customuser', 'pk': 1,
+             'fields': {'username': 'late', 'email': 'late@example.com'}},
+        )))
+        with self.assertRaisesMessage(CommandError,
+                                      'нарушен порядок зависимостей'):
+            self._restore(path)
+        self.assertFalse(Ingredient.objects.filter(name='перец').exists())
+
+    def test_missing_reference_rejected(self):
+        path = self.directory / 'content.jsonl'
+        path.write_bytes(b''.join(orjson.dumps(line) + b'\n' for line in (
+            {'format': FORMAT, 'version': DUMP_FORMAT_VERSION},
+            {'model': 'users.subscription', 'pk': 1,
+             'fields': {'user': 1, 'author': 2}},
+        )))
+        with self.assertRaisesMessage(CommandError, 'нет в выгрузке'):
+            self._restore(path)
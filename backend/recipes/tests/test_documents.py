@@ -0,0 +1,138 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.constants import RECIPE_DOCUMENT_VERSION
+from api.representations import recipe_queryset, recipe_representation
+from recipes.models import RecipeDocument
+from recipes.tests.factories import (PNG, create_ingredients, create_recipe,
+                                     create_user, token_client)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeDocumentTests(TestCase):
+    """Карточки совпадают с ответом, собранным из таблиц, и не
+    создаются при чтении."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author', first_name='Автор',
+                                 last_name='Авторов')
+        cls.token = Token.objects.create(user=cls.author)
+        cls.ingredients = create_ingredients(3)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.recipes = [
+                create_recipe(cls.author, f'рецепт {number}', dict.fromkeys(
+                    cls.ingredients[number:], number + 1))
+                for number in range(2)]
+
+    def setUp(self):
+        self.client = token_client(self.token)
+
+    def assertDocumentsMatch(self):
+        """Ответ из карточек совпадает с ответом, собранным из таблиц."""
+        live = {recipe.id: recipe for recipe in recipe_queryset(
+            self.author, documents=False)}
+        documents = list(recipe_queryset(self.author))
+        self.assertEqual(len(documents), len(live))
+        for recipe in documents:
+            with self.subTest(recipe=recipe.id):
+                self.assertEqual(recipe.document.version,
+                                 RECIPE_DOCUMENT_VERSION)
+                self.assertEqual(recipe_representation(None, recipe),
+                                 recipe_representation(None,
+                                                       live[recipe.id]))
+
+    def test_documents_built_on_commit(self):
+        self.assertEqual(RecipeDocument.objects.count(), len(self.recipes))
+        self.assertDocumentsMatch()
+
+    def test_recipe_update_refreshes_document(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipes[0].id}/', {
+                    'name': 'новое название', 'text': 'новое описание',
+                    'cooking_time': 5, 'image': PNG,
+                    'ingredients': [{'id': self.ingredients[2].id,
+                                     'amount': 7}],
+                }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertDocumentsMatch()
+
+    def test_ingredient_and_author_changes_refresh_documents(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredients[2].name = 'переименован'
+            self.ingredients[2].save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredients[1].delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Иван'
+            self.author.save()
+        self.assertDocumentsMatch()
+
+    def test_missing_documents_not_written_on_read(self):
+        RecipeDocument.objects.filter(recipe=self.recipes[0]).delete()
+        RecipeDocument.objects.filter(recipe=self.recipes[1]).update(
+            version=RECIPE_DOCUMENT_VERSION - 1, document={})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([query['sql'] for query in queries.captured_queries
+                          if not query['sql'].startswith('SELECT')], [])
+        self.assertEqual(RecipeDocument.objects.count(), 1)
+        self.assertEqual(
+            RecipeDocument.objects.get(recipe=self.recipes[1]).version,
+            RECIPE_DOCUMENT_VERSION - 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_recipe_documents', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/recipes/').json(),
+                         response.json())
+
+    def test_rebuild_command_builds_missing(self):
+        RecipeDocument.objects.all().delete()
+        call_command('rebuild_recipe_documents', '--missing',
+                     stdout=StringIO())
+        self.assertDocumentsMatch()
+
+    def test_sparse_fields_skip_documents(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/',
+                                       {'fields': 'id,name,image'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]),
+                         {'id', 'name', 'image'})
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'recipedocument' in query['sql']])
+
+    def test_check_reports_edited_document(self):
+        output = StringIO()
+        call_command('rebuild_recipe_documents', '--check', stdout=output)
+        self.assertIn('Расхождений нет.', output.getvalue())
+
+        stored = RecipeDocument.objects.get(recipe=self.recipes[0])
+        stored.document['name'] = 'изменено вручную'
+        stored.save()
+        RecipeDocument.objects.filter(recipe=self.recipes[1]).delete()
+        output = StringIO()
+        with self.assertRaisesMessage(CommandError, 'Расхождений: 2.'):
+            call_command('rebuild_recipe_documents', '--check',
+                         stdout=output)
+        self.assertIn(f'Рецепт {self.recipes[0].id}: поля name',
+                      output.getvalue())
+        self.assertIn(f'Рецепт {self.recipes[1].id}: нет карточки',
+                      output.getvalue())
+        self.assertEqual(RecipeDocument.objects.get(
+            recipe=self.recipes[0]).document['name'], 'изменено вручную')
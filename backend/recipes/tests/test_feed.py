@@ -0,0 +1,107 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes import feed
+from recipes.feed import get_feed_ids, resume_fanout
+from recipes.models import CelebrityAuthor, FeedEntry
+from recipes.tests.factories import create_recipe, create_user
+from users.models import Subscription
+
+FANOUT_LIMIT = 3
+RESUME_LIMIT = 1
+
+
+@mock.patch.object(feed, 'FEED_FANOUT_LIMIT', FANOUT_LIMIT)
+@mock.patch.object(feed, 'FEED_FANOUT_RESUME_LIMIT', RESUME_LIMIT)
+class AuthorModeTests(TestCase):
+    """Переключение между записью и чтением лент с гистерезисом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.followers = [create_user(f'follower{number}')
+                         for number in range(FANOUT_LIMIT + 1)]
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.recipes = [create_recipe(cls.author, f'рецепт {number}')
+                           for number in range(2)]
+
+    def setUp(self):
+        patcher = mock.patch.object(feed, 'backfills')
+        self.backfills = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _subscribe(self, followers):
+        with self.captureOnCommitCallbacks(execute=True):
+            for follower in followers:
+                Subscription.objects.create(user=follower,
+                                            author=self.author)
+
+    def _unsubscribe(self, followers):
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.filter(
+                author=self.author, user__in=followers).delete()
+
+    def _is_celebrity(self):
+        return CelebrityAuthor.objects.filter(author=self.author).exists()
+
+    def _feed(self, user):
+        return [recipe_id for recipe_id, _ in get_feed_ids(user)]
+
+    def _timeline(self, user):
+        return set(FeedEntry.objects.filter(user=user).values_list(
+            'recipe_id', flat=True))
+
+    def test_switch_thresholds(self):
+        self._subscribe(self.followers[:FANOUT_LIMIT])
+        self.assertFalse(self._is_celebrity())
+        self._subscribe(self.followers[FANOUT_LIMIT:])
+        self.assertTrue(self._is_celebrity())
+        # Между порогами автор остаётся популярным.
+        self._unsubscribe(self.followers[:2])
+        self.assertTrue(self._is_celebrity())
+        self.backfills.submit.assert_not_called()
+        self._unsubscribe(self.followers[2:3])
+        self.backfills.submit.assert_called_once_with(
+            feed._resume_in_background, self.author.id)
+        resume_fanout(self.author.id)
+        self.assertFalse(self._is_celebrity())
+        # Снова между порогами: автор остаётся в записи лент.
+        self._subscribe(self.followers[:2])
+        self.assertFalse(self._is_celebrity())
+
+    def test_backfill_after_request(self):
+        self._subscribe(self.followers)
+        follower = self.followers[-1]
+        expected = [recipe.id for recipe in reversed(self.recipes)]
+        self.assertEqual(self._timeline(follower), set())
+        self.assertEqual(self._feed(follower), expected)
+        self._unsubscribe(self.followers[:FANOUT_LIMIT])
+        # Пока ленты не дозаполнены, рецепты подмешиваются при чтении.
+        self.assertTrue(self._is_celebrity())
+        self.assertEqual(self._timeline(follower), set())
+        self.assertEqual(self._feed(follower), expected)
+        resume_fanout(self.author.id)
+        self.assertFalse(self._is_celebrity())
+        self.assertEqual(self._timeline(follower), set(expected))
+        self.assertEqual(self._feed(follower), expected)
+
+    def test_backfill_skipped_when_followers_return(self):
+        self._subscribe(self.followers)
+        self._unsubscribe(self.followers[:FANOUT_LIMIT])
+        self._subscribe(self.followers[:FANOUT_LIMIT])
+        resume_fanout(self.author.id)
+        self.assertTrue(self._is_celebrity())
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_rebuild_feed_resumes_immediately(self):
+        self._subscribe(self.followers)
+        Subscription.objects.filter(
+            user__in=self.followers[:FANOUT_LIMIT]).delete()
+        call_command('rebuild_feed', stdout=StringIO())
+        self.backfills.submit.assert_not_called()
+        self.assertFalse(self._is_celebrity())
+        self.assertEqual(self._timeline(self.followers[-1]),
+                         {recipe.id for recipe in self.recipes})
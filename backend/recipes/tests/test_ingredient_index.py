@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.serializers import RecipeCreateUpdateSerializer
+from recipes.ingredient_index import ingredient_index
+from recipes.tests.factories import (create_ingredients, create_recipe,
+                                     create_user)
+
+
+class IngredientIndexTests(TestCase):
+    """Ранжирование по имеющимся ингредиентам и обновление индекса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.ingredients = create_ingredients(5)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.exact = cls._recipe('всё есть', (0, 1))
+            cls.one_missing = cls._recipe('без одного', (0, 1, 3))
+            cls.newer = cls._recipe('без одного, новее', (0, 3))
+            cls.two_missing = cls._recipe('без двух', (2, 3, 4))
+
+    @classmethod
+    def _recipe(cls, name, numbers):
+        return create_recipe(cls.author, name, [cls.ingredients[number]
+                                                for number in numbers])
+
+    def setUp(self):
+        ingredient_index.reset()
+        self.addCleanup(ingredient_index.reset)
+
+    def _ids(self, numbers):
+        return ','.join(str(self.ingredients[number].id)
+                        for number in numbers)
+
+    def _find(self, numbers, max_missing=None):
+        params = {'ingredients': self._ids(numbers)}
+        if max_missing is not None:
+            params['max_missing'] = max_missing
+        response = self.client.get('/api/recipes/by_ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['id'], recipe['missing_count'])
+                for recipe in response.json()['results']]
+
+    def test_ranked_by_missing_then_matched(self):
+        self.assertEqual(self._find((0, 1, 2)), [
+            (self.exact.id, 0),
+            (self.one_missing.id, 1),
+            (self.newer.id, 1),
+            (self.two_missing.id, 2),
+        ])
+
+    def test_ties_broken_by_newer_recipe(self):
+        self.assertEqual(self._find((0,), max_missing=1),
+                         [(self.newer.id, 1), (self.exact.id, 1)])
+
+    def test_max_missing(self):
+        for max_missing, expected in ((0, [self.exact.id]),
+                                      (1, [self.exact.id,
+                                           self.one_missing.id,
+                                           self.newer.id])):
+            with self.subTest(max_missing=max_missing):
+                self.assertEqual(
+                    [recipe_id for recipe_id, _ in self._find(
+                        (0, 1, 2), max_missing)], expected)
+
+    def test_invalid_parameters_rejected(self):
+        for params in ({}, {'ingredients': 'a'},
+                       {'ingredients': self._ids((0,)),
+                        'max_missing': 'x'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/recipes/by_ingredients/',
+                                           params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_recipe_edit_updates_index_incrementally(self):
+        self._find((0,))
+        with mock.patch.object(ingredient_index, 'build') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                RecipeCreateUpdateSerializer().update(
+                    self.two_missing, {'ingredients': [
+                        {'ingredient': self.ingredients[number],
+                         'amount': 1} for number in (0, 1)]})
+            with self.captureOnCommitCallbacks(execute=True):
+                self.exact.delete()
+            ranking = self._find((0, 1, 2))
+        build.assert_not_called()
+        self.assertEqual(ranking, [
+            (self.two_missing.id, 0),
+            (self.one_missing.id, 1),
+            (self.newer.id, 1),
+        ])
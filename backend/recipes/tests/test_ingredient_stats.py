@@ -0,0 +1,93 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes import ingredient_stats
+from recipes.models import IngredientStats, ShoppingCart
+from recipes.tests.factories import (create_ingredients, create_recipe,
+                                     create_user)
+
+
+class Rollback(Exception):
+    pass
+
+
+class IngredientStatsTests(TestCase):
+    """Сводка меняется только после коммита и сходится с полным
+    пересчётом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.ingredients = create_ingredients(3)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.recipe = cls._recipe('рецепт', cls.ingredients[:2])
+
+    @classmethod
+    def _recipe(cls, name, ingredients):
+        return create_recipe(cls.user, name, ingredients)
+
+    def _counts(self):
+        return {pk: (recipes, carts) for pk, recipes, carts
+                in IngredientStats.objects.values_list(
+                    'pk', 'recipes_count', 'cart_count')}
+
+    def assertMatchesRollup(self):
+        output = StringIO()
+        call_command('rollup_ingredient_stats', '--check', stdout=output)
+        self.assertIn('Расхождений: 0', output.getvalue())
+
+    def test_applied_after_commit(self):
+        first, second, third = (ingredient.pk
+                                for ingredient in self.ingredients)
+        before = self._counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                ShoppingCart.objects.create(user=self.user,
+                                            recipe=self.recipe)
+                self._recipe('второй', self.ingredients[1:])
+            self.assertEqual(self._counts(), before)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'ingredientstats' in query['sql'].lower()])
+        self.assertEqual(self._counts(), {
+            first: (1, 1), second: (2, 1), third: (1, 0)})
+        self.assertMatchesRollup()
+
+    def test_rolled_back_changes_not_applied(self):
+        before = self._counts()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    ShoppingCart.objects.create(user=self.user,
+                                                recipe=self.recipe)
+                    raise Rollback
+            except Rollback:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self._counts(), before)
+
+    def test_recipe_removal(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(set(self._counts().values()), {(0, 0)})
+        self.assertMatchesRollup()
+
+    def test_failed_update_fixed_by_rollup(self):
+        with mock.patch.object(ingredient_stats, '_apply',
+                               side_effect=ValueError):
+            with self.assertLogs('django.test', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    cart = ShoppingCart.objects.create(user=self.user,
+                                                       recipe=self.recipe)
+        self.assertTrue(ShoppingCart.objects.filter(pk=cart.pk).exists())
+        output = StringIO()
+        call_command('rollup_ingredient_stats', '--check', stdout=output)
+        self.assertIn('Расхождений: 2', output.getvalue())
+        call_command('rollup_ingredient_stats', stdout=StringIO())
+        self.assertMatchesRollup()
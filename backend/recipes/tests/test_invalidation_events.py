@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from foodgram.invalidation import bus
+from recipes.models import Favorites, Ingredient, ShoppingCart
+from recipes.tests.factories import create_recipe, create_user
+from users.models import Subscription
+
+
+class InvalidationEventTests(TestCase):
+    """Сигналы моделей публикуют события только тех тем, на которые
+    подписаны кэши воркеров."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.author = create_user('author')
+        cls.recipe = create_recipe(cls.author)
+
+    def _published(self):
+        return mock.patch.object(bus, 'publish')
+
+    def _topics(self, publish):
+        return [call.args[0] for call in publish.call_args_list]
+
+    def test_relations_and_users_not_published(self):
+        with self._published() as publish:
+            favorite = Favorites.objects.create(user=self.user,
+                                                recipe=self.recipe)
+            cart = ShoppingCart.objects.create(user=self.user,
+                                               recipe=self.recipe)
+            subscription = Subscription.objects.create(user=self.user,
+                                                       author=self.author)
+            self.user.first_name = 'Имя'
+            self.user.save()
+            favorite.delete()
+            cart.delete()
+            subscription.delete()
+        self.assertEqual(self._topics(publish), [])
+
+    def test_recipe_and_ingredient_published(self):
+        with self._published() as publish:
+            ingredient = Ingredient.objects.create(name='соль',
+                                                   measurement_unit='г')
+            ingredient.delete()
+            self.recipe.delete()
+        self.assertEqual(self._topics(publish), [
+            'recipes.ingredient', 'recipes.ingredient', 'recipes.recipe'])
+        self.assertEqual(publish.call_args.args[2]['short_code'],
+                         self.recipe.short_code)
@@ -0,0 +1,194 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from api.constants import TRENDING_EMPTY_SCORE
+from recipes.feed import get_feed_ids
+from recipes.models import (Favorites, IngredientStats, Recipe,
+                            ShoppingCart)
+from recipes.tests.factories import (create_ingredients, create_recipe,
+                                     create_user, token_client)
+from users.models import CustomUser, Subscription
+
+MISSING = 10 ** 6
+
+
+class RelationTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.author = create_user('author')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.ingredients = create_ingredients(2)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.recipe = cls._recipe(cls.author, 'рецепт автора')
+            cls.own_recipe = cls._recipe(cls.user, 'свой рецепт')
+
+    @classmethod
+    def _recipe(cls, author, name):
+        return create_recipe(author, name, cls.ingredients)
+
+    def setUp(self):
+        self.client = token_client(self.token)
+
+    def _request(self, method, path):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(path)
+
+    def assertError(self, response, status_code, message):
+        self.assertEqual(response.status_code, status_code)
+        self.assertIn(message, str(response.json()))
+
+
+class RecipeRelationTests(RelationTestCase):
+
+    def test_duplicate_add_rejected(self):
+        for name, model, message in (
+                ('favorite', Favorites, 'Рецепт уже в избранном'),
+                ('shopping_cart', ShoppingCart, 'Рецепт уже в корзине')):
+            with self.subTest(relation=name):
+                path = f'/api/recipes/{self.recipe.id}/{name}/'
+                response = self._request('post', path)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.json()['id'], self.recipe.id)
+                self.assertError(self._request('post', path), 400, message)
+                self.assertEqual(model.objects.filter(
+                    user=self.user, recipe=self.recipe).count(), 1)
+
+    def test_own_recipe_not_favorited(self):
+        response = self._request(
+            'post', f'/api/recipes/{self.own_recipe.id}/favorite/')
+        self.assertError(response, 400,
+                         'Собственный рецепт нельзя обрабатывать')
+        self.assertFalse(Favorites.objects.exists())
+        response = self._request(
+            'post', f'/api/recipes/{self.own_recipe.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+
+    def test_missing_relation_not_deleted(self):
+        for name in ('favorite', 'shopping_cart'):
+            with self.subTest(relation=name):
+                self.assertError(self._request(
+                    'delete', f'/api/recipes/{self.recipe.id}/{name}/'),
+                    400, 'Рецепт не найден в списке.')
+                self.assertEqual(self._request(
+                    'delete', f'/api/recipes/{MISSING}/{name}/'
+                ).status_code, 404)
+                self.assertEqual(self._request(
+                    'post', f'/api/recipes/{MISSING}/{name}/'
+                ).status_code, 404)
+
+    def test_add_and_remove(self):
+        path = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assertEqual(self._request('post', path).status_code, 201)
+        self.assertEqual(self._request('delete', path).status_code, 204)
+        self.assertFalse(Favorites.objects.exists())
+        self.assertEqual(self._request('post', path).status_code, 201)
+
+    def test_anonymous_rejected(self):
+        self.client.credentials()
+        response = self._request(
+            'post', f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 401)
+
+
+class SubscriptionTests(RelationTestCase):
+
+    def test_duplicate_subscription_rejected(self):
+        path = f'/api/users/{self.author.id}/subscribe/'
+        response = self._request('post', path)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], self.author.id)
+        self.assertError(self._request('post', path), 400,
+                         'Вы уже подписаны на этого пользователя')
+        self.assertEqual(Subscription.objects.count(), 1)
+
+    def test_self_subscription_rejected(self):
+        self.assertError(
+            self._request('post', f'/api/users/{self.user.id}/subscribe/'),
+            400, 'Нельзя подписаться на себя.')
+
+    def test_missing_subscription_not_deleted(self):
+        self.assertError(
+            self._request('delete', f'/api/users/{self.author.id}/subscribe/'),
+            400, 'Подписка не найдена')
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                self.assertEqual(self._request(
+                    method, f'/api/users/{MISSING}/subscribe/'
+                ).status_code, 404)
+
+
+class RelationSideEffectTests(RelationTestCase):
+    """Сигналы, отправленные вручную из ``recipes.relations``, обновляют
+    ленту, популярность, сводку ингредиентов и метку связей."""
+
+    def _feed(self):
+        return [recipe_id for recipe_id, _ in get_feed_ids(self.user)]
+
+    def _score(self):
+        return Recipe.objects.get(pk=self.recipe.pk).trending_score
+
+    def _cart_counts(self):
+        return list(IngredientStats.objects.filter(
+            ingredient__in=self.ingredients
+        ).order_by('ingredient').values_list('cart_count', flat=True))
+
+    def test_subscription_updates_feed(self):
+        path = f'/api/users/{self.author.id}/subscribe/'
+        self._request('post', path)
+        self.assertEqual(self._feed(), [self.recipe.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            new_recipe = self._recipe(self.author, 'новый рецепт')
+        self.assertEqual(self._feed(), [new_recipe.id, self.recipe.id])
+        self._request('delete', path)
+        self.assertEqual(self._feed(), [])
+
+    def test_relations_update_trending_score(self):
+        self.assertEqual(self._score(), TRENDING_EMPTY_SCORE)
+        path = f'/api/recipes/{self.recipe.id}/favorite/'
+        self._request('post', path)
+        favorited = self._score()
+        self.assertGreater(favorited, TRENDING_EMPTY_SCORE)
+        self._request('post', f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertGreater(self._score(), favorited)
+        self._request('delete',
+                      f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertAlmostEqual(self._score(), favorited)
+        self._request('delete', path)
+        self.assertLess(self._score(), favorited)
+
+    def test_cart_updates_ingredient_stats(self):
+        self.assertEqual(self._cart_counts(), [0, 0])
+        path = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self._request('post', path)
+        self.assertEqual(self._cart_counts(), [1, 1])
+        self._request('post', path)
+        self.assertEqual(self._cart_counts(), [1, 1])
+        self._request('delete', path)
+        self._request('delete', path)
+        self.assertEqual(self._cart_counts(), [0, 0])
+
+    def test_favorite_keeps_ingredient_stats(self):
+        self._request('post', f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(self._cart_counts(), [0, 0])
+
+    def test_relations_touch_user(self):
+        for method, path in (
+                ('post', f'/api/recipes/{self.recipe.id}/favorite/'),
+                ('delete', f'/api/recipes/{self.recipe.id}/favorite/'),
+                ('post', f'/api/users/{self.author.id}/subscribe/')):
+            with self.subTest(method=method, path=path):
+                before = CustomUser.objects.get(
+                    pk=self.user.pk).relations_changed_at
+                self._request(method, path)
+                self.assertNotEqual(CustomUser.objects.get(
+                    pk=self.user.pk).relations_changed_at, before)
+
+    def test_rejected_duplicate_has_no_side_effects(self):
+        path = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self._request('post', path)
+        score, counts = self._score(), self._cart_counts()
+        self._request('post', path)
+        self.assertEqual(self._score(), score)
+        self.assertEqual(self._cart_counts(), counts)
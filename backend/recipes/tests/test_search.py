@@ -0,0 +1,55 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from recipes.models import Recipe
+from recipes.search import search_recipes
+from recipes.tests.factories import create_recipe, create_user
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 используется только в '
+                                           'SQLite')
+class FullTextSearchTests(TestCase):
+    """Поиск через FTS5: ранжирование bm25 и синхронизация индекса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.in_name = create_recipe(author, 'Борщ украинский',
+                                    text='свёкла и капуста')
+        cls.in_text = create_recipe(author, 'Суп дня',
+                                    text='почти как борщ, но без свёклы')
+        cls.other = create_recipe(author, 'Омлет', text='яйца и молоко')
+
+    def _search(self, query):
+        return [recipe['id'] for recipe in self.client.get(
+            '/api/recipes/', {'search': query}).json()['results']]
+
+    def test_name_ranked_above_text(self):
+        self.assertEqual(self._search('борщ'),
+                         [self.in_name.id, self.in_text.id])
+
+    def test_word_prefixes_matched(self):
+        self.assertEqual(self._search('борщи'), [])
+        self.assertEqual(self._search('свёкл'),
+                         [self.in_name.id, self.in_text.id])
+        self.assertEqual(self._search('яйц молок'), [self.other.id])
+
+    def test_ranked_queryset_annotated(self):
+        recipes = list(search_recipes(Recipe.objects.all(), 'борщ'))
+        self.assertEqual([recipe.id for recipe in recipes],
+                         [self.in_name.id, self.in_text.id])
+        self.assertGreater(recipes[0].search_rank, recipes[1].search_rank)
+
+    def test_punctuation_only_query_finds_nothing(self):
+        self.assertEqual(self._search('"*'), [])
+
+    def test_index_follows_recipe_changes(self):
+        self.in_name.name = 'Щи'
+        self.in_name.text = 'капуста'
+        self.in_name.save()
+        self.assertEqual(self._search('борщ'), [self.in_text.id])
+        self.assertEqual(self._search('щи'), [self.in_name.id])
+        self.in_text.delete()
+        self.assertEqual(self._search('борщ'), [])
@@ -0,0 +1,73 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import SimilarRecipe
+from recipes.similarity import estimate_similarity, minhash
+from recipes.tests.factories import (create_ingredients, create_recipe,
+                                     create_user)
+
+
+class MinHashTests(TestCase):
+
+    def test_estimate_close_to_jaccard(self):
+        base = set(range(1, 41))
+        for other, jaccard in ((base, 1.0),
+                               (set(range(1, 31)) | {100}, 30 / 41),
+                               (set(range(11, 51)), 30 / 50),
+                               (set(range(200, 240)), 0.0)):
+            with self.subTest(jaccard=jaccard):
+                [estimate] = estimate_similarity(
+                    minhash(base), minhash(other)[None])
+                self.assertAlmostEqual(estimate, jaccard, delta=0.15)
+
+
+class SimilarRecipesTests(TestCase):
+    """Похожие рецепты ищутся через LSH-корзины при записи состава."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.ingredients = create_ingredients(30)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.base = cls._recipe('основа', range(10))
+            # Отличается от основы одним ингредиентом из десяти.
+            cls.twin = cls._recipe('двойник', [*range(9), 10])
+            cls.unrelated = cls._recipe('другой', range(15, 25))
+            cls.lonely = cls._recipe('одиночка', [29])
+
+    @classmethod
+    def _recipe(cls, name, numbers):
+        return create_recipe(cls.author, name, [cls.ingredients[number]
+                                                for number in numbers])
+
+    def _similar(self, recipe_id):
+        response = self.client.get(f'/api/recipes/{recipe_id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()]
+
+    def test_near_duplicates_listed(self):
+        self.assertEqual(self._similar(self.base.id), [self.twin.id])
+        self.assertEqual(self._similar(self.twin.id), [self.base.id])
+        self.assertEqual(self._similar(self.unrelated.id), [])
+        self.assertEqual(self._similar(self.lonely.id), [])
+
+    def test_score_estimates_jaccard(self):
+        score = SimilarRecipe.objects.get(
+            recipe=self.base, similar=self.twin).score
+        self.assertAlmostEqual(score, 9 / 11, delta=0.15)
+
+    def test_full_rebuild_matches_incremental(self):
+        pairs = set(SimilarRecipe.objects.values_list(
+            'recipe', 'similar'))
+        SimilarRecipe.objects.all().delete()
+        call_command('build_similar_recipes', stdout=StringIO())
+        self.assertEqual(set(SimilarRecipe.objects.values_list(
+            'recipe', 'similar')), pairs)
+
+    def test_unknown_recipe_not_found(self):
+        for pk in (10 ** 6, 'abc'):
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/recipes/{pk}/similar/')
+                self.assertEqual(response.status_code, 404)
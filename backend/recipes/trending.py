@@ -0,0 +1,98 @@
+"""Популярность рецептов с экспоненциальным затуханием.
+
+Вклад события (добавление в избранное или в корзину) с весом ``w`` в
+момент ``t`` к моменту ``now`` равен ``w * exp(-k * (now - t))``. Общий
+множитель ``exp(-k * now)`` одинаков для всех рецептов, поэтому в колонке
+``Recipe.trending_score`` хранится логарифм суммы ``w * exp(k * t)``:
+порядок по нему совпадает с порядком по текущей популярности, значение
+не нужно пересчитывать со временем, а логарифм не переполняется.
+"""
+import math
+from collections import defaultdict
+
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Exp, Ln
+from django.utils import timezone
+
+from api.constants import (TRENDING_EMPTY_SCORE,
+                           TRENDING_EPOCH,
+                           TRENDING_FAVORITE_WEIGHT,
+                           TRENDING_HALF_LIFE_HOURS,
+                           TRENDING_SHOPPING_CART_WEIGHT)
+from .models import Favorites, Recipe, ShoppingCart
+
+DECAY_PER_SECOND = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+# За пределами этой разницы логарифмов меньшее слагаемое несущественно.
+NEGLIGIBLE = 40.0
+# Разница, при которой вычитание считается полным обнулением.
+CANCELLED = 1e-9
+
+WEIGHTS = {
+    Favorites: TRENDING_FAVORITE_WEIGHT,
+    ShoppingCart: TRENDING_SHOPPING_CART_WEIGHT,
+}
+
+
+def _time_score(moment):
+    return DECAY_PER_SECOND * (moment - TRENDING_EPOCH).total_seconds()
+
+
+def weighted_score(weight, moment):
+    """Логарифм вклада события с весом ``weight`` в момент ``moment``."""
+    return _time_score(moment) + math.log(weight)
+
+
+def event_score(model, moment):
+    """Логарифм вклада события в популярность."""
+    return weighted_score(WEIGHTS[model], moment)
+
+
+def decayed(score, now=None):
+    """Текущее значение популярности по хранимому логарифму."""
+    if score <= TRENDING_EMPTY_SCORE:
+        return 0.0
+    return math.exp(score - _time_score(now or timezone.now()))
+
+
+def score_added(value, field='trending_score'):
+    """Выражение для UPDATE: логарифм суммы после добавления вклада."""
+    score = F(field)
+    return Case(
+        When(**{f'{field}__lte': value - NEGLIGIBLE}, then=Value(value)),
+        When(**{f'{field}__gte': value + NEGLIGIBLE}, then=score),
+        default=score + Ln(1 + Exp(value - score)),
+    )
+
+
+def score_removed(value, field='trending_score'):
+    """Выражение для UPDATE: логарифм суммы после вычитания вклада."""
+    score = F(field)
+    return Case(
+        When(**{f'{field}__lte': value + CANCELLED},
+             then=Value(TRENDING_EMPTY_SCORE)),
+        When(**{f'{field}__gte': value + NEGLIGIBLE}, then=score),
+        default=score + Ln(1 - Exp(value - score)),
+    )
+
+
+def record_event(model, recipe_id, moment, added=True):
+    """Учитывает добавление или удаление связи одним UPDATE."""
+    value = event_score(model, moment)
+    Recipe.objects.filter(pk=recipe_id).update(
+        trending_score=score_added(value) if added else score_removed(value))
+
+
+def logsumexp(values):
+    top = max(values)
+    return top + math.log(sum(math.exp(value - top) for value in values))
+
+
+def recompute_scores():
+    """Полный пересчёт популярности по таблицам избранного и корзин."""
+    events = defaultdict(list)
+    for model in WEIGHTS:
+        rows = model.objects.values_list('recipe_id', 'added_at').iterator()
+        for recipe_id, added_at in rows:
+            events[recipe_id].append(event_score(model, added_at))
+    return {recipe_id: logsumexp(values)
+            for recipe_id, values in events.items()}
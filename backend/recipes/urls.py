@@ -1,8 +1,10 @@
-from django.urls import path
-from api.views import copy_short_link
+from django.urls import re_path
+from api.views import short_link_redirect
+from recipes.short_links import CODE_PATTERN
 
 app_name = 'recipes'
 
 urlpatterns = [
-    path('recipes/<int:pk>/', copy_short_link, name='recipe_short_link')
+    re_path(rf'^s/(?P<code>{CODE_PATTERN})/$', short_link_redirect,
+            name='recipe_short_link')
 ]
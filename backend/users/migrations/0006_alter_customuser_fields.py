@@ -0,0 +1,34 @@
+# Generated by Django 4.2.21 on 2026-10-18 22:54
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_customuser_options_alter_subscription_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True, verbose_name='Электронная почта'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='first_name',
+            field=models.CharField(max_length=150, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='last_name',
+            field=models.CharField(max_length=150, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='username',
+            field=models.CharField(max_length=150, unique=True, validators=[django.core.validators.RegexValidator(message='Для имени пользователя необходимо использоватьтолько буквы, цифры и символы "@ . -"', regex='^[\\w.@-]+$')], verbose_name='Имя пользователя'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.21 on 2026-10-18 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_alter_customuser_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='relations_changed_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Дата изменения избранного, покупок и подписок'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения профиля'),
+        ),
+    ]
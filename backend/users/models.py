@@ -35,6 +35,15 @@ class CustomUser(AbstractUser):
         blank=True,
         verbose_name='Фото профиля'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения профиля'
+    )
+    relations_changed_at = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Дата изменения избранного, покупок и подписок'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']